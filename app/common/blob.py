@@ -0,0 +1,406 @@
+"""Blob
+
+Blob ストレージの月別 CSV ZIP を取得し、解凍・解析する
+
+接続はプロセスで 1 つのクライアントで使い回し、解析した表はディスクキャッシュ
+(`disk_cache`) にも書いて、再起動後は条件付き GET で確かめるだけにする.
+事前変換したストア (`parquet_store`) は読まないので、ストアの構築にも使える.
+
+Use:
+    df = download_csv(blob_path("mdp", 13, 2021, 4), stream=True, schema="mdp")
+
+    for chunk in stream_csv(blob_path("mdp", 13, 2021, 4)):
+        ...
+"""
+
+import logging
+import threading
+import time
+import zipfile
+from collections import deque
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from io import BytesIO
+from typing import IO, Any
+
+import pandas as pd
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .disk_cache import ParquetSink, get_disk_cache
+from .schema import conform, csv_dtypes
+from .zip_stream import READ_SIZE, open_csv_member
+
+logger = logging.getLogger(__name__)
+
+# 同時にダウンロードするファイル数
+MAX_WORKERS = 4
+
+# ストリーミング時に一度に読む CSV の行数
+CSV_CHUNK_ROWS = 100_000
+
+
+@dataclass
+class RequestMetric:
+    path: str
+    status: int | None
+    elapsed: float
+    started_at: float
+
+
+class BlobClient:
+    """
+    HTTP client for blob storage shared by the whole process.
+
+    - Keeps connections alive and pools them (one pool per host).
+    - Retries connection errors, read timeouts and 5xx with exponential backoff.
+    - Revalidates cached copies with If-None-Match / If-Modified-Since.
+    - Records the time to response headers of every request.
+
+    Args:
+        pool_size (int): Connections kept per host.
+        retries (int): Retries per request.
+        backoff (float): Backoff factor in seconds (0.5 -> 0.5, 1, 2, ...).
+        timeout (float): Connect / read timeout in seconds.
+        history (int): Number of request metrics to keep.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = MAX_WORKERS,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 10,
+        history: int = 500,
+    ) -> None:
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.metrics: deque[RequestMetric] = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        path: str,
+        etag: str | None = None,
+        last_modified: str | None = None,
+        stream: bool = False,
+    ) -> requests.Response:
+        """
+        GET a blob. Passing validators turns it into a conditional GET that may
+        answer 304 Not Modified.
+
+        Args:
+            path (str): Relative path in blob storage.
+            etag (str | None): Sent as If-None-Match.
+            last_modified (str | None): Sent as If-Modified-Since.
+            stream (bool): Do not read the body up front.
+
+        Returns:
+            requests.Response: The response (status is not checked).
+        """
+        kwargs: dict[str, Any] = {}
+        headers: dict[str, str] = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        if headers:
+            kwargs["headers"] = headers
+        if stream:
+            kwargs["stream"] = True
+
+        started_at = time.time()
+        start = time.perf_counter()
+        status: int | None = None
+        try:
+            response: requests.Response = self.session.get(
+                _blob_url(path), timeout=self.timeout, **kwargs
+            )
+            status = response.status_code
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            metric = RequestMetric(path, status, elapsed, started_at)
+            with self._lock:
+                self.metrics.append(metric)
+            logger.debug("GET %s -> %s in %.3fs", path, status, metric.elapsed)
+
+    def stats(self) -> dict[str, Any]:
+        """Summary of the recorded requests."""
+        with self._lock:
+            metrics = list(self.metrics)
+
+        elapsed = sorted(m.elapsed for m in metrics)
+        return {
+            "requests": len(metrics),
+            "errors": sum(1 for m in metrics if m.status is None or m.status >= 400),
+            "not_modified": sum(1 for m in metrics if m.status == 304),
+            "mean_s": sum(elapsed) / len(elapsed) if elapsed else 0.0,
+            "p95_s": elapsed[int(0.95 * (len(elapsed) - 1))] if elapsed else 0.0,
+        }
+
+
+# プロセス共通の Blob クライアント（keep-alive で接続を使い回す）
+BLOB_CLIENT = BlobClient()
+
+
+def _blob_url(clean_path: str) -> str:
+    base = st.secrets.blob.url.rstrip("/")
+    return f"{base}/{clean_path}?{st.secrets.blob.token.lstrip('?')}"
+
+
+def blob_path(f: str, pcode: int, year: int, month: int) -> str:
+    """Blob path of a monthly dataset ("mdp" or "fromto")."""
+    kind = "mesh1km" if f == "mdp" else "city"
+    return f"{f}/{pcode:02}/{year}/{month:02}/monthly_{f}_{kind}.csv.zip"
+
+
+def download_csv(
+    path: str,
+    stream: bool = False,
+    columns: list[str] | None = None,
+    filters: dict[str, list] | None = None,
+    schema: str | None = None,
+) -> pd.DataFrame:
+    """
+    Fetch and unzip CSV data from blob storage.
+
+    Decoded tables are also kept in the on-disk cache (see `disk_cache`), so a
+    restarted process revalidates with a conditional GET instead of downloading
+    and parsing the archive again. The disk cache always holds the full table;
+    `columns` and `filters` are then read back from it, and without the disk
+    cache only the needed columns of the CSV are parsed.
+
+    Args:
+        path: Relative path to the ZIP file in blob storage
+        stream: Decode the response while it downloads (see `stream_csv`)
+            instead of buffering the whole archive first
+        columns: Columns to keep (all when None)
+        filters: Keep only rows whose column value is in the given list,
+            e.g. {"dayflag": [2], "citycode": [13101]}
+        schema: Dataset whose declared dtypes the table is checked against
+            and converted to (see `schema.conform`)
+
+    Returns:
+        DataFrame containing the CSV data
+
+    Raises:
+        requests.RequestException: If the HTTP request fails
+        zipfile.BadZipFile: If the downloaded content is not a valid ZIP file
+        ValueError: If no CSV file is found in the ZIP archive, or a column
+            does not fit the schema
+    """
+    clean_path = path.lstrip("/")
+    cache = get_disk_cache()
+    entry = cache.lookup(clean_path) if cache else None
+    parquet_filters = [(k, "in", list(v)) for k, v in (filters or {}).items()]
+
+    if cache and entry and entry.is_fresh(cache.max_age):
+        cached = cache.read(clean_path, columns, parquet_filters)
+        if cached is not None:
+            return conform(cached, schema)
+
+    # Fetch the ZIP file (conditional GET when we hold a cached copy)
+    response = BLOB_CLIENT.get(
+        clean_path,
+        etag=entry.etag if entry else None,
+        last_modified=entry.last_modified if entry else None,
+        stream=stream,
+    )
+
+    if cache and entry and response.status_code == 304:
+        cache.touch(clean_path)
+        cached = cache.read(clean_path, columns, parquet_filters)
+        if cached is not None:
+            return conform(cached, schema)
+        response = BLOB_CLIENT.get(clean_path, stream=stream)
+
+    response.raise_for_status()
+
+    if cache is None:
+        return _parse_response(response, stream, columns, filters, schema, None)
+
+    with cache.writer(
+        clean_path,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    ) as sink:
+        _parse_response(response, stream, columns, filters, schema, sink)
+        # 全列を書いた Parquet から、必要な列・行だけを読む
+        written = sink.read(columns, parquet_filters)
+
+    if written is not None:
+        return conform(written, schema)
+
+    # キャッシュに書けなかったときは、必要な列だけを読み直す
+    response = BLOB_CLIENT.get(clean_path, stream=stream)
+    response.raise_for_status()
+    return _parse_response(response, stream, columns, filters, schema, None)
+
+
+def _parse_response(
+    response: requests.Response,
+    stream: bool,
+    columns: list[str] | None,
+    filters: dict[str, list] | None,
+    schema: str | None,
+    sink: ParquetSink | None,
+) -> pd.DataFrame | None:
+    """
+    Parse the CSV of a response.
+
+    Without a sink only the columns that are returned or filtered on are
+    parsed. With a sink every column is parsed and written to the disk cache,
+    and None is returned: the caller reads its slice back from the cached
+    Parquet file (projection and predicate pushdown).
+    """
+    dtype = csv_dtypes(schema)
+    usecols = _needed_columns(columns, filters) if sink is None else None
+
+    def consume(chunks: Iterable[pd.DataFrame]) -> pd.DataFrame | None:
+        if sink is None:
+            return _collect(chunks, columns, filters, schema)
+        _write_chunks(chunks, columns, sink, schema)
+        return None
+
+    if stream:
+        return consume(_iter_csv_chunks(response, dtype=dtype, usecols=usecols))
+
+    with _open_zip_csv(BytesIO(response.content)) as f:
+        return consume(
+            pd.read_csv(f, usecols=usecols, dtype=dtype, chunksize=CSV_CHUNK_ROWS)
+        )
+
+
+def _needed_columns(
+    columns: list[str] | None, filters: dict[str, list] | None
+) -> list[str] | None:
+    if columns is None:
+        return None
+    return list(dict.fromkeys([*columns, *(filters or {})]))
+
+
+def _collect(
+    chunks: Iterable[pd.DataFrame],
+    columns: list[str] | None,
+    filters: dict[str, list] | None,
+    schema: str | None = None,
+) -> pd.DataFrame:
+    """
+    Filter CSV chunks as they are parsed so only the wanted slice stays in memory.
+
+    Args:
+        chunks: DataFrame chunks from `pd.read_csv(..., chunksize=...)`
+        columns: Columns to keep (all when None)
+        filters: Row filters, see `download_csv`
+        schema: Dataset whose schema every chunk is converted to
+
+    Returns:
+        DataFrame of the kept rows and columns
+    """
+    kept: list[pd.DataFrame] = []
+    for chunk in chunks:
+        chunk = conform(chunk, schema)
+        _check_columns(chunk, columns)
+
+        for col, values in (filters or {}).items():
+            chunk = chunk[chunk[col].isin(values)]
+        if columns is not None:
+            chunk = chunk[columns]
+        kept.append(chunk)
+
+    if not kept:
+        return conform(pd.DataFrame(columns=columns), schema)
+    return pd.concat(kept, ignore_index=True)
+
+
+def _write_chunks(
+    chunks: Iterable[pd.DataFrame],
+    columns: list[str] | None,
+    sink: ParquetSink,
+    schema: str | None = None,
+) -> None:
+    """Write full CSV chunks to the disk cache without keeping them."""
+    for chunk in chunks:
+        # ディスクキャッシュにも変換後の小さい型で書く
+        chunk = conform(chunk, schema)
+        _check_columns(chunk, columns)
+        sink.write(chunk)
+
+
+def _check_columns(chunk: pd.DataFrame, columns: list[str] | None) -> None:
+    missing = set(columns or []) - set(chunk.columns)
+    if missing:
+        raise ValueError(f"Columns not found in CSV file: {sorted(missing)}")
+
+
+@contextmanager
+def _open_zip_csv(f: BytesIO) -> Iterator[IO[bytes]]:
+    """Open the first CSV member of a ZIP archive."""
+    try:
+        with zipfile.ZipFile(f) as z:
+            file_list: list[str] = z.namelist()
+
+            for filename in file_list:
+                if filename.endswith(".csv"):
+                    with z.open(filename) as csv_file:
+                        yield csv_file
+                        return
+
+            # No CSV found in the archive
+            raise ValueError("No CSV file found in ZIP archive")
+    except zipfile.BadZipFile as e:
+        raise zipfile.BadZipFile("Invalid ZIP file") from e
+
+
+def _iter_csv_chunks(
+    response: requests.Response,
+    chunksize: int = CSV_CHUNK_ROWS,
+    **read_csv_kwargs,
+) -> Iterator[pd.DataFrame]:
+    """Decode a streamed ZIP response into CSV chunks, closing it at the end."""
+    try:
+        with open_csv_member(response.iter_content(chunk_size=READ_SIZE)) as f:
+            yield from pd.read_csv(f, chunksize=chunksize, **read_csv_kwargs)
+    finally:
+        response.close()
+
+
+def stream_csv(path: str, chunksize: int = CSV_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Stream the CSV in a blob storage ZIP as DataFrame chunks.
+
+    The archive is never held in memory as a whole, and the first chunk is
+    yielded as soon as its rows have been downloaded.
+
+    Args:
+        path: Relative path to the ZIP file in blob storage
+        chunksize: Rows per chunk
+
+    Yields:
+        DataFrame chunks of the CSV data
+
+    Raises:
+        requests.RequestException: If the HTTP request fails
+        zipfile.BadZipFile: If the downloaded content is not a valid ZIP file
+        ValueError: If no CSV file is found in the ZIP archive
+    """
+    response = BLOB_CLIENT.get(path.lstrip("/"), stream=True)
+    response.raise_for_status()
+    yield from _iter_csv_chunks(response, chunksize)
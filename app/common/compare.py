@@ -0,0 +1,83 @@
+"""Year Comparison
+
+2 年分の滞在人口をメッシュ ID で揃えて増減を計算する
+
+比較年のメッシュ ID を並べ替えておき、基準年の各行を searchsorted で引く.
+DataFrame の結合を繰り返さず、連続した配列の上で人口・増減・増減率を一度に求める.
+
+Use:
+    df_cmp = compare_years(df_2020, df_2021)
+    df_cmp = mesh.join(df_cmp)
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def growth_rate(following: np.ndarray, base: np.ndarray) -> np.ndarray:
+    """
+    Growth rate `following / base - 1`.
+
+    NaN where either value is missing or the base is 0.
+    """
+    following = np.asarray(following, dtype=np.float64)
+    base = np.asarray(base, dtype=np.float64)
+    valid = ~np.isnan(following) & ~np.isnan(base) & (base != 0)
+    rate = np.full(np.broadcast(following, base).shape, np.nan)
+    np.divide(following, base, out=rate, where=valid)
+    rate[valid] -= 1
+    return rate
+
+
+def compare_years(
+    df_base: pd.DataFrame,
+    df_next: pd.DataFrame,
+    on: str = "mesh1kmid",
+    value: str = "population",
+    next_name: str = "population_2021",
+) -> pd.DataFrame:
+    """
+    Align the later year onto the rows of the base year and compute the change.
+
+    Rows of `df_next` with the same id (a cell listed in two prefecture files)
+    are summed.
+
+    Args:
+        df_base (pd.DataFrame): Base year with `on` and `value`.
+        df_next (pd.DataFrame): Later year with `on` and `value`.
+        on (str): Mesh id column.
+        value (str): Population column.
+        next_name (str): Name of the later year's population in the result.
+
+    Returns:
+        pd.DataFrame: One row per row of `df_base`, with `on`, `value`,
+        `next_name` (NaN where the later year has no data), `delta`
+        (absolute change) and `diff` (growth rate, NaN where either year is
+        missing or the base population is 0).
+    """
+    base_ids = df_base[on].to_numpy(dtype=np.int64)
+    base = df_base[value].to_numpy(dtype=np.float64)
+
+    next_ids = df_next[on].to_numpy(dtype=np.int64)
+    order = np.argsort(next_ids, kind="stable")
+    ids = next_ids[order]
+    values = df_next[value].to_numpy(dtype=np.float64)[order]
+    if len(ids) > 1 and not (np.diff(ids) > 0).all():
+        ids, starts = np.unique(ids, return_index=True)
+        values = np.add.reduceat(values, starts)
+
+    following = np.full(len(base_ids), np.nan)
+    if len(ids):
+        pos = np.minimum(np.searchsorted(ids, base_ids), len(ids) - 1)
+        found = ids[pos] == base_ids
+        following[found] = values[pos[found]]
+
+    return pd.DataFrame(
+        {
+            on: base_ids,
+            value: df_base[value].to_numpy(),
+            next_name: following,
+            "delta": following - base,
+            "diff": growth_rate(following, base),
+        }
+    )
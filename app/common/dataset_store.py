@@ -0,0 +1,239 @@
+"""Dataset Store
+
+読み込んだデータをプロセス全体で共有する読み取り専用の置き場
+
+容量で上限を決める LRU (`LRUStore`) は描画キャッシュ (`render_cache`) と共通.
+
+セッションには選択条件から作ったキーだけを持たせ、データ本体はここに 1 つだけ置く.
+DataFrame は Copy-on-Write の浅いコピー（ビュー）で渡すので、セッション側で列を
+足したり書き換えたりしても共有しているデータは変わらない
+（Copy-on-Write が無効な pandas 2 では、設定は変えずにコピーを渡す）.
+
+Use:
+    store = get_dataset_store()
+    key = selection_key(dataset="mdp", pref=[13], month=4)
+    ss.dataset_key = key
+    df_2021, df_2020 = store.get_or_create(key, lambda: tuple(fetch_data_batch(...)))
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import Any
+
+import pandas as pd
+import streamlit as st
+
+DEFAULT_MAX_MB = 1024
+
+
+def selection_key(**selection: Any) -> str:
+    """
+    Key of a selection (order of the keyword arguments and of lists of codes
+    does not matter).
+
+    Returns:
+        str: Hex digest.
+    """
+    normalized = {
+        name: sorted(value) if isinstance(value, (list, tuple, set)) else value
+        for name, value in selection.items()
+    }
+    text = json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def nbytes(value: Any) -> int:
+    """Approximate memory held by a stored value."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(v) for v in value)
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+def _copy_on_write() -> bool:
+    """浅いコピーへの書き込みが元の DataFrame に及ばないか（pandas 3 では常に真）"""
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True
+    return pd.get_option("mode.copy_on_write") is True
+
+
+def _view(value: Any) -> Any:
+    """DataFrame は浅いコピー（書き込むまで共有）で渡す"""
+    if isinstance(value, pd.DataFrame):
+        return value.copy(deep=not _copy_on_write())
+    if isinstance(value, tuple):
+        return tuple(_view(v) for v in value)
+    return value
+
+
+class LRUStore:
+    """
+    Thread-safe LRU store bounded by the size of its values.
+
+    Args:
+        max_bytes (int): Size limit. Least recently used values are evicted.
+        size (Callable[[Any], int]): Size of a value in bytes.
+        view (Callable[[Any], Any] | None): Applied to every value handed out
+            (values are handed out as they are when None).
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        size: Callable[[Any], int] = nbytes,
+        view: Callable[[Any], Any] | None = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._size = size
+        self._view = view or (lambda value: value)
+        # キー -> (値, バイト数)
+        self._entries: OrderedDict[str, tuple[Any, int]] = OrderedDict()
+        # 作成中のキー -> 作成した値（同じキーを同時に作らないようにする）
+        self._pending: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def _lookup(self, key: str) -> tuple[Any, int] | None:
+        """エントリを引いて最近使ったものにする（ロックを取ってから呼ぶ）"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def get(self, key: str) -> Any | None:
+        """Return the value for `key` and mark it as recently used."""
+        with self._lock:
+            entry = self._lookup(key)
+        return None if entry is None else self._view(entry[0])
+
+    def put(self, key: str, value: Any) -> Any:
+        """
+        Store a value (not kept if it alone exceeds the limit).
+
+        Returns:
+            `value`, as it is handed out.
+        """
+        size = self._size(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            if size <= self.max_bytes:
+                self._entries[key] = (value, size)
+                self.nbytes += size
+                while self.nbytes > self.max_bytes:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self.nbytes -= evicted
+        return self._view(value)
+
+    def get_or_create(self, key: str, create: Callable[[], Any]) -> Any:
+        """
+        Return the value for `key`, creating and storing it when missing.
+
+        Concurrent calls for the same key wait for the first one instead of
+        creating the value again. If that one fails, the next waiter creates it.
+
+        Args:
+            key (str): Selection key.
+            create (Callable[[], Any]): Loads the value.
+
+        Returns:
+            The stored value, as it is handed out.
+        """
+        while True:
+            with self._lock:
+                entry = self._lookup(key)
+                if entry is not None:
+                    return self._view(entry[0])
+                pending = self._pending.get(key)
+                if pending is None:
+                    pending = self._pending[key] = Future()
+                    break
+
+            # ほかのセッションが作成中なら待つ（失敗したら自分で作り直す）
+            if pending.exception() is None:
+                return self._view(pending.result())
+
+        try:
+            value = create()
+        except BaseException as e:
+            with self._lock:
+                del self._pending[key]
+            pending.set_exception(e)
+            raise
+
+        view = self.put(key, value)
+        with self._lock:
+            del self._pending[key]
+        pending.set_result(value)
+        return view
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class DatasetStore(LRUStore):
+    """
+    Process-wide LRU store of loaded data, bounded by memory.
+
+    Values should be treated as read-only: DataFrames are handed out as
+    copy-on-write views, other objects (e.g. `MeshCube`, `ODComparison`) are
+    shared as they are.
+
+    Args:
+        max_bytes (int): Size limit. Least recently used values are evicted.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        super().__init__(max_bytes, size=nbytes, view=_view)
+
+
+@st.cache_resource(show_spinner=False)
+def _shared_store(max_bytes: int) -> DatasetStore:
+    return DatasetStore(max_bytes)
+
+
+def get_dataset_store() -> DatasetStore:
+    """
+    環境変数の設定から、プロセスで共有するデータの置き場を返す
+
+    - MLIT_DATASET_STORE_MB: 容量上限 (MB)（0 なら置かずに毎回読み込む）
+
+    Returns:
+        DatasetStore: Shared store.
+    """
+    max_mb = float(os.environ.get("MLIT_DATASET_STORE_MB", DEFAULT_MAX_MB))
+    return _shared_store(int(max(max_mb, 0) * 2**20))
@@ -0,0 +1,436 @@
+"""Disk Cache
+
+ローカルディスク上の Parquet キャッシュ（st.cache_data の下の永続層）
+
+MLIT_CACHE_DIR は複数のプロセスで共有できる. インデックスの書き換えはロックファイルで
+排他し、読み込みではインデックスを書かずにファイルの更新時刻で最終使用時刻を残す.
+
+Use:
+    cache = get_disk_cache()
+    if cache is not None:
+        df = cache.read(path, columns=["mesh1kmid"], filters=[("dayflag", "in", [2])])
+
+Inspect / purge (run from app/):
+    python -m common.disk_cache list
+    python -m common.disk_cache purge
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+try:
+    import fcntl
+except ImportError:  # Windows: プロセス間の排他はしない
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "mlit-1km-fromto"
+DEFAULT_MAX_MB = 1024
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+_INDEX_FILE = "index.json"
+_LOCK_FILE = "index.lock"
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    file: str
+    size: int
+    etag: str | None
+    last_modified: str | None
+    stored_at: float
+    accessed_at: float
+
+    def is_fresh(self, max_age: float) -> bool:
+        """再検証なしで使ってよいか"""
+        return time.time() - self.stored_at < max_age
+
+
+class DiskCache:
+    """
+    Size-bounded LRU cache of decoded tables stored as Parquet files.
+
+    Entries are keyed by blob path and remember the ETag / Last-Modified
+    validators of the response they were decoded from. Several processes can
+    share the directory: index updates hold a lock file, and reads record
+    their access time on the entry's file instead of rewriting the index.
+
+    Args:
+        directory (Path): Cache directory.
+        max_bytes (int): Total size limit. Least recently used entries are evicted.
+        max_age (float): Seconds an entry is served without revalidation.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, max_age: float) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    # index ----------------------------------------------------------------
+
+    def _load_index(self) -> dict[str, CacheEntry]:
+        try:
+            with open(self.directory / _INDEX_FILE, encoding="utf-8") as f:
+                raw: dict = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return {k: CacheEntry(**v) for k, v in raw.items()}
+
+    def _save_index(self, index: dict[str, CacheEntry]) -> None:
+        tmp = self.directory / f"{_INDEX_FILE}.{tmp_suffix()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({k: asdict(v) for k, v in index.items()}, f, ensure_ascii=False)
+        os.replace(tmp, self.directory / _INDEX_FILE)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """インデックスを読んで書き換える間、スレッドとプロセスの両方を排他する"""
+        with self._lock, open(self.directory / _LOCK_FILE, "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)  # ファイルを閉じると外れる
+            yield
+
+    def _used_at(self, entry: CacheEntry) -> float:
+        """最終使用時刻（読み込みはファイルの更新時刻に残している）"""
+        try:
+            return max(entry.accessed_at, (self.directory / entry.file).stat().st_mtime)
+        except OSError:
+            return entry.accessed_at
+
+    @staticmethod
+    def _filename(key: str) -> str:
+        return hashlib.sha1(key.encode("utf-8")).hexdigest() + ".parquet"
+
+    # public API -------------------------------------------------------------
+
+    def lookup(self, key: str) -> CacheEntry | None:
+        """Return the entry for `key` if its file still exists."""
+        entry = self._load_index().get(key)
+        if entry is None or not (self.directory / entry.file).exists():
+            return None
+        return entry
+
+    def read(
+        self,
+        key: str,
+        columns: Sequence[str] | None = None,
+        filters: list[tuple] | None = None,
+    ) -> pd.DataFrame | None:
+        """
+        Read a cached table and mark it as recently used.
+
+        Args:
+            key (str): Blob path.
+            columns (Sequence[str] | None): Columns to read (projection pushdown).
+            filters (list[tuple] | None): pyarrow row filters, e.g.
+                `[("dayflag", "in", [2])]` (predicate pushdown).
+
+        Returns:
+            DataFrame, or None when the entry is missing or unreadable.
+        """
+        entry = self._load_index().get(key)
+        if entry is None:
+            return None
+
+        path = self.directory / entry.file
+        try:
+            df: pd.DataFrame = pd.read_parquet(
+                path,
+                columns=list(columns) if columns is not None else None,
+                filters=filters or None,
+            )
+        except (OSError, ValueError, pa.ArrowException) as e:
+            logger.warning("disk cache: dropping unreadable entry %s (%s)", key, e)
+            with self._locked():
+                index = self._load_index()
+                # 他のプロセスが書き直していたら消さない
+                if index.get(key) == entry:
+                    self._remove(index, key)
+                    self._save_index(index)
+            return None
+
+        # インデックスは書き換えず、ファイルの更新時刻で使ったことを残す
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return df
+
+    @contextmanager
+    def writer(
+        self, key: str, etag: str | None = None, last_modified: str | None = None
+    ) -> Iterator["ParquetSink"]:
+        """
+        Store a table chunk by chunk.
+
+        The entry is committed when the block exits normally and discarded when
+        it raises. Write failures only disable the sink; the cache is best-effort.
+
+        Args:
+            key (str): Blob path.
+            etag (str | None): ETag of the response.
+            last_modified (str | None): Last-Modified of the response.
+
+        Yields:
+            ParquetSink: Call `write(chunk)` for each DataFrame chunk.
+        """
+        file = self._filename(key)
+        tmp = self.directory / f"{file}.{tmp_suffix()}"
+        sink = ParquetSink(tmp)
+        try:
+            yield sink
+        except BaseException:
+            sink.abort()
+            raise
+
+        if not sink.close():
+            return
+
+        with self._locked():
+            try:
+                now = time.time()
+                entry = CacheEntry(
+                    key=key,
+                    file=file,
+                    size=tmp.stat().st_size,
+                    etag=etag,
+                    last_modified=last_modified,
+                    stored_at=now,
+                    accessed_at=now,
+                )
+                json.dumps(asdict(entry))  # validators must be serializable
+                os.replace(tmp, self.directory / file)
+
+                index = self._load_index()
+                index[key] = entry
+                self._evict(index)
+                self._save_index(index)
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning("disk cache: could not store %s (%s)", key, e)
+                tmp.unlink(missing_ok=True)
+
+    def put(
+        self,
+        key: str,
+        df: pd.DataFrame,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> None:
+        """
+        Store a whole table. See `writer`.
+
+        Args:
+            key (str): Blob path.
+            df (pd.DataFrame): Decoded table.
+            etag (str | None): ETag of the response.
+            last_modified (str | None): Last-Modified of the response.
+        """
+        with self.writer(key, etag, last_modified) as sink:
+            sink.write(df)
+
+    def touch(self, key: str) -> None:
+        """Mark an entry as revalidated (e.g. after a 304 response)."""
+        with self._locked():
+            index = self._load_index()
+            if key in index:
+                index[key].stored_at = time.time()
+                self._save_index(index)
+
+    def entries(self) -> list[CacheEntry]:
+        """Entries ordered from most to least recently used."""
+        entries = list(self._load_index().values())
+        for entry in entries:
+            entry.accessed_at = self._used_at(entry)
+        return sorted(entries, key=lambda e: e.accessed_at, reverse=True)
+
+    def stats(self) -> dict[str, int]:
+        entries = self.entries()
+        return {
+            "entries": len(entries),
+            "bytes": sum(e.size for e in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+    def purge(self, key: str | None = None) -> int:
+        """
+        Remove one entry, or everything when `key` is None.
+
+        Returns:
+            int: Number of removed entries.
+        """
+        with self._locked():
+            index = self._load_index()
+            keys = list(index) if key is None else [k for k in index if k == key]
+            for k in keys:
+                self._remove(index, k)
+            self._save_index(index)
+            return len(keys)
+
+    # internals --------------------------------------------------------------
+
+    def _remove(self, index: dict[str, CacheEntry], key: str) -> None:
+        entry = index.pop(key)
+        (self.directory / entry.file).unlink(missing_ok=True)
+
+    def _evict(self, index: dict[str, CacheEntry]) -> None:
+        total = sum(e.size for e in index.values())
+        for entry in sorted(index.values(), key=self._used_at):
+            if total <= self.max_bytes:
+                break
+            total -= entry.size
+            self._remove(index, entry.key)
+
+
+def tmp_suffix() -> str:
+    """プロセス・スレッドごとに一意な一時ファイル名"""
+    return f"{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+class ParquetSink:
+    """Incremental Parquet writer that turns itself off on the first error."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.failed = False
+        self._writer: pq.ParquetWriter | None = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.failed:
+            return
+        try:
+            if self._writer is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                table = pa.Table.from_pandas(
+                    df, schema=self._writer.schema, preserve_index=False
+                )
+            self._writer.write_table(table)
+        except (OSError, ValueError, TypeError, pa.ArrowException) as e:
+            logger.warning("disk cache: not caching %s (%s)", self.path.name, e)
+            self.abort()
+
+    def close(self) -> bool:
+        """Finish the file. Returns True if something was written successfully."""
+        if self._writer is None or self.failed:
+            self.abort()
+            return False
+        try:
+            self._writer.close()
+        except (OSError, pa.ArrowException) as e:
+            logger.warning("disk cache: not caching %s (%s)", self.path.name, e)
+            self.abort()
+            return False
+        return True
+
+    def read(
+        self,
+        columns: Sequence[str] | None = None,
+        filters: list[tuple] | None = None,
+    ) -> pd.DataFrame | None:
+        """
+        Finish the file and read a slice of it back.
+
+        Args:
+            columns (Sequence[str] | None): Columns to read (projection pushdown).
+            filters (list[tuple] | None): pyarrow row filters (predicate pushdown).
+
+        Returns:
+            DataFrame, or None when writing failed.
+        """
+        if not self.close():
+            return None
+        try:
+            return pd.read_parquet(
+                self.path,
+                columns=list(columns) if columns is not None else None,
+                filters=filters or None,
+            )
+        except (OSError, ValueError, pa.ArrowException) as e:
+            logger.warning("disk cache: unreadable %s (%s)", self.path.name, e)
+            return None
+
+    def abort(self) -> None:
+        self.failed = True
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except (OSError, pa.ArrowException):
+                pass
+            self._writer = None
+        self.path.unlink(missing_ok=True)
+
+
+_instances: dict[tuple[str, int, float], DiskCache] = {}
+_instances_lock = threading.Lock()
+
+
+def get_disk_cache() -> DiskCache | None:
+    """
+    環境変数の設定からディスクキャッシュを返す
+
+    - MLIT_CACHE_DIR: キャッシュディレクトリ（空文字で無効化）
+    - MLIT_CACHE_MAX_MB: 容量上限 (MB)
+    - MLIT_CACHE_MAX_AGE: 再検証なしで使う秒数
+
+    Returns:
+        DiskCache | None: 無効化されている場合は None.
+    """
+    directory = os.environ.get("MLIT_CACHE_DIR", str(DEFAULT_CACHE_DIR))
+    if not directory:
+        return None
+
+    max_bytes = int(float(os.environ.get("MLIT_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 2**20)
+    max_age = float(os.environ.get("MLIT_CACHE_MAX_AGE", DEFAULT_MAX_AGE))
+
+    config = (directory, max_bytes, max_age)
+    with _instances_lock:
+        if config not in _instances:
+            try:
+                _instances[config] = DiskCache(Path(directory), max_bytes, max_age)
+            except OSError as e:
+                logger.warning("disk cache disabled: %s", e)
+                return None
+        return _instances[config]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect or purge the disk cache.")
+    parser.add_argument("command", choices=["list", "stats", "purge"])
+    parser.add_argument("key", nargs="?", help="Blob path (purge only).")
+    args = parser.parse_args(argv)
+
+    cache = get_disk_cache()
+    if cache is None:
+        print("disk cache is disabled (MLIT_CACHE_DIR is empty)")
+        return
+
+    if args.command == "list":
+        for e in cache.entries():
+            accessed = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(e.accessed_at))
+            print(f"{e.size:>12,d}  {accessed}  {e.key}")
+    elif args.command == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    else:
+        print(f"purged {cache.purge(args.key)} entries from {cache.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,13 +11,134 @@ import branca.colormap as cm
 import folium
 import folium.plugins
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 import streamlit as st
+from branca.element import MacroElement
 from folium.plugins import MiniMap
+from folium.template import Template
 from streamlit.components.v1 import html
 
+from .geojson_encoder import DEFAULT_DECIMALS, dumps, encode_features
+
+# 全セル共通のスタイル（セルごとに変わるのは色だけ）
+BASE_STYLE: dict = {"weight": 1, "fillOpacity": 0.6}
+
+MAP_HEIGHT = 600
+
+# 0-255 の 2 桁 16 進表記
+_HEX = np.array([f"{i:02x}" for i in range(256)])
+
+
+def colormap_colors(colormap, values) -> np.ndarray:
+    """
+    Vectorized `colormap(value)` for a branca LinearColormap.
+
+    Interpolates each RGBA channel between the colormap stops and formats it
+    the same way branca does ("#rrggbbaa"). NaN values become transparent.
+
+    Args:
+        colormap: branca LinearColormap.
+        values: Numeric values.
+
+    Returns:
+        np.ndarray: Color strings.
+    """
+    x = np.asarray(values, dtype=np.float64)
+    index = np.asarray(colormap.index, dtype=np.float64)
+    stops = np.asarray(colormap.colors, dtype=np.float64)
+
+    # np.interp は両端の外側を端の色に丸める（branca と同じ）
+    channels = [
+        (np.interp(np.nan_to_num(x), index, stops[:, i]) * 255.9999).astype(np.int64)
+        for i in range(4)
+    ]
+    out = np.full(len(x), "#", dtype=object)
+    for channel in channels:
+        out += _HEX[channel]
+
+    out[np.isnan(x)] = "#00000000"
+    return out
+
+
+def tooltip_texts(values, value: str, caption: str) -> np.ndarray:
+    """
+    Tooltip text of every cell ("<value>: 12.34%" for the growth rate).
+
+    Args:
+        values: Numeric values.
+        value (str): Column name shown in the tooltip.
+        caption (str): Colormap caption.
+
+    Returns:
+        np.ndarray: Tooltip strings.
+    """
+    x = np.asarray(values)
+    if caption == "増減率":
+        texts = np.char.mod("%.2f%%", x.astype(np.float64) * 100)
+    else:
+        texts = x.astype(str)
+    return np.char.add(f"{value}: ", texts).astype(object)
+
+
+def feature_collection(
+    gdf: gpd.GeoDataFrame,
+    value: str,
+    colormap,
+    precision: str | int | None = DEFAULT_DECIMALS,
+) -> dict:
+    """
+    Build one FeatureCollection whose features carry their style and tooltip.
+
+    Args:
+        gdf (gpd.GeoDataFrame): Cells.
+        value (str): Column to color by.
+        colormap: branca LinearColormap.
+        precision (str | int | None): Coordinate quantization ("lattice" or
+            decimals, see `geojson_encoder.quantize`).
+
+    Returns:
+        dict: GeoJSON FeatureCollection with `tooltip` and `style` properties.
+    """
+    colors = colormap_colors(colormap, gdf[value])
+    props = {
+        "tooltip": tooltip_texts(gdf[value], value, colormap.caption),
+        "style": [{"color": c, "fillColor": c} for c in colors],
+    }
+    # Leaflet はリングを自分で閉じるので終点は送らない
+    return encode_features(gdf, props, precision, close_rings=False)
+
+
+def add_geojson_layer(
+    map_object,
+    gdf,
+    value,
+    colormap,
+    batch: bool = True,
+    precision: str | int | None = DEFAULT_DECIMALS,
+) -> None:
+    """
+    Add the cells to a map.
+
+    Args:
+        map_object: folium Map (or one side of a DualMap).
+        gdf (gpd.GeoDataFrame): Cells.
+        value (str): Column to color by.
+        colormap: branca LinearColormap.
+        batch (bool): Add a single FeatureCollection layer. If False, add one
+            `folium.GeoJson` per cell (the old behaviour, much larger HTML).
+        precision (str | int | None): Coordinate quantization of the batch layer.
+    """
+    if batch:
+        # セルごとの style は properties.style に持たせ、
+        # folium の既定の style 関数 (feature.properties.style) で読ませる
+        folium.GeoJson(
+            data=feature_collection(gdf, value, colormap, precision),
+            tooltip=folium.GeoJsonTooltip(fields=["tooltip"], labels=False),
+            **BASE_STYLE,
+        ).add_to(map_object)
+        return
 
-def add_geojson_layer(map_object, gdf, value, colormap) -> None:
     for _, row in gdf.iterrows():
         if colormap.caption == "増減率":
             tooltip: str = f"{value}: {row[value]:.2%}"
@@ -29,13 +150,112 @@ def add_geojson_layer(map_object, gdf, value, colormap) -> None:
             style_function=lambda _, pop=row[value]: {
                 "fillColor": colormap(pop),
                 "color": colormap(pop),
-                "weight": 1,
-                "fillOpacity": 0.6,
+                **BASE_STYLE,
             },
             tooltip=tooltip,
         ).add_to(map_object)
 
 
+def shared_feature_collection(
+    gdf: gpd.GeoDataFrame,
+    colormaps: dict,
+    precision: str | int | None = DEFAULT_DECIMALS,
+) -> dict:
+    """
+    Build one FeatureCollection carrying the color and tooltip of several values.
+
+    Each value gets `<value>_color` and `<value>_tooltip` properties (null where
+    the value is NaN). Cells without any value are left out.
+
+    Args:
+        gdf (gpd.GeoDataFrame): Cells with one column per value.
+        colormaps (dict): branca LinearColormap per value column.
+        precision (str | int | None): Coordinate quantization.
+
+    Returns:
+        dict: GeoJSON FeatureCollection.
+    """
+    props: dict[str, np.ndarray] = {}
+    keep = np.zeros(len(gdf), dtype=bool)
+    for value, colormap in colormaps.items():
+        x = gdf[value].to_numpy(dtype=np.float64)
+        missing = np.isnan(x)
+        keep |= ~missing
+
+        colors = colormap_colors(colormap, x)
+        tooltips = tooltip_texts(x, value, colormap.caption)
+        colors[missing] = None
+        tooltips[missing] = None
+        props[f"{value}_color"] = colors
+        props[f"{value}_tooltip"] = tooltips
+
+    return encode_features(
+        gdf[keep],
+        {name: values[keep] for name, values in props.items()},
+        precision,
+        close_rings=False,
+    )
+
+
+class SharedFeatures(MacroElement):
+    """
+    FeatureCollection written once into the page and drawn by several layers.
+
+    Add it to `DualMap.m1` before any `SharedGeoJsonLayer`: m1 is rendered
+    before m2, so the variable exists when both panes' layers are created.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = {{ this.json }};
+        {% endmacro %}
+    """
+    )
+
+    def __init__(self, data: dict) -> None:
+        super().__init__()
+        self._name = "SharedFeatures"
+        self.data = data
+
+    @property
+    def json(self) -> str:
+        """Compact JSON text of `data`."""
+        return dumps(self.data)
+
+
+class SharedGeoJsonLayer(MacroElement):
+    """Leaflet GeoJSON layer styling `SharedFeatures` by one value."""
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.geoJson({{ this.features.get_name() }}, {
+            filter: function(feature) {
+                return feature.properties[{{ this.color|tojson }}] !== null;
+            },
+            style: function(feature) {
+                var color = feature.properties[{{ this.color|tojson }}];
+                return Object.assign(
+                    {color: color, fillColor: color}, {{ this.style|tojson }}
+                );
+            },
+        }).bindTooltip(function(layer) {
+            return layer.feature.properties[{{ this.tooltip|tojson }}];
+        }, {sticky: true}).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """
+    )
+
+    def __init__(self, features: SharedFeatures, value: str) -> None:
+        super().__init__()
+        self._name = "SharedGeoJsonLayer"
+        self.features = features
+        self.color = f"{value}_color"
+        self.tooltip = f"{value}_tooltip"
+        self.style = BASE_STYLE
+
+
 def folium_map_builder(
     df: pd.DataFrame,
     gdf_1: gpd.GeoDataFrame,
@@ -43,9 +263,31 @@ def folium_map_builder(
     value_1: str,
     value_2: str,
     zoom_start: int,
+    precision: str | int | None = DEFAULT_DECIMALS,
+    caption_2: str = "増減率",
 ) -> None:
     """
-    Create map.
+    Create map and show it (see `render_folium_map` for the arguments).
+    """
+    m_html = render_folium_map(
+        df, gdf_1, gdf_2, value_1, value_2, zoom_start, precision, caption_2
+    )
+    if m_html is not None:
+        html(m_html, height=MAP_HEIGHT)
+
+
+def render_folium_map(
+    df: pd.DataFrame,
+    gdf_1: gpd.GeoDataFrame,
+    gdf_2: gpd.GeoDataFrame,
+    value_1: str,
+    value_2: str,
+    zoom_start: int,
+    precision: str | int | None = DEFAULT_DECIMALS,
+    caption_2: str = "増減率",
+) -> str | None:
+    """
+    Create map HTML.
 
     Args:
         df (pd.DataFrame): Include latlon.
@@ -54,6 +296,16 @@ def folium_map_builder(
         value_1 (str): Value 1.
         value_2 (str): Value 2.
         zoom_start (int): Zoom start level.
+        precision (str | int | None): Coordinate quantization: "lattice" snaps
+            to the 1km mesh lattice, an int rounds to that many decimals and
+            None keeps full precision.
+        caption_2 (str): Caption of the right map ("増減率" shows percentages).
+
+    Returns:
+        str | None: The page, or None when the map cannot be drawn.
+
+    Pass the same GeoDataFrame as `gdf_1` and `gdf_2` (with both value columns)
+    to write the cell geometries into the page only once.
     """
     # 地理院タイル
     map_tile = "https://cyberjapandata.gsi.go.jp/xyz/pale/{z}/{x}/{y}.png"
@@ -64,7 +316,7 @@ def folium_map_builder(
         map_center: list[float] = [df["lat"].mean(), df["lon"].mean()]
     except (KeyError, TypeError):
         st.error("地図表示できません。")
-        return
+        return None
 
     with st.spinner("Creating Map...", show_time=True):
         m = folium.plugins.DualMap(
@@ -85,18 +337,27 @@ def folium_map_builder(
         # 本当は左に表示させたいが、左に偏るよりは右のほうがマシなので妥協
         m.m2.add_child(colormap_1)
 
-        add_geojson_layer(m.m1, gdf_1, value_1, colormap_1)
-
         colormap_2 = cm.linear.Accent_06.scale(  # pyright: ignore[reportAttributeAccessIssue]
             gdf_2[value_2].min(), gdf_2[value_2].max()
         )
-        colormap_2.caption = "増減率"
+        colormap_2.caption = caption_2
         m.m2.add_child(colormap_2)
 
-        add_geojson_layer(m.m2, gdf_2, value_2, colormap_2)
+        if gdf_2 is gdf_1:
+            # ジオメトリは 1 回だけ書き出し、左右で値ごとに塗り分ける
+            features = SharedFeatures(
+                shared_feature_collection(
+                    gdf_1, {value_1: colormap_1, value_2: colormap_2}, precision
+                )
+            )
+            m.m1.add_child(features)
+            m.m1.add_child(SharedGeoJsonLayer(features, value_1))
+            m.m2.add_child(SharedGeoJsonLayer(features, value_2))
+        else:
+            add_geojson_layer(m.m1, gdf_1, value_1, colormap_1, precision=precision)
+            add_geojson_layer(m.m2, gdf_2, value_2, colormap_2, precision=precision)
 
         folium.plugins.Fullscreen().add_to(m)
         MiniMap(toggle_display=True, minimized=True).add_to(m.m2)
 
-        m_html = m.get_root().render()
-        html(m_html, height=600)
+        return m.get_root().render()
@@ -0,0 +1,146 @@
+"""GeoJSON Encoder
+
+地図に埋め込む GeoJSON を小さく書き出す
+
+- 座標をメッシュの格子 (30" × 45") または小数 6 桁程度に量子化する
+- Leaflet は閉じていないリングも閉じて描くので、終点（= 始点）を省ける
+- 区切り文字の空白を入れない
+
+Use:
+    fc = encode_features(gdf, {"population": values}, precision="lattice")
+    text = dumps(fc)
+"""
+
+import json
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from .meshcode import LAT_CELLS_PER_DEGREE, LON_CELLS_PER_DEGREE
+
+# 格子に合わせた後に書き出す桁数（1e-6 度 ≈ 10cm）
+DEFAULT_DECIMALS = 6
+
+LATTICE = "lattice"
+
+
+def quantize(
+    coords: np.ndarray, mode: str | int | None = DEFAULT_DECIMALS
+) -> np.ndarray:
+    """
+    Quantize lon/lat coordinates.
+
+    Args:
+        coords (np.ndarray): (n, 2) lon, lat.
+        mode (str | int | None): "lattice" to snap to the 1km mesh lattice,
+            a number of decimal places, or None to keep them as they are.
+
+    Returns:
+        np.ndarray: Quantized coordinates.
+    """
+    if mode is None:
+        return coords
+    if mode == LATTICE:
+        coords = np.column_stack(
+            [
+                np.rint(coords[:, 0] * LON_CELLS_PER_DEGREE) / LON_CELLS_PER_DEGREE,
+                np.rint(coords[:, 1] * LAT_CELLS_PER_DEGREE) / LAT_CELLS_PER_DEGREE,
+            ]
+        )
+        mode = DEFAULT_DECIMALS
+    return np.round(coords, int(mode))
+
+
+def encode_features(
+    gdf: gpd.GeoDataFrame,
+    properties: dict[str, np.ndarray],
+    precision: str | int | None = DEFAULT_DECIMALS,
+    close_rings: bool = True,
+) -> dict:
+    """
+    Build a FeatureCollection from polygons and property arrays.
+
+    Coordinates are quantized for all polygons at once, so the JSON writer only
+    sees short floats.
+
+    Args:
+        gdf (gpd.GeoDataFrame): Polygons (EPSG:4326).
+        properties (dict[str, np.ndarray]): Property arrays aligned with `gdf`.
+            NaN and None are written as null.
+        precision (str | int | None): Quantization mode, see `quantize`.
+        close_rings (bool): False drops the closing vertex of every ring
+            (only for renderers that close rings themselves, e.g. Leaflet).
+
+    Returns:
+        dict: GeoJSON FeatureCollection.
+    """
+    geoms = gdf.geometry.to_numpy()
+    records = (
+        pd.DataFrame({k: np.asarray(v) for k, v in properties.items()})
+        .astype(object)
+        .where(lambda d: d.notna(), None)
+        .to_dict("records")
+        if properties
+        else [{} for _ in range(len(geoms))]
+    )
+
+    if len(geoms) and (shapely.get_type_id(geoms) == 3).all():  # Polygon
+        geometries = _polygon_coordinates(geoms, precision, close_rings)
+    else:
+        # 矩形以外（MultiPolygon など）は 1 つずつ変換する
+        geometries = [_mapping(g, precision, close_rings) for g in geoms]
+
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "properties": props, "geometry": geometry}
+            for props, geometry in zip(records, geometries)
+        ],
+    }
+
+
+def _polygon_coordinates(geoms, mode, close_rings: bool) -> list[dict]:
+    _, coords, (ring_offsets, polygon_offsets) = shapely.to_ragged_array(geoms)
+    xy = quantize(coords, mode).tolist()
+
+    end = 0 if close_rings else 1
+    rings = [
+        xy[start : stop - end] for start, stop in zip(ring_offsets, ring_offsets[1:])
+    ]
+    return [
+        {"type": "Polygon", "coordinates": rings[start:stop]}
+        for start, stop in zip(polygon_offsets.tolist(), polygon_offsets[1:].tolist())
+    ]
+
+
+def _mapping(geom, mode, close_rings: bool) -> dict | None:
+    if geom is None:
+        return None
+    geometry = shapely.geometry.mapping(
+        shapely.transform(geom, lambda c: quantize(c, mode))
+    )
+    if not close_rings and geometry["type"] in ("Polygon", "MultiPolygon"):
+        polygons = (
+            [geometry["coordinates"]]
+            if geometry["type"] == "Polygon"
+            else geometry["coordinates"]
+        )
+        opened = [[list(ring[:-1]) for ring in polygon] for polygon in polygons]
+        geometry["coordinates"] = opened[0] if geometry["type"] == "Polygon" else opened
+    return geometry
+
+
+def dumps(obj) -> str:
+    """
+    Compact JSON that is safe to embed in a <script> element.
+
+    Args:
+        obj: JSON-serializable object.
+
+    Returns:
+        str: JSON text.
+    """
+    text = json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+    return text.replace("<", "\\u003c").replace(">", "\\u003e").replace("&", "\\u0026")
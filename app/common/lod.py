@@ -0,0 +1,165 @@
+"""Level of Detail
+
+ズームに応じて 1km メッシュを 2km のセルにまとめる
+
+1km メッシュ（3 次メッシュ）は緯度 30" × 経度 45" の格子なので、
+格子の番号を k で割るだけで k 倍のメッシュになる.
+人口は合計し、増減率は合計した人口から計算し直す.
+地図は z9 より引けない (min_zoom=9) ので、それより粗い段階は持たない.
+
+Use:
+    gdf = lod_polygons(df, ["population", "diff"], zoom_start, mesh)
+"""
+
+import math
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from .compare import growth_rate
+from .mesh_store import MeshStore
+from .meshcode import (
+    LAT_CELLS_PER_DEGREE,
+    LON_CELLS_PER_DEGREE,
+    LON_ORIGIN,
+    lattice_index,
+)
+from .utils import make_polygons
+
+# 集約の段階 (km)（z9 で 2km になるので、それ以上は使われない）
+LEVELS: tuple[int, ...] = (1, 2)
+
+# 1 セルがこの幅 (px) 未満になるズームでは集約する
+MIN_CELL_PIXELS = 8
+
+BOUNDS: list[str] = ["lon_min", "lat_min", "lon_max", "lat_max"]
+
+
+def cell_pixels(zoom: float, level: int = 1) -> float:
+    """
+    Width in Web Mercator pixels of a `level` km cell.
+
+    A cell spans 45" of longitude per km, so its width in pixels does not
+    depend on latitude (its height grows towards the poles).
+    """
+    degrees = level / LON_CELLS_PER_DEGREE
+    return degrees / 360 * 256 * 2**zoom
+
+
+def lod_for_zoom(zoom: float) -> int:
+    """
+    Choose the cell size for a zoom level (z9: 2km, z10 and above: 1km).
+
+    Args:
+        zoom (float): Zoom level of the map.
+
+    Returns:
+        int: Cell size in km (one of `LEVELS`).
+    """
+    for level in LEVELS:
+        if cell_pixels(zoom, level) >= MIN_CELL_PIXELS:
+            return level
+    return LEVELS[-1]
+
+
+def coordinate_decimals(zoom: float) -> int:
+    """Decimal places that keep coordinates within half a pixel at `zoom`."""
+    degrees_per_pixel = 360 / (256 * 2**zoom)
+    return max(0, math.ceil(-math.log10(degrees_per_pixel / 2)))
+
+
+def aggregate_cells(
+    df: pd.DataFrame,
+    level: int,
+    population: str = "population",
+    population_next: str = "population_2021",
+) -> pd.DataFrame:
+    """
+    Merge 1km cells into `level` km cells.
+
+    Args:
+        df (pd.DataFrame): Cells with lon / lat (centers), `population` and
+            optionally `population_next` (the later year).
+        level (int): Cell size in km.
+        population (str): Population column (the base year).
+        population_next (str): Population of the later year. When present, the
+            growth rate `diff` is recomputed from the sums over the cells that
+            have both years.
+
+    Returns:
+        pd.DataFrame: One row per aggregate cell with BOUNDS, lon, lat, the
+        summed populations and `diff`.
+    """
+    df = df.dropna(subset=["lon", "lat"])
+    i, j = lattice_index(df["lon"].to_numpy(), df["lat"].to_numpy())
+
+    sums: dict[str, np.ndarray] = {population: df[population].to_numpy()}
+    has_next = population_next in df.columns
+    if has_next:
+        p_next = df[population_next].to_numpy(dtype=np.float64)
+        sums[population_next] = p_next
+        # 増減率は両年そろっているセルだけで計算する（セル単位の diff と同じ）
+        sums["_matched"] = np.where(
+            np.isnan(p_next), np.nan, df[population].to_numpy(dtype=np.float64)
+        )
+
+    grouped = (
+        pd.DataFrame({"i": i // level, "j": j // level, **sums})
+        .groupby(["i", "j"], sort=False)
+        .sum(min_count=1)
+        .reset_index()
+    )
+
+    gi = grouped["i"].to_numpy()
+    gj = grouped["j"].to_numpy()
+    out = pd.DataFrame(
+        {
+            "lon_min": LON_ORIGIN + gj * level / LON_CELLS_PER_DEGREE,
+            "lat_min": gi * level / LAT_CELLS_PER_DEGREE,
+            "lon_max": LON_ORIGIN + (gj + 1) * level / LON_CELLS_PER_DEGREE,
+            "lat_max": (gi + 1) * level / LAT_CELLS_PER_DEGREE,
+        }
+    )
+    out["lon"] = (out["lon_min"] + out["lon_max"]) / 2
+    out["lat"] = (out["lat_min"] + out["lat_max"]) / 2
+    out[population] = grouped[population].to_numpy()
+    if has_next:
+        out[population_next] = grouped[population_next].to_numpy()
+        out["diff"] = growth_rate(
+            grouped[population_next].to_numpy(), grouped["_matched"].to_numpy()
+        )
+    return out
+
+
+def lod_polygons(
+    df: pd.DataFrame,
+    value: str | list[str],
+    zoom: float,
+    mesh: MeshStore | None = None,
+) -> gpd.GeoDataFrame:
+    """
+    Build the polygons to draw at `zoom`.
+
+    1km cells are used as they are (with the polygons cached in `mesh`);
+    otherwise cells are aggregated and their corners rounded to the precision
+    that the zoom level can show.
+
+    Args:
+        df (pd.DataFrame): 1km cells joined with the mesh attributes.
+        value (str | list[str]): Columns to keep.
+        zoom (float): Zoom level the map opens at.
+        mesh (MeshStore | None): Polygon cache for 1km cells.
+
+    Returns:
+        gpd.GeoDataFrame: Polygons (EPSG:4326).
+    """
+    level = lod_for_zoom(zoom)
+    if level == 1:
+        return make_polygons(df, value, mesh)
+
+    cells = aggregate_cells(df, level)
+    # 隣り合うセルは同じ格子線から丸めるので、丸めても隙間はできない
+    decimals = coordinate_decimals(zoom)
+    cells[BOUNDS] = cells[BOUNDS].round(decimals)
+    return make_polygons(cells, value)
@@ -9,21 +9,126 @@
 
 import branca.colormap as cm
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 import streamlit as st
 from maplibre.controls import NavigationControl, ScaleControl
 from maplibre.layer import Layer, LayerType
 from maplibre.map import Map, MapOptions
-from maplibre.sources import GeoJSONSource
+from maplibre.sources import GeoJSONSource, VectorTileSource
 from maplibre.streamlit import st_maplibre
 
+from .geojson_encoder import DEFAULT_DECIMALS, encode_features
+from .vector_tiles import MAX_ZOOM, MIN_ZOOM, TILE_LAYER, publish_tiles
 
-def format_tooltip(value: float, value_name: str, caption: str) -> str:
-    """Format tooltip text based on caption type."""
-    if caption == "増減率":
-        return f"{value_name}: {value:.2%}"
-    else:
-        return f"{value_name}: {value}"
+# 増減率は百分率で送り、ツールチップで "%" を付ける
+PERCENT_CAPTION = "増減率"
+
+# 値がない（NaN）セルの色
+NO_DATA_COLOR = "rgba(0, 0, 0, 0)"
+
+
+def _scale(caption: str) -> float:
+    return 100.0 if caption == PERCENT_CAPTION else 1.0
+
+
+def color_expression(value: str, colormap) -> list | str:
+    """
+    Build a MapLibre `interpolate` expression from a branca LinearColormap.
+
+    The stops are the colormap's own (index, color) pairs, so the browser draws
+    the same ramp branca would compute per value.
+
+    Args:
+        value (str): Feature property holding the (scaled) value.
+        colormap: branca LinearColormap.
+
+    Returns:
+        list | str: Expression, or a plain color when the colormap has no range.
+    """
+    scale = _scale(colormap.caption)
+    colors = [
+        "rgba({}, {}, {}, {})".format(*(int(c * 255.9999) for c in rgba[:3]), rgba[3])
+        for rgba in colormap.colors
+    ]
+    stops: list = []
+    for x, color in zip(colormap.index, colors):
+        x = round(float(x) * scale, 10)
+        if stops and x <= stops[-2]:
+            continue  # interpolate は昇順の stop しか受け付けない
+        stops += [x, color]
+
+    if len(stops) == 2:
+        return stops[1]
+    return [
+        "case",
+        ["==", ["typeof", ["get", value]], "number"],
+        ["interpolate", ["linear"], ["get", value], *stops],
+        NO_DATA_COLOR,
+    ]
+
+
+def tooltip_template(value: str, caption: str) -> str:
+    """Mustache template rendered by the browser ("diff: 12.34%")."""
+    suffix = "%" if caption == PERCENT_CAPTION else ""
+    return f"{value}: {{{{ {value} }}}}{suffix}"
+
+
+def feature_values(values, caption: str) -> np.ndarray:
+    """
+    The one number sent per feature (percent for the growth rate, 2 decimals).
+
+    Args:
+        values: Numeric values.
+        caption (str): Colormap caption.
+
+    Returns:
+        np.ndarray: float64 values, NaN where missing.
+    """
+    x = np.asarray(values, dtype=np.float64) * _scale(caption)
+    return np.round(x, 2)
+
+
+def mesh_source(
+    gdf: gpd.GeoDataFrame,
+    captions: dict[str, str],
+    precision: str | int | None = DEFAULT_DECIMALS,
+) -> tuple[GeoJSONSource | VectorTileSource, str | None]:
+    """
+    Build the mesh source: one number per value on each cell.
+
+    Several values can share one source, so side-by-side maps serialize (or
+    tile) the geometry once and style it with different expressions.
+
+    Args:
+        gdf (gpd.GeoDataFrame): Cells with one column per value.
+        captions (dict[str, str]): Colormap caption per value column.
+        precision (str | int | None): Coordinate quantization of the GeoJSON
+            ("lattice" or decimals, see `geojson_encoder.quantize`).
+
+    Returns:
+        tuple: The source, and its source layer (vector tiles only).
+    """
+    # 各セルには数値だけを持たせ、色とツールチップはブラウザ側で作る
+    values = {
+        value: feature_values(gdf[value], caption)
+        for value, caption in captions.items()
+    }
+    gdf_copy = gpd.GeoDataFrame(values, geometry=gdf.geometry.values, crs=gdf.crs)
+
+    # ベクタータイルを配信できる場合は表示中のタイルだけを読ませる
+    tiles_url = publish_tiles(gdf_copy, values)
+    if tiles_url is not None:
+        source = VectorTileSource(
+            tiles=[tiles_url],
+            min_zoom=MIN_ZOOM,
+            max_zoom=MAX_ZOOM,
+            bounds=tuple(gdf_copy.total_bounds),
+        )  # pyright: ignore[reportCallIssue] - MapLibre型情報の制限
+        return source, TILE_LAYER
+
+    data = encode_features(gdf_copy, values, precision)
+    return GeoJSONSource(data=data), None  # pyright: ignore[reportCallIssue] - MapLibre型情報の制限
 
 
 def create_single_map(
@@ -32,19 +137,27 @@ def create_single_map(
     colormap,
     map_center: tuple[float, float],
     zoom_start: int,
+    source: tuple[GeoJSONSource | VectorTileSource, str | None] | None = None,
 ) -> Map:
-    """Create a single map using maplibre Python package."""
-
-    # Convert GeoDataFrame to GeoJSON and add colors to properties
-    gdf_copy = gdf.copy()
+    """
+    Create a single map using maplibre Python package.
 
-    # Add color properties based on colormap
-    gdf_copy["color"] = gdf_copy[value].apply(lambda x: colormap(x))
+    Args:
+        gdf (gpd.GeoDataFrame): Cells.
+        value (str): Column to color by.
+        colormap: branca LinearColormap.
+        map_center (tuple[float, float]): (lon, lat).
+        zoom_start (int): Zoom start level.
+        source: Prebuilt `mesh_source` (shared between maps), built from `gdf`
+            when omitted.
+    """
+    if source is None:
+        source = mesh_source(gdf, {value: colormap.caption})
+    src, source_layer = source
+    fill_color = color_expression(value, colormap)
 
-    # Add formatted tooltip values
-    gdf_copy["tooltip"] = gdf_copy[value].apply(
-        lambda x: format_tooltip(x, value, colormap.caption)
-    )
+    # 値のないセル（共有ソースで他方の値しかないセル）は描かない
+    has_value = ["==", ["typeof", ["get", value]], "number"]
 
     # Create map with custom style for GSI tiles
     map_options = MapOptions(
@@ -70,16 +183,16 @@ def create_single_map(
 
     m = Map(map_options)
 
-    # Add GeoJSON source
-    geojson_source = GeoJSONSource(data=gdf_copy.__geo_interface__)  # pyright: ignore[reportCallIssue] - MapLibre型情報の制限
-    m.add_source("geojson", geojson_source)
+    m.add_source("geojson", src)
 
     # Add fill layer
     fill_layer = Layer(
         id="geojson-fill",
         type=LayerType.FILL,
         source="geojson",
-        paint={"fill-color": ["get", "color"], "fill-opacity": 0.6},
+        source_layer=source_layer,
+        filter=has_value,
+        paint={"fill-color": fill_color, "fill-opacity": 0.6},
     )  # pyright: ignore[reportCallIssue] - MapLibre型情報の制限
     m.add_layer(fill_layer)
 
@@ -88,12 +201,14 @@ def create_single_map(
         id="geojson-line",
         type=LayerType.LINE,
         source="geojson",
-        paint={"line-color": ["get", "color"], "line-width": 1},
+        source_layer=source_layer,
+        filter=has_value,
+        paint={"line-color": fill_color, "line-width": 1},
     )  # pyright: ignore[reportCallIssue] - MapLibre型情報の制限
     m.add_layer(line_layer)
 
     # Add tooltip
-    m.add_tooltip("geojson-fill", "tooltip")
+    m.add_tooltip("geojson-fill", template=tooltip_template(value, colormap.caption))
 
     # Add controls
     m.add_control(NavigationControl())  # pyright: ignore[reportCallIssue] - MapLibre型情報の制限
@@ -109,6 +224,7 @@ def maplibre_map_builder(
     value_1: str,
     value_2: str,
     zoom_start: int,
+    precision: str | int | None = DEFAULT_DECIMALS,
 ) -> None:
     """
     Create two separate single maps using maplibre Python package displayed side-by-side in Streamlit.
@@ -120,6 +236,10 @@ def maplibre_map_builder(
         value_1 (str): Value 1.
         value_2 (str): Value 2.
         zoom_start (int): Zoom start level.
+        precision (str | int | None): Coordinate quantization of inline GeoJSON.
+
+    Pass the same GeoDataFrame as `gdf_1` and `gdf_2` (with both value columns)
+    to build a single source for both maps.
     """
 
     try:
@@ -148,15 +268,29 @@ def maplibre_map_builder(
         )
         colormap_2.caption = "増減率"
 
+        # 同じ GeoDataFrame なら 1 つのソースを左右で使う
+        # （ベクタータイルなら同じ URL なので、ブラウザのキャッシュも共有される）
+        source = None
+        if gdf_2 is gdf_1:
+            source = mesh_source(
+                gdf_1,
+                {value_1: colormap_1.caption, value_2: colormap_2.caption},
+                precision,
+            )
+
         # Create two columns for side-by-side display
         col1, col2 = st.columns(2)
 
         with col1:
             st.subheader(colormap_1.caption)
-            map1 = create_single_map(gdf_1, value_1, colormap_1, map_center, zoom_start)
+            map1 = create_single_map(
+                gdf_1, value_1, colormap_1, map_center, zoom_start, source
+            )
             st_maplibre(map1, height=500)
 
         with col2:
             st.subheader(colormap_2.caption)
-            map2 = create_single_map(gdf_2, value_2, colormap_2, map_center, zoom_start)
+            map2 = create_single_map(
+                gdf_2, value_2, colormap_2, map_center, zoom_start, source
+            )
             st_maplibre(map2, height=500)
@@ -0,0 +1,328 @@
+"""Mesh Store
+
+1km メッシュ属性をプロセス全体で共有する読み取り専用のテーブル
+
+mesh1kmid の昇順に並べた int64 配列と、それに揃えた float64 の列を持ち、
+結合は searchsorted による配列の参照で行う（セッションごとのコピーはしない）.
+経緯度は `schema` と同じく float64 にする（float32 では経度 140 度付近の刻みが
+約 1.5e-5 度になり、1e-5 度の精度を保てない）.
+
+メッシュの経緯度はメッシュコードから計算できるので、通常は属性ファイルを読まずに
+`MeshStore.from_codes` で作る. 属性ファイルは突き合わせ (`cross_check`) にだけ使う.
+
+アプリでは都道府県ごとに 1 つのストアをプロセスで共有し (`get_decoded_meshes`)、
+まだ持っていないメッシュだけを足していく. 作成済みのポリゴンは描画をまたいで使い回す.
+
+Use:
+    mesh = get_decoded_meshes(13).covering(df["mesh1kmid"])
+    df = mesh.join(df)
+
+    # 属性ファイルとの突き合わせ
+    python -m common.mesh_store check --year 2020
+"""
+
+import argparse
+import threading
+
+import numpy as np
+import pandas as pd
+import shapely
+import streamlit as st
+
+from .meshcode import decode
+from .utils import fetch_data
+
+# メッシュ属性のうち使う列
+MESH_COLUMNS: list[str] = [
+    "mesh1kmid",
+    "lon_min",
+    "lat_min",
+    "lon_max",
+    "lat_max",
+    "lon_center",
+    "lat_center",
+]
+
+# join で付ける列名（merge_df と同じく中心座標は lat / lon）
+_OUTPUT_NAMES: dict[str, str] = {
+    "lon_min": "lon_min",
+    "lat_min": "lat_min",
+    "lon_max": "lon_max",
+    "lat_max": "lat_max",
+    "lon_center": "lon",
+    "lat_center": "lat",
+}
+
+
+class MeshStore:
+    """
+    Read-only mesh attribute table indexed by mesh1kmid.
+
+    Args:
+        ids (np.ndarray): mesh1kmid of every cell.
+        columns (dict[str, np.ndarray]): Attribute arrays aligned with `ids`.
+
+    Raises:
+        ValueError: If `ids` contains duplicates.
+    """
+
+    def __init__(self, ids: np.ndarray, columns: dict[str, np.ndarray]) -> None:
+        order = np.argsort(ids, kind="stable")
+        self.ids: np.ndarray = np.asarray(ids, dtype=np.int64)[order]
+        if len(self.ids) > 1 and not (np.diff(self.ids) > 0).all():
+            raise ValueError("mesh1kmid must be unique")
+
+        self.columns: dict[str, np.ndarray] = {
+            name: np.asarray(values, dtype=np.float64)[order]
+            for name, values in columns.items()
+        }
+
+        # 共有するので書き換え不可にしておく
+        self.ids.flags.writeable = False
+        for values in self.columns.values():
+            values.flags.writeable = False
+
+        # メッシュのポリゴンは ID ごとに不変なので、初回に作って使い回す
+        self._geometry: np.ndarray = np.full(len(self.ids), None, dtype=object)
+        self._geometry_lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "MeshStore":
+        """Build from an attribute table with `MESH_COLUMNS`."""
+        return cls(
+            df["mesh1kmid"].to_numpy(),
+            {name: df[name].to_numpy() for name in MESH_COLUMNS[1:]},
+        )
+
+    @classmethod
+    def from_codes(cls, ids) -> "MeshStore":
+        """
+        Build from mesh codes alone, decoding their bounds and centers.
+
+        Duplicates are dropped, and so are invalid codes (they are missing
+        from the store, as unknown ids are).
+        """
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        columns = decode(ids)
+        valid = ~np.isnan(columns["lon_min"])
+        return cls(
+            ids[valid],
+            {name: columns[name][valid] for name in MESH_COLUMNS[1:]},
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes + sum(v.nbytes for v in self.columns.values())
+
+    def positions(self, ids) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Look up row positions.
+
+        Args:
+            ids: mesh1kmid values.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Positions, and a mask of the ids that
+            were found (positions of missing ids are meaningless).
+        """
+        keys = np.asarray(ids, dtype=np.int64)
+        pos = np.searchsorted(self.ids, keys)
+        pos = np.minimum(pos, max(len(self.ids) - 1, 0))
+        if not len(self.ids):
+            return pos, np.zeros(len(keys), dtype=bool)
+        return pos, self.ids[pos] == keys
+
+    def take(self, name: str, ids) -> np.ndarray:
+        """Gather one attribute column for `ids` (NaN where missing)."""
+        pos, found = self.positions(ids)
+        return self._gather(name, pos, found)
+
+    def _gather(self, name: str, pos: np.ndarray, found: np.ndarray) -> np.ndarray:
+        if not len(self.ids):
+            return np.full(len(pos), np.nan)
+        return np.where(found, self.columns[name][pos], np.nan)
+
+    def geometries(self, ids) -> np.ndarray:
+        """
+        Gather the cell polygons of `ids`, building only those not built yet.
+
+        Args:
+            ids: mesh1kmid values.
+
+        Returns:
+            np.ndarray: shapely Polygons (None where the id is unknown).
+        """
+        pos, found = self.positions(ids)
+        if not len(self.ids):
+            return np.full(len(pos), None, dtype=object)
+
+        with self._geometry_lock:
+            missing = np.unique(pos[found])
+            missing = missing[shapely.is_missing(self._geometry[missing])]
+            if len(missing):
+                self._geometry[missing] = shapely.box(
+                    *(
+                        self.columns[name][missing]
+                        for name in ("lon_min", "lat_min", "lon_max", "lat_max")
+                    )
+                )
+
+        return np.where(found, self._geometry[pos], None)
+
+    @property
+    def geometry_count(self) -> int:
+        """Number of cells whose polygon has been built."""
+        return int((~shapely.is_missing(self._geometry)).sum())
+
+    def extended(self, ids) -> "MeshStore":
+        """
+        The store with the cells of `ids` it does not have decoded and added.
+
+        Polygons built so far are carried over to the new store.
+
+        Args:
+            ids: mesh1kmid values.
+
+        Returns:
+            MeshStore: `self` when nothing was added.
+        """
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        _, found = self.positions(ids)
+        added = MeshStore.from_codes(ids[~found])
+        if not len(added):
+            return self
+
+        merged = MeshStore(
+            np.concatenate([self.ids, added.ids]),
+            {
+                name: np.concatenate([values, added.columns[name]])
+                for name, values in self.columns.items()
+            },
+        )
+        pos, _ = merged.positions(self.ids)
+        with self._geometry_lock:
+            merged._geometry[pos] = self._geometry
+        return merged
+
+    def join(self, df: pd.DataFrame, on: str = "mesh1kmid") -> pd.DataFrame:
+        """
+        Left join the attributes onto `df` (like `merge_df(..., how="left")`).
+
+        Args:
+            df (pd.DataFrame): Data with a mesh1kmid column.
+            on (str): Name of the mesh1kmid column.
+
+        Returns:
+            pd.DataFrame: `df` with lon_min, lat_min, lon_max, lat_max, lon, lat.
+        """
+        pos, found = self.positions(df[on].to_numpy())
+        return df.assign(
+            **{
+                out: self._gather(name, pos, found)
+                for name, out in _OUTPUT_NAMES.items()
+            }
+        )
+
+
+class DecodedMeshes:
+    """
+    A `MeshStore` decoded from mesh codes that grows as cells are asked for.
+
+    Sessions share one per prefecture, so each cell is decoded and its polygon
+    built once per process.
+    """
+
+    def __init__(self) -> None:
+        self.store: MeshStore = MeshStore.from_codes([])
+        self._lock = threading.Lock()
+
+    def covering(self, ids) -> MeshStore:
+        """
+        Return a store that has every valid cell of `ids`.
+
+        Args:
+            ids: mesh1kmid values.
+
+        Returns:
+            MeshStore: Shared, read-only store.
+        """
+        with self._lock:
+            self.store = self.store.extended(ids)
+            return self.store
+
+
+@st.cache_resource(show_spinner=False)
+def get_decoded_meshes(pcode: int) -> DecodedMeshes:
+    """
+    プロセスで共有する、都道府県ごとのメッシュ属性を返す（メッシュコードから計算する）
+
+    Args:
+        pcode (int): Prefecture code.
+
+    Returns:
+        DecodedMeshes: Shared store of the prefecture.
+    """
+    return DecodedMeshes()
+
+
+@st.cache_resource(show_spinner="Loading mesh attributes...")
+def get_mesh_store(year: int = 2020) -> MeshStore:
+    """
+    プロセスで共有するメッシュ属性を返す（初回のみ読み込む）
+
+    Args:
+        year (int): Attribute year (2019 or 2020).
+
+    Returns:
+        MeshStore: Shared, read-only store.
+    """
+    df = fetch_data("mesh1km", year, MESH_COLUMNS, memory_cache=False)
+    return MeshStore.from_frame(df)
+
+
+def cross_check(
+    mesh: MeshStore, reference: MeshStore, atol: float = 1e-6
+) -> pd.DataFrame:
+    """
+    Compare a store with a reference (e.g. decoded codes with the attribute file).
+
+    Args:
+        mesh (MeshStore): Store to check.
+        reference (MeshStore): Store taken as correct.
+        atol (float): Tolerance in degrees (the attribute file has 6 decimals).
+
+    Returns:
+        pd.DataFrame: mesh1kmid and the largest difference of the ids that are
+        missing from `reference` (NaN) or differ by more than `atol`.
+    """
+    pos, found = reference.positions(mesh.ids)
+    error = np.zeros(len(mesh), dtype=np.float64)
+    for name in MESH_COLUMNS[1:]:
+        diff = np.abs(mesh.columns[name] - reference._gather(name, pos, found))
+        error = np.fmax(error, diff)
+    error[~found] = np.nan
+
+    bad = ~(error <= atol)
+    return pd.DataFrame({"mesh1kmid": mesh.ids[bad], "error": error[bad]})
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Check decoded mesh codes against the mesh attribute file."
+    )
+    parser.add_argument("command", choices=["check"])
+    parser.add_argument("--year", type=int, default=2020)
+    args = parser.parse_args(argv)
+
+    reference = get_mesh_store(args.year)
+    result = cross_check(MeshStore.from_codes(reference.ids), reference)
+    print(f"checked {len(reference):,d} cells, {len(result):,d} mismatches")
+    if len(result):
+        print(result.head(20).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
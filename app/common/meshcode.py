@@ -0,0 +1,166 @@
+"""Mesh Code
+
+地域メッシュ（JIS X 0410）の格子
+
+1km メッシュ（3 次メッシュ）は緯度 30" × 経度 45" の格子で、
+経度は東経 100 度を原点に数える.
+
+メッシュコードから区画の経緯度を計算できるので、属性ファイルは不要.
+
+Use:
+    bounds = decode(df["mesh1kmid"])
+    codes = encode(lon, lat)
+"""
+
+import numpy as np
+
+# 3 次メッシュの格子（度あたりのセル数）
+LAT_CELLS_PER_DEGREE = 120  # 30"
+LON_CELLS_PER_DEGREE = 80  # 45"
+LON_ORIGIN = 100
+
+
+def lattice_index(lon, lat) -> tuple[np.ndarray, np.ndarray]:
+    """
+    1km 格子の番号（セル中心の経緯度から求める）
+
+    Args:
+        lon: Cell center longitudes.
+        lat: Cell center latitudes.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Row (latitude) and column (longitude).
+    """
+    i = np.floor(np.asarray(lat, dtype=np.float64) * LAT_CELLS_PER_DEGREE)
+    j = np.floor(
+        (np.asarray(lon, dtype=np.float64) - LON_ORIGIN) * LON_CELLS_PER_DEGREE
+    )
+    return i.astype(np.int64), j.astype(np.int64)
+
+
+def code_to_lattice(codes) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    3 次メッシュコードを格子の番号に変換する
+
+    コード AABBCDEF は 1 次 (AA: 緯度 40', BB: 経度 1 度)、2 次 (C, D: 0-7)、
+    3 次 (E, F: 0-9) の区画番号を並べたもの.
+
+    Args:
+        codes: 8-digit mesh codes (mesh1kmid).
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: Row, column, and a mask of
+        the codes that are valid.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    aa, rest = np.divmod(codes, 1_000_000)
+    bb, rest = np.divmod(rest, 10_000)
+    c, rest = np.divmod(rest, 1000)
+    d, rest = np.divmod(rest, 100)
+    e, f = np.divmod(rest, 10)
+
+    valid = (codes >= 0) & (codes < 100_000_000) & (c < 8) & (d < 8)
+    i = aa * 80 + c * 10 + e
+    j = bb * 80 + d * 10 + f
+    return i, j, valid
+
+
+def lattice_to_code(i, j) -> np.ndarray:
+    """
+    格子の番号を 3 次メッシュコードに変換する
+
+    Args:
+        i: Rows (latitude).
+        j: Columns (longitude).
+
+    Returns:
+        np.ndarray: int64 mesh codes.
+    """
+    aa, r = np.divmod(np.asarray(i, dtype=np.int64), 80)
+    bb, s = np.divmod(np.asarray(j, dtype=np.int64), 80)
+    c, e = np.divmod(r, 10)
+    d, f = np.divmod(s, 10)
+    return aa * 1_000_000 + bb * 10_000 + c * 1000 + d * 100 + e * 10 + f
+
+
+def decode(codes) -> dict[str, np.ndarray]:
+    """
+    Decode mesh codes into cell bounds and centers.
+
+    Args:
+        codes: 8-digit mesh codes (mesh1kmid).
+
+    Returns:
+        dict[str, np.ndarray]: lon_min, lat_min, lon_max, lat_max, lon_center
+        and lat_center (float64, NaN for invalid codes), named like the
+        columns of the mesh attribute file.
+    """
+    i, j, valid = code_to_lattice(codes)
+    lat_min = np.where(valid, i / LAT_CELLS_PER_DEGREE, np.nan)
+    lon_min = np.where(valid, LON_ORIGIN + j / LON_CELLS_PER_DEGREE, np.nan)
+    return {
+        "lon_min": lon_min,
+        "lat_min": lat_min,
+        "lon_max": lon_min + 1 / LON_CELLS_PER_DEGREE,
+        "lat_max": lat_min + 1 / LAT_CELLS_PER_DEGREE,
+        "lon_center": lon_min + 0.5 / LON_CELLS_PER_DEGREE,
+        "lat_center": lat_min + 0.5 / LAT_CELLS_PER_DEGREE,
+    }
+
+
+def encode(lon, lat) -> np.ndarray:
+    """
+    Mesh codes of the cells containing the given points.
+
+    Args:
+        lon: Longitudes.
+        lat: Latitudes.
+
+    Returns:
+        np.ndarray: int64 mesh codes.
+    """
+    return lattice_to_code(*lattice_index(lon, lat))
+
+
+def shift(codes, di: int = 0, dj: int = 0) -> np.ndarray:
+    """
+    Codes of the cells `di` rows north and `dj` columns east.
+
+    Args:
+        codes: 8-digit mesh codes.
+        di (int): Rows to move (negative: south).
+        dj (int): Columns to move (negative: west).
+
+    Returns:
+        np.ndarray: int64 mesh codes.
+    """
+    i, j, _ = code_to_lattice(codes)
+    return lattice_to_code(i + di, j + dj)
+
+
+# 8 近傍（北から時計回り）
+NEIGHBOUR_OFFSETS: list[tuple[int, int]] = [
+    (1, 0),
+    (1, 1),
+    (0, 1),
+    (-1, 1),
+    (-1, 0),
+    (-1, -1),
+    (0, -1),
+    (1, -1),
+]
+
+
+def neighbours(codes) -> np.ndarray:
+    """
+    The 8 surrounding cells of each code.
+
+    Args:
+        codes: 8-digit mesh codes.
+
+    Returns:
+        np.ndarray: (n, 8) codes, N, NE, E, SE, S, SW, W, NW.
+    """
+    i, j, _ = code_to_lattice(codes)
+    di, dj = np.array(NEIGHBOUR_OFFSETS).T
+    return lattice_to_code(i[:, None] + di, j[:, None] + dj)
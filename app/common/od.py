@@ -0,0 +1,369 @@
+"""Origin-Destination
+
+市区町村単位発地別の滞在人口 (fromto) を (市区町村 × 居住地区分 × 平休日 × 時間帯) の
+配列に積み上げ、2 年分の増減・居住地区分ごとの構成比・増減率の高い市区町村をまとめて求める
+
+積み上げは bincount 1 回で済ませ、平休日・時間帯・市区町村の切り替えは配列の添字で
+引くだけにする（都道府県・月ごとに一度読み込めば、絞り込みを変えても再集計しない）.
+
+Use:
+    od = load_od(month=4)
+    df_origins = od.origins(dayflag=2, timezone=2)
+    df_top = od.top_cities(10, dayflag=2, timezone=2)
+"""
+
+from collections.abc import Sequence
+
+import numpy as np
+import pandas as pd
+
+from .compare import growth_rate
+from .schema import ALL_DAY, ALL_DAYS, DAYFLAG, FROM_AREA, TIMEZONE, conform
+from .utils import fetch_data_batch
+
+COLUMNS: list[str] = ["citycode", "from_area", "dayflag", "timezone", "population"]
+
+
+def _flag_index(value: int | None, dtype: pd.CategoricalDtype, default: int) -> int:
+    """区分の値から配列の添字を引く（None なら全日・終日）"""
+    return int(dtype.categories.get_loc(default if value is None else value))
+
+
+def _total(values: np.ndarray, axis: int) -> np.ndarray:
+    """NaN を除いた合計（すべて NaN なら NaN）"""
+    return np.where(
+        np.isnan(values).all(axis=axis), np.nan, np.nansum(values, axis=axis)
+    )
+
+
+def _ratio(part: np.ndarray, whole: np.ndarray) -> np.ndarray:
+    """構成比（全体が 0 か NaN なら NaN）"""
+    part, whole = np.broadcast_arrays(part, whole)
+    valid = ~np.isnan(whole) & (whole != 0)
+    ratio = np.full(part.shape, np.nan)
+    np.divide(part, whole, out=ratio, where=valid)
+    return ratio
+
+
+class ODCube:
+    """
+    Population of one prefecture and month by city, origin class, dayflag and
+    timezone.
+
+    Args:
+        citycodes (np.ndarray): Sorted, unique citycodes.
+        values (np.ndarray): (len(citycodes), from_area, dayflag, timezone)
+            population, NaN where the source has no row.
+    """
+
+    def __init__(self, citycodes: np.ndarray, values: np.ndarray) -> None:
+        self.citycodes: np.ndarray = np.asarray(citycodes, dtype=np.int64)
+        self.values: np.ndarray = np.asarray(values, dtype=np.float64)
+        self.values.flags.writeable = False
+
+    @classmethod
+    def from_frame(
+        cls, df: pd.DataFrame, citycodes: np.ndarray | None = None
+    ) -> "ODCube":
+        """
+        Stack a fromto table (rows with the same keys are summed).
+
+        Args:
+            df (pd.DataFrame): Table with `COLUMNS`.
+            citycodes (np.ndarray | None): Sorted citycodes to use as rows
+                (those of `df` when None; rows of other cities are dropped).
+
+        Returns:
+            ODCube: The stacked cube.
+        """
+        df = conform(df[COLUMNS], "fromto")
+        city = df["citycode"].to_numpy(dtype=np.int64)
+        if citycodes is None:
+            citycodes = np.unique(city)
+        citycodes = np.asarray(citycodes, dtype=np.int64)
+
+        shape = (
+            len(citycodes),
+            len(FROM_AREA.categories),
+            len(DAYFLAG.categories),
+            len(TIMEZONE.categories),
+        )
+        values = np.full(shape, np.nan)
+        if not len(df) or not len(citycodes):
+            return cls(citycodes, values)
+
+        rows = np.minimum(np.searchsorted(citycodes, city), len(citycodes) - 1)
+        keep = citycodes[rows] == city
+
+        # 区分はカテゴリ型なので、コードがそのまま添字になる
+        flat = np.ravel_multi_index(
+            (
+                rows[keep],
+                df["from_area"].cat.codes.to_numpy()[keep],
+                df["dayflag"].cat.codes.to_numpy()[keep],
+                df["timezone"].cat.codes.to_numpy()[keep],
+            ),
+            shape,
+        )
+        size = int(np.prod(shape))
+        sums = np.bincount(
+            flat,
+            weights=df["population"].to_numpy(dtype=np.float64)[keep],
+            minlength=size,
+        )
+        counts = np.bincount(flat, minlength=size)
+        values = np.where(counts > 0, sums, np.nan).reshape(shape)
+        return cls(citycodes, values)
+
+    def __len__(self) -> int:
+        return len(self.citycodes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.citycodes.nbytes + self.values.nbytes
+
+    def reindex(self, citycodes: np.ndarray) -> "ODCube":
+        """The cube with `citycodes` as rows (NaN for cities it does not have)."""
+        citycodes = np.asarray(citycodes, dtype=np.int64)
+        values = np.full((len(citycodes),) + self.values.shape[1:], np.nan)
+        if len(self):
+            pos = np.minimum(np.searchsorted(self.citycodes, citycodes), len(self) - 1)
+            found = self.citycodes[pos] == citycodes
+            values[found] = self.values[pos[found]]
+        return ODCube(citycodes, values)
+
+    def slice(
+        self, dayflag: int | None = None, timezone: int | None = None
+    ) -> np.ndarray:
+        """(city, from_area) population of one dayflag and timezone (a view)."""
+        return self.values[
+            :,
+            :,
+            _flag_index(dayflag, DAYFLAG, ALL_DAYS),
+            _flag_index(timezone, TIMEZONE, ALL_DAY),
+        ]
+
+
+class ODComparison:
+    """
+    Two years of `ODCube` on the same cities.
+
+    Args:
+        base (ODCube): Base year.
+        following (ODCube): Later year.
+        next_year (int): Later year (names the result columns like
+            `compare_years`).
+    """
+
+    def __init__(self, base: ODCube, following: ODCube, next_year: int = 2021) -> None:
+        citycodes = np.union1d(base.citycodes, following.citycodes)
+        self.citycodes: np.ndarray = citycodes
+        self.base: ODCube = base.reindex(citycodes)
+        self.following: ODCube = following.reindex(citycodes)
+        self.next_year = next_year
+        self.next_name = f"population_{next_year}"
+
+    def __len__(self) -> int:
+        return len(self.citycodes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.base.nbytes + self.following.nbytes
+
+    def _rows(self, citycode: Sequence[int] | None) -> np.ndarray:
+        """選択した市区町村の行（選択なしなら全行）"""
+        if not citycode:
+            return np.arange(len(self.citycodes))
+        return np.flatnonzero(np.isin(self.citycodes, list(citycode)))
+
+    def _slices(
+        self,
+        dayflag: int | None,
+        timezone: int | None,
+        citycode: Sequence[int] | None,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        rows = self._rows(citycode)
+        return (
+            rows,
+            self.base.slice(dayflag, timezone)[rows],
+            self.following.slice(dayflag, timezone)[rows],
+        )
+
+    def pivot(
+        self,
+        dayflag: int | None = None,
+        timezone: int | None = None,
+        citycode: Sequence[int] | None = None,
+        following: bool = True,
+    ) -> pd.DataFrame:
+        """
+        Population by city (rows) and origin class (columns).
+
+        Args:
+            dayflag (int | None): Dayflag (全日 when None).
+            timezone (int | None): Timezone (終日 when None).
+            citycode (Sequence[int] | None): Cities to keep (all when None or empty).
+            following (bool): Later year (base year when False).
+
+        Returns:
+            pd.DataFrame: Index `citycode`, columns `from_area` codes.
+        """
+        rows, base, later = self._slices(dayflag, timezone, citycode)
+        return pd.DataFrame(
+            later if following else base,
+            index=pd.Index(self.citycodes[rows], name="citycode"),
+            columns=pd.Index(FROM_AREA.categories, name="from_area"),
+        )
+
+    def shares(
+        self,
+        dayflag: int | None = None,
+        timezone: int | None = None,
+        citycode: Sequence[int] | None = None,
+        following: bool = True,
+    ) -> pd.DataFrame:
+        """
+        Share of each origin class in the visitors of each city (see `pivot`).
+
+        Returns:
+            pd.DataFrame: Rows sum to 1 (NaN where the city has no visitors).
+        """
+        df = self.pivot(dayflag, timezone, citycode, following)
+        values = df.to_numpy()
+        return pd.DataFrame(
+            _ratio(values, _total(values, axis=1)[:, None]),
+            index=df.index,
+            columns=df.columns,
+        )
+
+    def frame(
+        self,
+        dayflag: int | None = None,
+        timezone: int | None = None,
+        citycode: Sequence[int] | None = None,
+    ) -> pd.DataFrame:
+        """
+        Change of every city and origin class.
+
+        Returns:
+            pd.DataFrame: One row per city and origin class with `citycode`,
+            `from_area`, `population`, the later year, `delta` and `diff`
+            (as in `compare_years`).
+        """
+        rows, base, later = self._slices(dayflag, timezone, citycode)
+        n_area = base.shape[1]
+        return pd.DataFrame(
+            {
+                "citycode": np.repeat(self.citycodes[rows], n_area),
+                "from_area": pd.Categorical.from_codes(
+                    np.tile(np.arange(n_area), len(rows)), dtype=FROM_AREA
+                ),
+                "population": base.ravel(),
+                self.next_name: later.ravel(),
+                "delta": (later - base).ravel(),
+                "diff": growth_rate(later, base).ravel(),
+            }
+        )
+
+    def origins(
+        self,
+        dayflag: int | None = None,
+        timezone: int | None = None,
+        citycode: Sequence[int] | None = None,
+    ) -> pd.DataFrame:
+        """
+        Change and share of each origin class over the selected cities.
+
+        Returns:
+            pd.DataFrame: Index `from_area` codes; columns `population`, the
+            later year, `delta`, `diff`, `share` and `share_{year}`.
+        """
+        _, base, later = self._slices(dayflag, timezone, citycode)
+        base_total = _total(base, axis=0)
+        later_total = _total(later, axis=0)
+        return pd.DataFrame(
+            {
+                "population": base_total,
+                self.next_name: later_total,
+                "delta": later_total - base_total,
+                "diff": growth_rate(later_total, base_total),
+                "share": _ratio(base_total, _total(base_total, axis=0)),
+                f"share_{self.next_year}": _ratio(
+                    later_total, _total(later_total, axis=0)
+                ),
+            },
+            index=pd.Index(FROM_AREA.categories, name="from_area"),
+        )
+
+    def top_cities(
+        self,
+        n: int,
+        dayflag: int | None = None,
+        timezone: int | None = None,
+        from_area: int | None = None,
+        citycode: Sequence[int] | None = None,
+    ) -> pd.DataFrame:
+        """
+        Cities with the highest growth rate.
+
+        Args:
+            n (int): Number of cities.
+            dayflag (int | None): Dayflag (全日 when None).
+            timezone (int | None): Timezone (終日 when None).
+            from_area (int | None): Visitors of this origin class (all when None).
+            citycode (Sequence[int] | None): Cities to rank (all when None or empty).
+
+        Returns:
+            pd.DataFrame: Up to `n` rows with `citycode`, `population`, the
+            later year, `delta` and `diff`, by `diff` descending (cities
+            without a growth rate are left out).
+        """
+        rows, base, later = self._slices(dayflag, timezone, citycode)
+        if from_area is None:
+            base, later = _total(base, axis=1), _total(later, axis=1)
+        else:
+            k = int(FROM_AREA.categories.get_loc(from_area))
+            base, later = base[:, k], later[:, k]
+
+        diff = growth_rate(later, base)
+        ranked = np.flatnonzero(~np.isnan(diff))
+        ranked = ranked[np.argsort(-diff[ranked], kind="stable")][:n]
+        return pd.DataFrame(
+            {
+                "citycode": self.citycodes[rows][ranked],
+                "population": base[ranked],
+                self.next_name: later[ranked],
+                "delta": later[ranked] - base[ranked],
+                "diff": diff[ranked],
+            }
+        )
+
+
+def load_od(
+    month: int | None = None, years: Sequence[int] = (2020, 2021)
+) -> ODComparison:
+    """
+    選択中の都道府県の fromto を 2 年分並列で読み込み、積み上げる
+
+    平休日・時間帯・市区町村では絞り込まずに読むので、結果は都道府県・月ごとに
+    使い回せる.
+
+    Args:
+        month (int | None): Month (the month selected in the sidebar when None).
+        years (Sequence[int]): Base and later year.
+
+    Returns:
+        ODComparison: Both years on the same cities.
+    """
+    base_year, next_year = years
+    df_base, df_next = fetch_data_batch(
+        [
+            {"f": "fromto", "year": year, "columns": COLUMNS, "month": month}
+            for year in (base_year, next_year)
+        ],
+        # 結果は dataset_store に置くので、st.cache_data には残さない
+        memory_cache=False,
+    )
+    return ODComparison(
+        ODCube.from_frame(df_base), ODCube.from_frame(df_next), next_year
+    )
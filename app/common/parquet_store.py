@@ -0,0 +1,375 @@
+"""Parquet Store
+
+月別の CSV ZIP を事前に Parquet に変換しておく読み取り専用のデータセット
+
+都道府県 × 年 × 月で分割し (Hive 形式)、各ファイルはキーの順に並べて
+行グループの統計で絞り込めるようにする. 前年同月の人口と増減率も書いておく.
+MLIT_STORE_DIR を設定すると `fetch_data` は Blob より先にここを読む.
+
+    {MLIT_STORE_DIR}/mdp/prefcode=13/year=2021/month=04/part-0.parquet
+
+Build (run from app/, resumable):
+    python -m common.parquet_store build --store-dir /data/mlit --workers 8
+    python -m common.parquet_store status --store-dir /data/mlit
+"""
+
+import argparse
+import logging
+import os
+import re
+import threading
+import time
+from collections.abc import Callable, Iterable, Sequence
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .blob import blob_path, download_csv
+from .compare import growth_rate
+from .schema import conform
+
+logger = logging.getLogger(__name__)
+
+DATASETS: tuple[str, ...] = ("mdp", "fromto")
+PREFCODES: tuple[int, ...] = tuple(range(1, 48))
+YEARS: tuple[int, ...] = (2019, 2020, 2021)
+MONTHS: tuple[int, ...] = tuple(range(1, 13))
+
+# 分割に使う列（ファイルには書かず、パスから復元する）
+PARTITION_COLUMNS: list[str] = ["prefcode", "year", "month"]
+
+# 行を一意に決める列（この順に並べる）
+# mdp は平休日・時間帯で絞り込むので先頭に置き、行グループの統計で読み飛ばせるようにする
+KEYS: dict[str, list[str]] = {
+    "mdp": ["dayflag", "timezone", "mesh1kmid"],
+    "fromto": ["citycode", "dayflag", "timezone", "from_area"],
+}
+
+ROW_GROUP_ROWS = 64 * 1024
+PART_FILE = "part-0.parquet"
+
+_BLOB_PATH = re.compile(r"^(mdp|fromto)/(\d{2})/(\d{4})/(\d{2})/")
+
+Loader = Callable[[str, int, int, int], pd.DataFrame]
+
+
+def store_dir() -> Path | None:
+    """事前変換したデータセットの場所（MLIT_STORE_DIR 未設定なら使わない）"""
+    directory = os.environ.get("MLIT_STORE_DIR", "")
+    return Path(directory) if directory else None
+
+
+def partition_path(root: Path, f: str, pcode: int, year: int, month: int) -> Path:
+    """Path of one partition file."""
+    return (
+        Path(root)
+        / f
+        / f"prefcode={pcode:02}"
+        / f"year={year}"
+        / f"month={month:02}"
+        / PART_FILE
+    )
+
+
+def parse_blob_path(path: str) -> tuple[str, int, int, int] | None:
+    """
+    Dataset, prefcode, year and month of a monthly blob path.
+
+    Args:
+        path (str): e.g. "mdp/13/2021/04/monthly_mdp_mesh1km.csv.zip".
+
+    Returns:
+        tuple[str, int, int, int] | None: None for other paths (attributes).
+    """
+    match = _BLOB_PATH.match(path.lstrip("/"))
+    if match is None:
+        return None
+    f, pcode, year, month = match.groups()
+    return f, int(pcode), int(year), int(month)
+
+
+# read ----------------------------------------------------------------------
+
+
+def read(
+    path: str,
+    columns: list[str] | None = None,
+    filters: dict[str, list] | None = None,
+    root: Path | None = None,
+) -> pd.DataFrame | None:
+    """
+    Read the partition of a blob path from the store.
+
+    Args:
+        path (str): Blob path of the monthly ZIP.
+        columns (list[str] | None): Columns to keep (all when None).
+        filters (dict[str, list] | None): Row filters, see `_unzip_csv`.
+        root (Path | None): Store directory (MLIT_STORE_DIR when None).
+
+    Returns:
+        pd.DataFrame | None: None when the store is not configured or does not
+        have the partition (the caller falls back to blob storage).
+    """
+    root = root or store_dir()
+    parsed = parse_blob_path(path)
+    if root is None or parsed is None:
+        return None
+
+    f, pcode, year, month = parsed
+    file = partition_path(root, f, pcode, year, month)
+    if not file.exists():
+        return None
+
+    constants = dict(zip(PARTITION_COLUMNS, (pcode, year, month)))
+    file_filters = [
+        (k, "in", list(v)) for k, v in (filters or {}).items() if k not in constants
+    ]
+    # パスの値で決まる絞り込みは読む前に判定する
+    excluded = any(
+        constants[k] not in list(v)
+        for k, v in (filters or {}).items()
+        if k in constants
+    )
+
+    file_columns = (
+        None if columns is None else [c for c in columns if c not in constants]
+    )
+    try:
+        if file_columns is not None:
+            missing = set(file_columns) - set(pq.read_schema(file).names)
+            if missing:
+                raise ValueError(f"Columns not found in store: {sorted(missing)}")
+        df: pd.DataFrame = pd.read_parquet(
+            file, columns=file_columns, filters=file_filters or None
+        )
+    except (OSError, pa.ArrowException) as e:
+        logger.warning("parquet store: unreadable %s (%s)", file, e)
+        return None
+
+    if excluded:
+        df = df.iloc[:0]
+
+    for name, value in constants.items():
+        if columns is None or name in columns:
+            df[name] = np.full(len(df), value)
+
+    if columns is not None:
+        df = df[columns]
+    elif "prefcode" in df.columns:
+        # CSV と同じ列順（分割の列を先頭に）
+        df = df[PARTITION_COLUMNS + [c for c in df.columns if c not in constants]]
+    return conform(df, f)
+
+
+# build ---------------------------------------------------------------------
+
+
+def prepare(
+    df: pd.DataFrame, f: str, previous: pd.DataFrame | None = None
+) -> pd.DataFrame:
+    """
+    Shape one raw monthly table for the store.
+
+    Drops the partition columns, sorts rows by `KEYS` and adds the population
+    of the same month a year earlier (`population_prev`) and the growth rate
+    (`diff`, NaN where either year is missing or the earlier one is 0).
+
+    Args:
+        df (pd.DataFrame): Raw table of one prefecture and month.
+        f (str): Dataset ("mdp" or "fromto").
+        previous (pd.DataFrame | None): Raw table of the same month a year earlier.
+
+    Returns:
+        pd.DataFrame: Table to write.
+    """
+    keys = KEYS[f]
+    df = df.drop(columns=[c for c in PARTITION_COLUMNS if c in df.columns])
+    df = df.sort_values(keys, kind="stable", ignore_index=True)
+
+    if previous is None or not len(previous):
+        prev = np.full(len(df), np.nan)
+    else:
+        lookup = previous.groupby(keys, sort=False)["population"].sum()
+        index = pd.MultiIndex.from_frame(df[keys])
+        prev = lookup.reindex(index).to_numpy(dtype=np.float64)
+
+    df["population_prev"] = prev.astype(np.float32)
+    df["diff"] = growth_rate(df["population"].to_numpy(), prev).astype(np.float32)
+    return df
+
+
+def write_partition(df: pd.DataFrame, file: Path) -> None:
+    """Write one partition atomically (a crash leaves no partial file)."""
+    file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = file.with_name(f"{file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        pq.write_table(
+            pa.Table.from_pandas(df, preserve_index=False),
+            tmp,
+            row_group_size=ROW_GROUP_ROWS,
+            compression="zstd",
+        )
+        os.replace(tmp, file)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _fetch_raw(f: str, pcode: int, year: int, month: int) -> pd.DataFrame:
+    """Download one monthly table from blob storage (never from the store)."""
+    return download_csv(blob_path(f, pcode, year, month), stream=True, schema=f)
+
+
+def build_partitions(
+    root: Path,
+    f: str,
+    pcode: int,
+    month: int,
+    years: Sequence[int] = YEARS,
+    force: bool = False,
+    load: Loader = _fetch_raw,
+) -> int:
+    """
+    Build the partitions of one dataset, prefecture and month for all years.
+
+    The years are built together so each one can be compared with the year
+    before. Partitions that already exist are kept unless `force` is set.
+
+    Args:
+        root (Path): Store directory.
+        f (str): Dataset.
+        pcode (int): Prefecture code.
+        month (int): Month.
+        years (Sequence[int]): Years, in order.
+        force (bool): Rebuild existing partitions.
+        load (Loader): Fetches a raw table (f, pcode, year, month).
+
+    Returns:
+        int: Number of partitions written.
+    """
+    files = {y: partition_path(root, f, pcode, y, month) for y in years}
+    todo = [y for y in years if force or not files[y].exists()]
+    if not todo:
+        return 0
+
+    raw: dict[int, pd.DataFrame] = {}
+    for year in sorted({*todo, *(y - 1 for y in todo if y - 1 in years)}):
+        raw[year] = load(f, pcode, year, month)
+
+    for year in todo:
+        write_partition(prepare(raw[year], f, raw.get(year - 1)), files[year])
+    return len(todo)
+
+
+def _init_worker() -> None:
+    # 元の ZIP はキャッシュしない（変換後のストアを読まないようにもする）
+    os.environ["MLIT_CACHE_DIR"] = ""
+    os.environ["MLIT_STORE_DIR"] = ""
+
+
+def _build_job(root: Path, f: str, pcode: int, month: int, force: bool) -> int:
+    return build_partitions(root, f, pcode, month, force=force)
+
+
+def build(
+    root: Path,
+    datasets: Iterable[str] = DATASETS,
+    prefcodes: Iterable[int] = PREFCODES,
+    months: Iterable[int] = MONTHS,
+    workers: int = os.cpu_count() or 1,
+    force: bool = False,
+) -> dict[str, int]:
+    """
+    Build the store, one process per (dataset, prefecture, month) job.
+
+    Args:
+        root (Path): Store directory.
+        datasets (Iterable[str]): Datasets to build.
+        prefcodes (Iterable[int]): Prefectures to build.
+        months (Iterable[int]): Months to build.
+        workers (int): Worker processes.
+        force (bool): Rebuild existing partitions.
+
+    Returns:
+        dict[str, int]: Numbers of jobs, partitions written and failed jobs.
+    """
+    jobs = [(f, p, m) for f in datasets for p in prefcodes for m in months]
+    summary = {"jobs": len(jobs), "written": 0, "failed": 0}
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(
+        max_workers=max(1, workers), initializer=_init_worker
+    ) as executor:
+        futures = {
+            executor.submit(_build_job, Path(root), f, p, m, force): (f, p, m)
+            for f, p, m in jobs
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            f, p, m = futures[future]
+            try:
+                summary["written"] += future.result()
+            except Exception as e:  # 失敗したジョブは次回の実行で作り直す
+                summary["failed"] += 1
+                logger.warning("parquet store: %s/%02d/%02d failed (%s)", f, p, m, e)
+            if done % 50 == 0 or done == len(jobs):
+                logger.info(
+                    "parquet store: %d/%d jobs (%.0fs)",
+                    done,
+                    len(jobs),
+                    time.perf_counter() - started,
+                )
+    return summary
+
+
+def status(root: Path) -> dict[str, int]:
+    """Number of partitions and bytes in the store, per dataset."""
+    out: dict[str, int] = {}
+    for f in DATASETS:
+        files = list((Path(root) / f).glob(f"*/*/*/{PART_FILE}"))
+        out[f"{f}_partitions"] = len(files)
+        out[f"{f}_bytes"] = sum(p.stat().st_size for p in files)
+    out["expected_per_dataset"] = len(PREFCODES) * len(YEARS) * len(MONTHS)
+    return out
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Build the Parquet store from the monthly blob files."
+    )
+    parser.add_argument("command", choices=["build", "status"])
+    parser.add_argument("--store-dir", type=Path, default=store_dir())
+    parser.add_argument("--dataset", choices=DATASETS, action="append")
+    parser.add_argument("--pref", type=int, action="append")
+    parser.add_argument("--month", type=int, action="append")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.store_dir is None:
+        parser.error("set --store-dir or MLIT_STORE_DIR")
+
+    if args.command == "status":
+        for name, value in status(args.store_dir).items():
+            print(f"{name:>22}: {value:,d}")
+        return
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    summary = build(
+        args.store_dir,
+        args.dataset or DATASETS,
+        args.pref or PREFCODES,
+        args.month or MONTHS,
+        args.workers,
+        args.force,
+    )
+    print(
+        f"{summary['written']:,d} partitions written, "
+        f"{summary['failed']:,d} of {summary['jobs']:,d} jobs failed"
+    )
+
+
+if __name__ == "__main__":
+    main()
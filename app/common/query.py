@@ -0,0 +1,190 @@
+"""Query
+
+事前変換した Parquet ストア (`parquet_store`) に対する遅延評価のクエリ
+
+条件と列を積み上げておき、実行時に pyarrow.dataset に渡す. 分割（都道府県・年・月）は
+ディレクトリ単位で、平休日・時間帯は行グループの統計で読み飛ばし（mdp の分割ファイルは
+この順に並べてある）、必要な列だけを複数スレッドで読む.
+ストアがなければ None を返し、呼び出し側は pandas の経路に戻る.
+
+`comparison` が Arrow で扱うのは結合した表までで、ジオメトリの付与と LOD の集約は
+これまでどおり `_render_comparison` が pandas / GeoPandas で行う.
+
+Use:
+    table = (
+        Scan("mdp")
+        .where(prefcode=13, year=2021, month=4, dayflag=0)
+        .select("mesh1kmid", "population")
+        .to_table()
+    )
+    df_cmp = comparison(13, 4, dayflag=0, timezone=0)
+"""
+
+from collections.abc import Sequence
+from dataclasses import dataclass, replace
+from functools import reduce
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from .compare import growth_rate
+from .parquet_store import partition_path, store_dir
+from .schema import flags_or_all
+
+
+@dataclass(frozen=True)
+class Scan:
+    """
+    Lazy scan of one dataset in the Parquet store.
+
+    Args:
+        f (str): Dataset ("mdp" or "fromto").
+        root (Path | None): Store directory (MLIT_STORE_DIR when None).
+    """
+
+    f: str
+    root: Path | None = None
+    conditions: tuple[tuple[str, Any], ...] = ()
+    columns: tuple[str, ...] | None = None
+
+    def where(self, **conditions: Any) -> "Scan":
+        """
+        Add conditions (a list keeps rows in it; None or [] is no condition).
+
+        Returns:
+            Scan: A new scan.
+        """
+        added = tuple(
+            (name, value)
+            for name, value in conditions.items()
+            if value is not None and not (isinstance(value, list) and not value)
+        )
+        return replace(self, conditions=self.conditions + added)
+
+    def select(self, *columns: str) -> "Scan":
+        """Read only these columns."""
+        return replace(self, columns=columns)
+
+    def expression(self) -> ds.Expression | None:
+        """The conditions as one pyarrow filter."""
+        terms = [
+            (
+                ds.field(name).isin(value)
+                if isinstance(value, (list, tuple, set))
+                else ds.field(name) == value
+            )
+            for name, value in self.conditions
+        ]
+        return reduce(lambda a, b: a & b, terms) if terms else None
+
+    def dataset(self) -> ds.Dataset | None:
+        """The dataset, or None when the store is not configured."""
+        root = self.root or store_dir()
+        if root is None or not (Path(root) / self.f).is_dir():
+            return None
+        return ds.dataset(Path(root) / self.f, format="parquet", partitioning="hive")
+
+    def to_table(self) -> pa.Table | None:
+        """Run the scan (None when the store is not configured)."""
+        dataset = self.dataset()
+        if dataset is None:
+            return None
+        return dataset.to_table(
+            columns=list(self.columns) if self.columns is not None else None,
+            filter=self.expression(),
+            use_threads=True,
+        )
+
+
+def comparison(
+    pcode: int,
+    month: int,
+    dayflag: int | None = None,
+    timezone: int | None = None,
+    citycode: list[int] | None = None,
+    years: Sequence[int] = (2020, 2021),
+    root: Path | None = None,
+) -> pd.DataFrame | None:
+    """
+    The comparison of `compare_years` as one query over the Parquet store.
+
+    The later year is summed per cell and left-joined onto the base year
+    inside Arrow; only the joined columns are converted to pandas. Mesh
+    geometry and LOD aggregation are not part of the query.
+
+    The growth rate is computed here rather than read from the `diff` column
+    of the later partition: that one is float32, is per row of the later year
+    (cells only in the base year have no row), and is not summed over the
+    later year's duplicate cells as `compare_years` does.
+
+    Args:
+        pcode (int): Prefecture code.
+        month (int): Month.
+        dayflag (int | None): Keep only this dayflag (全日 when None).
+        timezone (int | None): Keep only this timezone (終日 when None).
+        citycode (list[int] | None): Keep only these citycodes.
+        years (Sequence[int]): Base and later year.
+        root (Path | None): Store directory (MLIT_STORE_DIR when None).
+
+    Returns:
+        pd.DataFrame | None: Same rows, columns and values as
+        `compare_years(df_base, df_next)` (one row per base-year row, in
+        order). None when the store does not have both partitions.
+    """
+    root = root or store_dir()
+    if root is None or not all(
+        partition_path(root, "mdp", pcode, y, month).exists() for y in years
+    ):
+        return None
+
+    base_year, next_year = years
+    dayflag, timezone = flags_or_all(dayflag, timezone)
+    scan = (
+        Scan("mdp", root)
+        .where(
+            prefcode=pcode,
+            month=month,
+            dayflag=dayflag,
+            timezone=timezone,
+            citycode=citycode,
+        )
+        .select("mesh1kmid", "population")
+    )
+    base = scan.where(year=base_year).to_table()
+    following = (
+        scan.where(year=next_year)
+        .to_table()
+        .group_by("mesh1kmid")
+        .aggregate([("population", "sum")])
+    )
+    following = following.rename_columns(
+        [
+            "population_next" if name == "population_sum" else name
+            for name in following.column_names
+        ]
+    )
+
+    # 結合は行の順を保たないので、基準年の行番号で並べ直す
+    base = base.append_column("_row", pa.array(np.arange(base.num_rows)))
+    joined = base.join(
+        following, "mesh1kmid", join_type="left outer", use_threads=True
+    ).sort_by("_row")
+
+    population = joined["population"].to_numpy()
+    population_next = (
+        joined["population_next"].cast(pa.float64()).to_numpy(zero_copy_only=False)
+    )
+    base_values = population.astype(np.float64)
+    return pd.DataFrame(
+        {
+            "mesh1kmid": joined["mesh1kmid"].to_numpy().astype(np.int64),
+            "population": population,
+            f"population_{next_year}": population_next,
+            "delta": population_next - base_values,
+            "diff": growth_rate(population_next, base_values),
+        }
+    )
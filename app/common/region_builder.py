@@ -1,16 +1,23 @@
 """Region Builder
 
+地域・都道府県・市区町村のマスタはプロセスで 1 回だけ読み込み、
+辞書に展開して引く（再実行ごとに CSV を読み直さない）.
+
 Use:
     prefecture, cities = region_builder()
+    registry = get_region_registry()
 """
 
-from typing import Any, Hashable
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any
 
 import pandas as pd
 import streamlit as st
 
+from .schema import Labels
+
 
-# @st.cache_data
 def _load_region(f) -> pd.DataFrame:
     if f == "pref":
         path = "assets/regioncode_master_utf8_2020.csv"
@@ -22,20 +29,107 @@ def _load_region(f) -> pd.DataFrame:
     return pd.read_csv(path)
 
 
-@st.cache_data
+@dataclass(frozen=True)
+class RegionRegistry:
+    """
+    Region masters indexed for direct lookups (read-only, shared).
+
+    Args:
+        regions (dict[str, list[int]]): Region name -> prefcodes.
+        prefectures (dict[int, str]): Prefcode -> prefecture name.
+        prefcodes (dict[str, int]): Prefecture name -> prefcode.
+        cities (dict[int, dict[str, int]]): Prefcode -> city name -> citycode.
+        city_names (dict[int, str]): Citycode -> city name.
+        hokkaido (dict[str, list[str]]): Hokkaido subregion -> city names.
+    """
+
+    regions: dict[str, list[int]]
+    prefectures: dict[int, str]
+    prefcodes: dict[str, int]
+    cities: dict[int, dict[str, int]]
+    city_names: dict[int, str]
+    hokkaido: dict[str, list[str]]
+
+    @classmethod
+    def from_frames(
+        cls, df_pref: pd.DataFrame, df_city: pd.DataFrame, df_hokkaido: pd.DataFrame
+    ) -> "RegionRegistry":
+        """Build from the region, city and Hokkaido subregion masters."""
+        regions: dict[str, list[int]] = {}
+        for region, code in zip(
+            df_pref["regionname"].tolist(), df_pref["prefcode"].tolist()
+        ):
+            regions.setdefault(region, []).append(code)
+
+        prefectures = dict(
+            zip(df_pref["prefcode"].tolist(), df_pref["prefname"].tolist())
+        )
+        # 市区町村マスタにしかない都道府県があっても引けるようにする
+        for code, name in zip(
+            df_city["prefcode"].tolist(), df_city["prefname"].tolist()
+        ):
+            prefectures.setdefault(code, name)
+
+        # 同名の市区町村（府中市など）があるので、名前は都道府県ごとに引く
+        cities: dict[int, dict[str, int]] = {}
+        for pref, code, name in zip(
+            df_city["prefcode"].tolist(),
+            df_city["citycode"].tolist(),
+            df_city["cityname"].tolist(),
+        ):
+            cities.setdefault(pref, {})[name] = code
+
+        hokkaido: dict[str, list[str]] = {}
+        for region, name in zip(
+            df_hokkaido["regionname"].tolist(), df_hokkaido["cityname"].tolist()
+        ):
+            hokkaido.setdefault(region, []).append(name)
+
+        return cls(
+            regions=regions,
+            prefectures=prefectures,
+            prefcodes={name: code for code, name in prefectures.items()},
+            cities=cities,
+            city_names=dict(
+                zip(df_city["citycode"].tolist(), df_city["cityname"].tolist())
+            ),
+            hokkaido=hokkaido,
+        )
+
+    @cached_property
+    def prefecture_labels(self) -> Labels:
+        """Prefcode -> prefecture name as a categorical lookup."""
+        return Labels.from_mapping(self.prefectures)
+
+    @cached_property
+    def city_labels(self) -> Labels:
+        """Citycode -> city name as a categorical lookup."""
+        return Labels.from_mapping(self.city_names)
+
+
+@st.cache_resource(show_spinner=False)
+def get_region_registry() -> RegionRegistry:
+    """
+    プロセスで共有する地域マスタを返す（初回のみ読み込む）
+
+    Returns:
+        RegionRegistry: Shared, read-only registry.
+    """
+    return RegionRegistry.from_frames(
+        _load_region("pref"), _load_region("city"), _load_region("hokkaido")
+    )
+
+
 def prefcode_to_name() -> tuple[dict[Any, Any], dict[Any, Any]]:
     """
     都道府県コードと都道府県名の dict を作成
     市区町村コードと市区町村名の dict を作成
 
     Returns:
-        tuple[dict[Any, Any], dict[Any, Any]]: dict.
+        tuple[dict[Any, Any], dict[Any, Any]]: dict (shared, do not modify).
     """
-    df: pd.DataFrame = _load_region("city")
-    return (
-        dict(zip(df["prefcode"], df["prefname"])),
-        dict(zip(df["citycode"], df["cityname"])),
-    )
+    registry = get_region_registry()
+    return registry.prefectures, registry.city_names
 
 
 def region_builder() -> tuple[None, None] | tuple[dict[Any, Any], dict[Any, Any]]:
@@ -53,8 +147,8 @@ def region_builder() -> tuple[None, None] | tuple[dict[Any, Any], dict[Any, Any]
     #     ██║  ██║███████╗╚██████╔╝██║╚██████╔╝██║ ╚████║
     #     ╚═╝  ╚═╝╚══════╝ ╚═════╝ ╚═╝ ╚═════╝ ╚═╝  ╚═══╝
 
-    df = _load_region("pref")
-    regions = df["regionname"].unique()
+    registry = get_region_registry()
+    regions = list(registry.regions)
     selected_region: str | None = st.pills("地域を選択してください", regions)
 
     if selected_region is None:
@@ -68,15 +162,16 @@ def region_builder() -> tuple[None, None] | tuple[dict[Any, Any], dict[Any, Any]
     #     ╚═╝     ╚═╝  ╚═╝╚══════╝╚═╝     ╚══════╝ ╚═════╝   ╚═╝    ╚═════╝ ╚═╝  ╚═╝╚══════╝╚══════╝
 
     if selected_region == "北海道":
-        df_hokkaido = _load_region("hokkaido")
-        regions_hokkaido = df_hokkaido["regionname"].unique()
+        regions_hokkaido = list(registry.hokkaido)
         selected_region_hokkaido: str | None = st.pills(
             "北海道の地域を選択してください",
             regions_hokkaido,
             default=regions_hokkaido[0],
         )
 
-    prefectures = df[df["regionname"] == selected_region]["prefname"].tolist()
+    prefectures = [
+        registry.prefectures[code] for code in registry.regions[selected_region]
+    ]
 
     if len(prefectures) == 1:
         selected_prefecture = prefectures[0]
@@ -87,11 +182,8 @@ def region_builder() -> tuple[None, None] | tuple[dict[Any, Any], dict[Any, Any]
             default=prefectures[0],
         )
 
-    pref_data = df[df["prefname"] == selected_prefecture][
-        ["prefcode", "prefname"]
-    ].to_dict(orient="records")
-
-    pref_dict = {item["prefcode"]: item["prefname"] for item in pref_data}
+    prefcode = registry.prefcodes.get(selected_prefecture)
+    pref_dict = {} if prefcode is None else {prefcode: selected_prefecture}
     # st.write(pref_dict)
 
     #      ██████╗██╗████████╗██╗███████╗███████╗
@@ -101,16 +193,12 @@ def region_builder() -> tuple[None, None] | tuple[dict[Any, Any], dict[Any, Any]
     #     ╚██████╗██║   ██║   ██║███████╗███████║
     #      ╚═════╝╚═╝   ╚═╝   ╚═╝╚══════╝╚══════╝
 
-    df_city: pd.DataFrame = _load_region("city")
+    city_codes: dict[str, int] = registry.cities.get(prefcode, {})
 
     if selected_region == "北海道":
-        city_name = df_hokkaido[df_hokkaido["regionname"] == selected_region_hokkaido][
-            "cityname"
-        ].tolist()
+        city_name = registry.hokkaido.get(selected_region_hokkaido, [])
     else:
-        city_name = df_city[df_city["prefname"] == selected_prefecture][
-            "cityname"
-        ].tolist()
+        city_name = list(city_codes)
 
     if selected_prefecture:
         with st.expander("市区町村を選択できます", expanded=True):
@@ -122,12 +210,8 @@ def region_builder() -> tuple[None, None] | tuple[dict[Any, Any], dict[Any, Any]
                 label_visibility="collapsed",
             )
 
-        city_data: list[dict[Hashable, Any]] = df_city[
-            df_city["cityname"].isin(cities)
-        ][["citycode", "cityname"]].to_dict(orient="records")
-
         city_dict: dict[Any, Any] = {
-            item["citycode"]: item["cityname"] for item in city_data
+            city_codes[name]: name for name in cities if name in city_codes
         }
         # st.write(city_dict)
     else:
@@ -0,0 +1,77 @@
+"""Render Cache
+
+描画済みの地図 HTML をプロセス全体で共有する LRU キャッシュ
+
+選択条件（データセット・都道府県・市区町村・月・平休日・時間帯・描画方法）と
+元データの版（`utils.data_version`）をキーにして、同じ条件の表示はデータの読み込みから
+描画までを丸ごと省く. データが更新されればキーが変わるので描き直す.
+容量は HTML のバイト数で数え、上限を超えたら古いものから捨てる.
+
+Use:
+    key = selection_key(dataset="mdp", pref=[13], month=4, renderer="folium")
+    rendered = cache.get(key)
+    if rendered is None:
+        rendered = cache.put(key, RenderedMap(build_html(), {"records": n}))
+"""
+
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any
+
+import streamlit as st
+
+from .dataset_store import LRUStore
+
+DEFAULT_MAX_MB = 256
+
+
+@dataclass(frozen=True)
+class RenderedMap:
+    """
+    A finished map page.
+
+    Args:
+        html (str): HTML to embed.
+        meta (dict[str, Any]): Small values shown next to the map (e.g. the
+            number of cells).
+    """
+
+    html: str
+    meta: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.html.encode("utf-8")) + len(json.dumps(self.meta, default=str))
+
+
+class RenderCache(LRUStore):
+    """
+    Thread-safe LRU cache of rendered maps bounded by their size in bytes.
+
+    Args:
+        max_bytes (int): Size limit. Least recently used entries are evicted.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        super().__init__(max_bytes, size=lambda rendered: rendered.nbytes)
+
+
+@st.cache_resource(show_spinner=False)
+def _shared_cache(max_bytes: int) -> RenderCache:
+    return RenderCache(max_bytes)
+
+
+def get_render_cache() -> RenderCache | None:
+    """
+    環境変数の設定から、プロセスで共有する描画キャッシュを返す
+
+    - MLIT_RENDER_CACHE_MB: 容量上限 (MB)（0 で無効化）
+
+    Returns:
+        RenderCache | None: MLIT_RENDER_CACHE_MB が 0 の場合は None.
+    """
+    max_mb = float(os.environ.get("MLIT_RENDER_CACHE_MB", DEFAULT_MAX_MB))
+    if max_mb <= 0:
+        return None
+    return _shared_cache(int(max_mb * 2**20))
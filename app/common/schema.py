@@ -0,0 +1,248 @@
+"""Schema
+
+データセットごとの列の型の宣言と、読み込み時の検証
+
+平休日・時間帯・居住地区分は値の決まった区分なので、`Const` の区分を持つ
+カテゴリ型（コードは int8）で持つ. コードや年月は値の範囲に収まる最小の整数型、
+人口は float32 にする. メッシュの経緯度は 1e-5 度の精度が要るので float64 のまま.
+
+`pd.read_csv` に小さい整数型を渡すと範囲外の値が黙って桁あふれするので、整数と区分は
+推論させたまま読み、`conform` で範囲と区分を確かめてから変換する.
+
+表示名への置き換えは `Labels` で、コード → カテゴリ番号の配列を作るだけにする
+（行ごとに文字列を作らない）.
+
+Use:
+    chunks = pd.read_csv(f, dtype=csv_dtypes("mdp"), chunksize=100_000)
+    df = pd.concat(conform(chunk, "mdp") for chunk in chunks)
+    df["dayflag"] = DAYFLAG_LABELS.decode(df["dayflag"])
+"""
+
+from collections.abc import Mapping
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .const import Const
+
+
+class SchemaError(ValueError):
+    """A column does not fit the declared schema."""
+
+
+def _categories(labels: dict[int, str]) -> pd.CategoricalDtype:
+    return pd.CategoricalDtype(pd.Index(list(labels), dtype="int8"))
+
+
+# 区分の型（カテゴリはコードの値、表示名は `Const` を参照）
+DAYFLAG = _categories(Const.dayflag)
+TIMEZONE = _categories(Const.timezone)
+FROM_AREA = _categories(Const.from_area)
+
+# 平休日・時間帯を選んでいないときに使う区分（全日・終日）
+# （0 と 1 を足すと全日・終日と重なるので、区分をまたいで合計しない）
+ALL_DAYS = 2
+ALL_DAY = 2
+
+Dtype = str | pd.CategoricalDtype
+
+SCHEMAS: dict[str, dict[str, Dtype]] = {
+    "mdp": {
+        "mesh1kmid": "int32",
+        "prefcode": "int8",
+        "citycode": "int32",
+        "year": "int16",
+        "month": "int8",
+        "dayflag": DAYFLAG,
+        "timezone": TIMEZONE,
+        "population": "float32",
+    },
+    "fromto": {
+        "prefcode": "int8",
+        "citycode": "int32",
+        "year": "int16",
+        "month": "int8",
+        "dayflag": DAYFLAG,
+        "timezone": TIMEZONE,
+        "from_area": FROM_AREA,
+        "population": "float32",
+    },
+    "mesh1km": {
+        "mesh1kmid": "int32",
+        "lon_min": "float64",
+        "lat_min": "float64",
+        "lon_max": "float64",
+        "lat_max": "float64",
+        "lon_center": "float64",
+        "lat_center": "float64",
+    },
+}
+
+
+def flags_or_all(dayflag: int | None, timezone: int | None) -> tuple[int, int]:
+    """
+    Dayflag and timezone to compare, with 全日・終日 for no selection.
+
+    Rows of every dayflag and timezone must never be mixed: each mesh cell or
+    city has one row per slice, and the 全日・終日 rows already hold the totals.
+
+    Args:
+        dayflag (int | None): Selected dayflag.
+        timezone (int | None): Selected timezone.
+
+    Returns:
+        tuple[int, int]: (dayflag, timezone).
+    """
+    return (
+        ALL_DAYS if dayflag is None else dayflag,
+        ALL_DAY if timezone is None else timezone,
+    )
+
+
+def csv_dtypes(name: str | None) -> dict[str, str] | None:
+    """
+    dtypes to pass to `pd.read_csv` (only the floating point columns; integers
+    and categories are checked and converted by `conform`).
+
+    Args:
+        name (str | None): Dataset ("mdp", "fromto" or "mesh1km").
+
+    Returns:
+        dict[str, str] | None: None for unknown datasets.
+    """
+    if name not in SCHEMAS:
+        return None
+    return {
+        column: dtype
+        for column, dtype in SCHEMAS[name].items()
+        if isinstance(dtype, str) and dtype.startswith("float")
+    }
+
+
+def conform(df: pd.DataFrame, name: str | None) -> pd.DataFrame:
+    """
+    Check the columns of `df` declared in the schema and convert them.
+
+    Columns that are not declared (or not in `df`) are left alone, so column
+    subsets and derived columns pass through.
+
+    Args:
+        df (pd.DataFrame): Table as read.
+        name (str | None): Dataset ("mdp", "fromto" or "mesh1km"); None or an
+            unknown name returns `df` unchanged.
+
+    Returns:
+        pd.DataFrame: Table with the declared dtypes.
+
+    Raises:
+        SchemaError: If a value is missing, out of range for its integer type
+            or not one of the categories.
+    """
+    schema = SCHEMAS.get(name or "")
+    if schema is None:
+        return df
+
+    converted: dict[str, pd.Series] = {}
+    for column, dtype in schema.items():
+        if column not in df.columns or df[column].dtype == dtype:
+            continue
+        converted[column] = _convert(df[column], dtype)
+
+    if not converted:
+        return df
+    return df.assign(**converted)
+
+
+def _convert(series: pd.Series, dtype: Dtype) -> pd.Series:
+    name = series.name
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # ファイルから読み直したカテゴリは元の値に戻してから揃える
+        series = series.astype(series.cat.categories.dtype)
+
+    if isinstance(dtype, pd.CategoricalDtype):
+        unknown = ~series.isin(dtype.categories)
+        if unknown.any():
+            values = sorted(series[unknown].unique().tolist(), key=str)[:5]
+            raise SchemaError(f"{name}: unknown values {values}")
+        return series.astype(dtype.categories.dtype).astype(dtype)
+
+    if np.dtype(dtype).kind in "iu" and len(series):
+        if series.isna().any():
+            raise SchemaError(f"{name}: missing values")
+        info = np.iinfo(dtype)
+        if series.min() < info.min or series.max() > info.max:
+            raise SchemaError(f"{name}: values out of range for {dtype}")
+
+    return series.astype(dtype)
+
+
+@dataclass(frozen=True)
+class Labels:
+    """
+    Lookup from codes to display names as a categorical dtype.
+
+    Args:
+        codes (np.ndarray): Sorted codes.
+        positions (np.ndarray): Category of each code (codes may share a name).
+        dtype (pd.CategoricalDtype): Unique names as categories.
+    """
+
+    codes: np.ndarray
+    positions: np.ndarray
+    dtype: pd.CategoricalDtype
+
+    @classmethod
+    def from_mapping(cls, labels: Mapping[int, str]) -> "Labels":
+        """Build from a code -> name dict (e.g. `Const.dayflag`)."""
+        codes = np.array(sorted(labels), dtype=np.int64)
+        names = pd.Index([labels[c] for c in codes.tolist()])
+        categories = names.unique()
+        return cls(
+            codes=codes,
+            positions=categories.get_indexer(names),
+            dtype=pd.CategoricalDtype(categories),
+        )
+
+    def decode(self, series: pd.Series) -> pd.Series:
+        """
+        Replace codes with their names (unknown codes become NaN).
+
+        A categorical input only has its categories looked up; the names are
+        never materialized per row.
+
+        Args:
+            series (pd.Series): Codes, plain or categorical.
+
+        Returns:
+            pd.Series: Categorical of names with the index of `series`.
+        """
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            lookup = np.append(self._positions(series.cat.categories.to_numpy()), -1)
+            positions = lookup[series.cat.codes.to_numpy()]
+        else:
+            positions = self._positions(series.to_numpy())
+
+        return pd.Series(
+            pd.Categorical.from_codes(positions, dtype=self.dtype),
+            index=series.index,
+            name=series.name,
+        )
+
+    def _positions(self, values: np.ndarray) -> np.ndarray:
+        """各コードのカテゴリ番号（ないコードは -1）"""
+        values = np.asarray(values, dtype=np.float64)
+        found = ~np.isnan(values)
+        index = np.searchsorted(self.codes, values[found])
+        index = np.minimum(index, len(self.codes) - 1)
+
+        out = np.full(len(values), -1, dtype=np.int64)
+        out[found] = np.where(
+            self.codes[index] == values[found], self.positions[index], -1
+        )
+        return out
+
+
+DAYFLAG_LABELS = Labels.from_mapping(Const.dayflag)
+TIMEZONE_LABELS = Labels.from_mapping(Const.timezone)
+FROM_AREA_LABELS = Labels.from_mapping(Const.from_area)
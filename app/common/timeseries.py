@@ -0,0 +1,294 @@
+"""Time Series
+
+複数月の滞在人口を (メッシュ × 月) の配列に積み上げ、増減をまとめて計算する
+
+月を動かすたびに読み込み・結合し直さなくて済むように、指標は配列全体に対して
+一度だけ計算し、表示する月の列を取り出すだけにする. `load_cube` はすべての指標を
+求めてから返すので、共有の置き場 (`dataset_store`) に入れた後で大きさは変わらない.
+
+Use:
+    cube = load_cube(month_range((2019, 1), (2021, 12)), dayflag=0, timezone=0)
+    df = cube.frame((2021, 4), ["yoy", "baseline"])
+"""
+
+from collections.abc import Mapping, Sequence
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .compare import growth_rate
+from .schema import flags_or_all
+from .utils import fetch_data_batch
+
+Period = tuple[int, int]  # (年, 月)
+
+# データのある期間
+FIRST_PERIOD: Period = (2019, 1)
+LAST_PERIOD: Period = (2021, 12)
+
+BASELINE_YEAR = 2019
+ROLLING_WINDOW = 3
+
+# 指標とその表示名
+METRICS: dict[str, str] = {
+    "yoy": "前年同月比",
+    "mom": "前月比",
+    "baseline": f"{BASELINE_YEAR} 年同月比",
+    "rolling": f"{ROLLING_WINDOW} か月移動平均",
+}
+
+# 増減率の指標（それ以外は人口）
+RATE_METRICS: tuple[str, ...] = ("yoy", "mom", "baseline")
+
+
+def month_range(start: Period, end: Period) -> list[Period]:
+    """
+    Consecutive months from `start` to `end` (inclusive).
+
+    Args:
+        start (Period): First (year, month).
+        end (Period): Last (year, month).
+
+    Returns:
+        list[Period]: (year, month) pairs.
+    """
+    first = start[0] * 12 + start[1] - 1
+    last = end[0] * 12 + end[1] - 1
+    return [(k // 12, k % 12 + 1) for k in range(first, last + 1)]
+
+
+def period_label(period: Period) -> str:
+    """ "2021-04" 形式の表示名"""
+    return f"{period[0]}-{period[1]:02}"
+
+
+class MeshCube:
+    """
+    Population of every mesh cell over consecutive months.
+
+    Args:
+        ids (np.ndarray): Sorted, unique mesh1kmid.
+        periods (Sequence[Period]): Consecutive (year, month) pairs.
+        values (np.ndarray): (len(ids), len(periods)) population, NaN where a
+            cell has no data for the month.
+    """
+
+    def __init__(
+        self, ids: np.ndarray, periods: Sequence[Period], values: np.ndarray
+    ) -> None:
+        self.ids: np.ndarray = np.asarray(ids, dtype=np.int64)
+        self.periods: list[Period] = [tuple(p) for p in periods]
+        if not self.periods or self.periods != month_range(
+            self.periods[0], self.periods[-1]
+        ):
+            raise ValueError("periods must be consecutive months")
+
+        self.values: np.ndarray = np.asarray(values, dtype=np.float32)
+        self.values.flags.writeable = False
+        self._metrics: dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_frames(
+        cls,
+        frames: Mapping[Period, pd.DataFrame],
+        on: str = "mesh1kmid",
+        value: str = "population",
+    ) -> "MeshCube":
+        """
+        Stack one frame per month (rows of the same cell in a month are summed).
+
+        Args:
+            frames (Mapping[Period, pd.DataFrame]): Frames keyed by (year, month).
+            on (str): Mesh id column.
+            value (str): Population column.
+
+        Returns:
+            MeshCube: The stacked cube.
+        """
+        periods = sorted(frames)
+        ids = np.unique(
+            np.concatenate(
+                [frames[p][on].to_numpy(dtype=np.int64) for p in periods]
+                or [np.array([], dtype=np.int64)]
+            )
+        )
+
+        values = np.full((len(ids), len(periods)), np.nan, dtype=np.float32)
+        for k, period in enumerate(periods):
+            df = frames[period]
+            if not len(df):
+                continue
+            rows = np.searchsorted(ids, df[on].to_numpy(dtype=np.int64))
+            column = np.zeros(len(ids), dtype=np.float64)
+            np.add.at(column, rows, df[value].to_numpy(dtype=np.float64))
+            present = np.zeros(len(ids), dtype=bool)
+            present[rows] = True
+            values[present, k] = column[present]
+
+        return cls(ids, periods, values)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the values and the metrics computed so far."""
+        with self._lock:
+            metrics = sum(m.nbytes for m in self._metrics.values())
+        return self.ids.nbytes + self.values.nbytes + metrics
+
+    def index(self, period: Period) -> int:
+        """Column of `period` (ValueError if it is not in the cube)."""
+        return self.periods.index(tuple(period))
+
+    def shifted(self, lag: int) -> np.ndarray:
+        """Values `lag` months earlier in each column (NaN before the start)."""
+        out = np.full(self.values.shape, np.nan, dtype=np.float32)
+        if lag < len(self.periods):
+            out[:, lag:] = self.values[:, : len(self.periods) - lag]
+        return out
+
+    def metric(self, name: str) -> np.ndarray:
+        """
+        Compute a metric for every cell and month (only the first time).
+
+        Args:
+            name (str): One of `METRICS`.
+
+        Returns:
+            np.ndarray: (len(ids), len(periods)) float64 array.
+        """
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = self._compute(name)
+            return self._metrics[name]
+
+    def compute_metrics(self, names: Sequence[str] = tuple(METRICS)) -> "MeshCube":
+        """
+        Compute metrics up front (e.g. before the cube is shared, so that its
+        size no longer changes).
+
+        Returns:
+            MeshCube: `self`, for chaining.
+        """
+        for name in names:
+            self.metric(name)
+        return self
+
+    def _compute(self, name: str) -> np.ndarray:
+        if name == "yoy":
+            result = growth_rate(self.values, self.shifted(12))
+        elif name == "mom":
+            result = growth_rate(self.values, self.shifted(1))
+        elif name == "baseline":
+            result = growth_rate(self.values, self._baseline())
+        elif name == "rolling":
+            result = self._rolling_mean(ROLLING_WINDOW)
+        else:
+            raise ValueError(f"unknown metric: {name}")
+        result.flags.writeable = False
+        return result
+
+    def _baseline(self) -> np.ndarray:
+        """同じ月の基準年 (2019) の人口（期間に含まれなければ NaN）"""
+        out = np.full(self.values.shape, np.nan, dtype=np.float32)
+        for k, (_, month) in enumerate(self.periods):
+            if (BASELINE_YEAR, month) in self.periods:
+                out[:, k] = self.values[:, self.index((BASELINE_YEAR, month))]
+        return out
+
+    def _rolling_mean(self, window: int) -> np.ndarray:
+        """直近 `window` か月の平均（欠けている月があれば NaN）"""
+        n = len(self.periods)
+        out = np.full(self.values.shape, np.nan)
+        if window > n:
+            return out
+
+        # 累積和の差で窓ごとの合計と欠けた月の数を求める
+        sums = np.zeros((len(self.ids), n + 1))
+        sums[:, 1:] = np.cumsum(np.nan_to_num(self.values, nan=0.0), axis=1)
+        gaps = np.zeros((len(self.ids), n + 1))
+        gaps[:, 1:] = np.cumsum(np.isnan(self.values), axis=1)
+
+        total = sums[:, window:] - sums[:, : n - window + 1]
+        missing = gaps[:, window:] - gaps[:, : n - window + 1]
+        out[:, window - 1 :] = np.where(missing == 0, total / window, np.nan)
+        return out
+
+    def frame(
+        self, period: Period, metrics: Sequence[str] = (), on: str = "mesh1kmid"
+    ) -> pd.DataFrame:
+        """
+        Population and metrics of one month.
+
+        Args:
+            period (Period): (year, month).
+            metrics (Sequence[str]): Names from `METRICS` to add as columns.
+            on (str): Name of the mesh id column.
+
+        Returns:
+            pd.DataFrame: Cells with data in `period`.
+        """
+        k = self.index(period)
+        present = ~np.isnan(self.values[:, k])
+        return pd.DataFrame(
+            {
+                on: self.ids[present],
+                "population": self.values[present, k],
+                **{name: self.metric(name)[present, k] for name in metrics},
+            }
+        )
+
+    def totals(self) -> pd.Series:
+        """Total population per month."""
+        return pd.Series(
+            np.nansum(self.values, axis=0, dtype=np.float64),
+            index=[period_label(p) for p in self.periods],
+            name="population",
+        )
+
+
+def load_cube(
+    periods: Sequence[Period],
+    dayflag: int | None = None,
+    timezone: int | None = None,
+    citycode: list[int] | None = None,
+) -> MeshCube:
+    """
+    1km メッシュの滞在人口を月ごとに並列で読み込み、積み上げる
+
+    一度読んだ月はディスクキャッシュから読み直す
+    （メモリには `dataset_store` に置いた 1 つだけを持つ）.
+
+    Args:
+        periods (Sequence[Period]): Consecutive (year, month) pairs.
+        dayflag (int | None): Keep only this dayflag (全日 when None).
+        timezone (int | None): Keep only this timezone (終日 when None).
+        citycode (list[int] | None): Keep only these citycodes.
+
+    Returns:
+        MeshCube: Population of the selected prefecture, with every metric
+        computed.
+    """
+    dayflag, timezone = flags_or_all(dayflag, timezone)
+    frames = fetch_data_batch(
+        [
+            {
+                "f": "mdp",
+                "year": year,
+                "month": month,
+                "columns": ["mesh1kmid", "population"],
+                "dayflag": dayflag,
+                "timezone": timezone,
+                "citycode": citycode,
+            }
+            for year, month in periods
+        ],
+        # 結果は dataset_store に置くので、st.cache_data には残さない
+        memory_cache=False,
+    )
+    # 共有の置き場に入れる前に指標をすべて求め、大きさを確定させる
+    return MeshCube.from_frames(dict(zip(periods, frames))).compute_metrics()
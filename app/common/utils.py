@@ -8,70 +8,182 @@
 """
 
 import zipfile
-from io import BytesIO
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any
 
 import geopandas as gpd
 import pandas as pd
 import requests
+import shapely
 import streamlit as st
 from shapely.geometry import Polygon, box
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from streamlit.runtime.state.session_state_proxy import SessionStateProxy
 
+from . import parquet_store
+from .blob import MAX_WORKERS, blob_path, download_csv
+from .disk_cache import get_disk_cache
 
-@st.cache_data(show_spinner="unzip...")
-def _unzip_csv(path: str) -> pd.DataFrame:
+if TYPE_CHECKING:
+    from .mesh_store import MeshStore
+
+# st.cache_data に残す表の数と秒数
+# （列・絞り込みごとに別の表になるので、選んだ切り口が溜まり続けないようにする）
+MEMORY_CACHE_ENTRIES = 32
+MEMORY_CACHE_TTL = 60 * 60
+
+
+@st.cache_data(
+    show_spinner="unzip...", max_entries=MEMORY_CACHE_ENTRIES, ttl=MEMORY_CACHE_TTL
+)
+def _unzip_csv(
+    path: str,
+    stream: bool = False,
+    columns: list[str] | None = None,
+    filters: dict[str, list] | None = None,
+    schema: str | None = None,
+) -> pd.DataFrame:
+    """Memory-cached `_load_csv` (bounded by entries and age)."""
+    return _load_csv(path, stream, columns, filters, schema)
+
+
+def _load_csv(
+    path: str,
+    stream: bool = False,
+    columns: list[str] | None = None,
+    filters: dict[str, list] | None = None,
+    schema: str | None = None,
+) -> pd.DataFrame:
     """
     Fetch and unzip CSV data from blob storage.
 
-    Args:
-        path: Relative path to the ZIP file in blob storage
+    Partitions of the prebuilt store (see `parquet_store`) are read first;
+    other tables are downloaded with `blob.download_csv`, which takes the
+    same arguments.
 
     Returns:
         DataFrame containing the CSV data
+    """
+    # 事前変換したストアにあればそれを使う（MLIT_STORE_DIR）
+    stored = parquet_store.read(path.lstrip("/"), columns, filters)
+    if stored is not None:
+        return stored
+
+    return download_csv(path, stream, columns, filters, schema)
+
 
-    Raises:
-        requests.RequestException: If the HTTP request fails
-        zipfile.BadZipFile: If the downloaded content is not a valid ZIP file
-        ValueError: If no CSV file is found in the ZIP archive
+def data_version(path: str) -> str | None:
     """
-    base = st.secrets.blob.url.rstrip("/")
-    clean_path = path.lstrip("/")
-    url = f"{base}/{clean_path}?{st.secrets.blob.token.lstrip('?')}"
+    Version of the table that `_load_csv` reads for `path`.
 
-    # Fetch the ZIP file
-    response: requests.Response = requests.get(url, timeout=10)
-    response.raise_for_status()
-    f = BytesIO(response.content)
+    The modification time of the store partition when the store has one,
+    otherwise the ETag (or Last-Modified) of the copy in the disk cache.
 
-    # Extract CSV from ZIP
-    try:
-        with zipfile.ZipFile(f) as z:
-            file_list: list[str] = z.namelist()
+    Args:
+        path: Relative path to the ZIP file in blob storage
 
-            for filename in file_list:
-                if filename.endswith(".csv"):
-                    with z.open(filename) as csv_file:
-                        df: pd.DataFrame = pd.read_csv(csv_file)
-                        return df
+    Returns:
+        Version string, or None when the table has not been downloaded yet
+        (or the disk cache is disabled, or the server sent no validator)
+    """
+    clean_path = path.lstrip("/")
 
-            # No CSV found in the archive
-            raise ValueError("No CSV file found in ZIP archive")
-    except zipfile.BadZipFile as e:
-        raise zipfile.BadZipFile("Invalid ZIP file") from e
+    root = parquet_store.store_dir()
+    parsed = parquet_store.parse_blob_path(clean_path)
+    if root is not None and parsed is not None:
+        file = parquet_store.partition_path(root, *parsed)
+        if file.exists():
+            return f"store:{file.stat().st_mtime_ns}"
 
+    cache = get_disk_cache()
+    entry = cache.lookup(clean_path) if cache else None
+    if entry is None:
+        return None
+    return entry.etag or entry.last_modified
 
-def fetch_data(f: str, year: int) -> pd.DataFrame:
+
+def fetch_data(
+    f: str,
+    year: int,
+    columns: list[str] | None = None,
+    dayflag: int | None = None,
+    timezone: int | None = None,
+    citycode: list[int] | None = None,
+    memory_cache: bool = True,
+    month: int | None = None,
+) -> pd.DataFrame:
     """
     Fetch data based on the specified parameters.
 
+    Filters are applied while the CSV is parsed, so only the requested slice
+    is ever held in memory.
+
     Args:
         f: Dataset identifier. Use "mesh1km" for attribute data, or dataset keys
            such as "mdp" or "fromto" that are used to build the blob storage path.
         year: Year of the data
+        columns: Columns to keep (all when None)
+        dayflag: Keep only this dayflag
+        timezone: Keep only this timezone
+        citycode: Keep only these citycodes (all when None or empty)
+        memory_cache: Keep the result in `st.cache_data`. Turn off for data
+            that is held in a process-wide store instead (e.g. `mesh_store`).
+        month: Month of the data (the month selected in the sidebar when None)
 
     Returns:
         DataFrame containing the fetched data
     """
+    path, kwargs = _build_request(f, year, columns, dayflag, timezone, citycode, month)
+    load = _unzip_csv if memory_cache else _load_csv
+
+    with _fetch_errors():
+        return load(path, **kwargs)
+
+
+def fetch_data_batch(
+    params: list[dict[str, Any]], memory_cache: bool = True
+) -> list[pd.DataFrame]:
+    """
+    Fetch several datasets concurrently over the shared blob client.
+
+    Latency is that of the slowest download instead of the sum of all of them.
+
+    Args:
+        params: `fetch_data` keyword arguments, one dict per dataset, e.g.
+            [{"f": "mdp", "year": 2021}, {"f": "mesh1km", "year": 2020}]
+        memory_cache: Keep the results in `st.cache_data`. Turn off for data
+            that is held in a process-wide store instead (e.g. `dataset_store`).
+
+    Returns:
+        DataFrames in the same order as `params`
+    """
+    jobs = [_build_request(**p) for p in params]
+    load = _unzip_csv if memory_cache else _load_csv
+    ctx = get_script_run_ctx()
+
+    with _fetch_errors():
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(len(jobs), MAX_WORKERS)),
+            # ワーカースレッドからもスピナー等を表示できるようにする
+            initializer=add_script_run_ctx,
+            initargs=(None, ctx),
+        ) as executor:
+            futures = [executor.submit(load, path, **kw) for path, kw in jobs]
+            return [future.result() for future in futures]
+
+
+def _build_request(
+    f: str,
+    year: int,
+    columns: list[str] | None = None,
+    dayflag: int | None = None,
+    timezone: int | None = None,
+    citycode: list[int] | None = None,
+    month: int | None = None,
+) -> tuple[str, dict[str, Any]]:
+    """Resolve the blob path and `_unzip_csv` arguments (reads session state)."""
     ss: SessionStateProxy = st.session_state
 
     if f == "mesh1km":
@@ -81,14 +193,30 @@ def fetch_data(f: str, year: int) -> pd.DataFrame:
             path = "attribute/attribute_mesh1km_2020.csv.zip"
     else:
         pcode = list(ss.pref)[0]
+        month = ss.month if month is None else month
+        path = blob_path(f, pcode, year, month)
+
+    filters: dict[str, list] = {}
+    if dayflag is not None:
+        filters["dayflag"] = [dayflag]
+    if timezone is not None:
+        filters["timezone"] = [timezone]
+    if citycode:
+        filters["citycode"] = list(citycode)
+
+    return path, {
+        "stream": True,
+        "columns": columns,
+        "filters": filters or None,
+        "schema": f,
+    }
 
-        if ss.set == "mdp":
-            path = f"{f}/{pcode:02}/{year}/{ss.month:02}/monthly_{f}_mesh1km.csv.zip"
-        elif ss.set == "fromto":
-            path = f"{f}/{pcode:02}/{year}/{ss.month:02}/monthly_{f}_city.csv.zip"
 
+@contextmanager
+def _fetch_errors() -> Iterator[None]:
+    """Show fetch errors and stop the script run."""
     try:
-        return _unzip_csv(path)
+        yield
     except requests.RequestException:
         st.error("データの取得に失敗しました: ネットワークエラーが発生しました")
         st.stop()
@@ -125,19 +253,39 @@ def lonlat_to_polygon(
     return box(lon_min, lat_min, lon_max, lat_max)
 
 
-def make_polygons(df: pd.DataFrame, value: str) -> gpd.GeoDataFrame:
+def make_polygons(
+    df: pd.DataFrame, value: str | list[str], mesh: "MeshStore | None" = None
+) -> gpd.GeoDataFrame:
     """
     四隅の緯度・経度からポリゴンを生成する.
 
+    shapely 2.x の配列版 `shapely.box` で全メッシュを一度に生成する.
+    `mesh` を渡した場合は、メッシュ ID ごとに作成済みのポリゴンを使い回す.
+
     Args:
         df (pd.DataFrame): メッシュコードを含むデータ.
-        value (str): 生成された GeoDataFrame に保持する列の名前.
+        value (str | list[str]): 生成された GeoDataFrame に保持する列の名前.
+            複数渡すと 1 つのポリゴンに複数の値を持たせる（比較地図の共有用）.
+        mesh (MeshStore | None): ポリゴンのキャッシュを持つメッシュ属性.
 
     Returns:
-        gpd.GeoDataFrame: ポリゴンを含むデータ.
+        gpd.GeoDataFrame: ポリゴンを含むデータ (EPSG:4326).
     """
-    coords = df[["lon_min", "lat_min", "lon_max", "lat_max"]].to_numpy()
-    polygons = [lonlat_to_polygon(*row) for row in coords]
+    if mesh is not None:
+        polygons = mesh.geometries(df["mesh1kmid"].to_numpy())
+    else:
+        polygons = shapely.box(
+            df["lon_min"].to_numpy(),
+            df["lat_min"].to_numpy(),
+            df["lon_max"].to_numpy(),
+            df["lat_max"].to_numpy(),
+        )
 
-    gdf = gpd.GeoDataFrame(df[[value]].copy(), geometry=polygons)
+    values: list[str] = [value] if isinstance(value, str) else list(value)
+    gdf = gpd.GeoDataFrame(
+        {name: df[name].to_numpy() for name in values},
+        geometry=polygons,
+        index=df.index,
+        crs="EPSG:4326",
+    )
     return gdf
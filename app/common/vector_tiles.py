@@ -0,0 +1,343 @@
+"""Vector Tiles
+
+メッシュを Mapbox Vector Tile (MVT) に切り出し、Streamlit の静的配信で渡す
+
+インライン GeoJSON だと全セルを最初に送ることになるので、都道府県をまたぐような
+広い範囲でも表示中のタイルだけを MapLibre に取りに行かせる.
+1km メッシュは経緯度の矩形なので、各セルは外接矩形として符号化する.
+矩形でないジオメトリ（バッファした円など）が混ざる場合はタイルにせず GeoJSON に任せる.
+
+配信には Streamlit の static serving を使う:
+    - `server.enableStaticServing = true`（または STREAMLIT_SERVER_ENABLE_STATIC_SERVING=true）
+    - MLIT_TILE_BASE_URL にアプリの URL（例: http://localhost:8501）
+
+st_maplibre は data: URL の iframe で描画されるため、タイルの URL は絶対 URL にする.
+
+Use:
+    url = publish_tiles(gdf, {"color": colors, "tooltip": tooltips})
+    if url is not None:
+        source = VectorTileSource(tiles=[url], min_zoom=9, max_zoom=12)
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import struct
+import time
+from collections.abc import Mapping
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+
+from .disk_cache import tmp_suffix
+
+logger = logging.getLogger(__name__)
+
+# Streamlit は main スクリプトと同じ階層の static/ を /app/static/ で配信する
+STATIC_DIR = Path(__file__).resolve().parents[1] / "static"
+TILES_DIR = STATIC_DIR / "tiles"
+
+TILE_LAYER = "mesh"
+EXTENT = 4096
+BUFFER = 64
+MIN_ZOOM = 9
+MAX_ZOOM = 12  # 1km メッシュはこれ以上はオーバーズームで十分
+
+# 残しておくタイルセットの数（古いものから消す）
+MAX_TILESETS = 32
+# この秒数以内に使われたタイルセットは数を超えても消さない（他のセッションが表示中）
+KEEP_SECONDS = 3600
+
+# MVT のジオメトリコマンド
+_MOVE_TO = (1 << 3) | 1
+_LINE_TO_3 = (3 << 3) | 2
+_CLOSE_PATH = (1 << 3) | 7
+_POLYGON = 3
+
+
+def tile_base_url() -> str | None:
+    """タイル配信に使うアプリの URL（未設定ならタイル配信しない）"""
+    url = os.environ.get("MLIT_TILE_BASE_URL", "").rstrip("/")
+    return url or None
+
+
+def is_boxes(gdf: gpd.GeoDataFrame) -> bool:
+    """
+    Whether every geometry is an axis-aligned rectangle.
+
+    Tiles encode each feature as its bounding box, so anything else would be
+    drawn wrong.
+
+    Args:
+        gdf (gpd.GeoDataFrame): Geometries to check.
+
+    Returns:
+        bool: True when every geometry fills its bounding box.
+    """
+    geometry = gdf.geometry
+    if not geometry.geom_type.eq("Polygon").all():
+        return False
+    bounds = np.asarray(geometry.bounds, dtype=np.float64)
+    box_area = (bounds[:, 2] - bounds[:, 0]) * (bounds[:, 3] - bounds[:, 1])
+    return bool(np.allclose(geometry.area.to_numpy(), box_area, rtol=1e-9, atol=0.0))
+
+
+# protobuf ------------------------------------------------------------------
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+
+def _field(number: int, payload: bytes) -> bytes:
+    """Length-delimited field."""
+    return _varint((number << 3) | 2) + _varint(len(payload)) + payload
+
+
+def _packed(number: int, values) -> bytes:
+    return _field(number, b"".join(_varint(v) for v in values))
+
+
+def _value(v) -> bytes:
+    if isinstance(v, str):
+        return _field(1, v.encode("utf-8"))
+    return _varint((3 << 3) | 1) + struct.pack("<d", float(v))  # double_value
+
+
+# tiling --------------------------------------------------------------------
+
+
+def lonlat_to_tile(lon, lat, zoom: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Web Mercator tile coordinates (fractional) of lon/lat.
+
+    Args:
+        lon: Longitudes.
+        lat: Latitudes.
+        zoom (int): Zoom level.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: x and y, where the integer part is the tile.
+    """
+    n = 2.0**zoom
+    lat_rad = np.radians(np.asarray(lat, dtype=np.float64))
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0 * n
+    y = (1.0 - np.arcsinh(np.tan(lat_rad)) / np.pi) / 2.0 * n
+    return x, y
+
+
+def encode_tile(
+    boxes: np.ndarray,
+    properties: Mapping[str, np.ndarray],
+    layer: str = TILE_LAYER,
+    extent: int = EXTENT,
+) -> bytes:
+    """
+    Encode rectangles as one MVT layer.
+
+    Args:
+        boxes (np.ndarray): (n, 4) int tile-local x0, y0, x1, y1 (y grows down).
+        properties (Mapping[str, np.ndarray]): Feature properties aligned with
+            `boxes` (str or numeric values).
+        layer (str): Layer name.
+        extent (int): Tile extent.
+
+    Returns:
+        bytes: Encoded tile.
+    """
+    keys = list(properties)
+    values: dict = {}
+    features = []
+
+    for i, (x0, y0, x1, y1) in enumerate(boxes.tolist()):
+        tags = []
+        for k, name in enumerate(keys):
+            v = properties[name][i]
+            if isinstance(v, float) and v != v:
+                continue  # NaN は属性なし（null）にする
+            tags += [k, values.setdefault(v, len(values))]
+
+        # 外周は時計回り（y 下向き）: 左上 → 右上 → 右下 → 左下
+        geometry = [
+            _MOVE_TO,
+            _zigzag(x0),
+            _zigzag(y0),
+            _LINE_TO_3,
+            _zigzag(x1 - x0),
+            0,
+            0,
+            _zigzag(y1 - y0),
+            _zigzag(x0 - x1),
+            0,
+            _CLOSE_PATH,
+        ]
+        features.append(
+            _field(
+                2,
+                _packed(2, tags)
+                + _varint((3 << 3) | 0)
+                + _varint(_POLYGON)
+                + _packed(4, geometry),
+            )
+        )
+
+    body = (
+        _varint((15 << 3) | 0)
+        + _varint(2)  # version
+        + _field(1, layer.encode("utf-8"))
+        + b"".join(features)
+        + b"".join(_field(3, k.encode("utf-8")) for k in keys)
+        + b"".join(_field(4, _value(v)) for v in values)
+        + _varint((5 << 3) | 0)
+        + _varint(extent)
+    )
+    return _field(3, body)
+
+
+def iter_tiles(
+    bounds: np.ndarray,
+    properties: Mapping[str, np.ndarray],
+    min_zoom: int = MIN_ZOOM,
+    max_zoom: int = MAX_ZOOM,
+):
+    """
+    Cut rectangles into tiles.
+
+    Args:
+        bounds (np.ndarray): (n, 4) lon_min, lat_min, lon_max, lat_max.
+        properties (Mapping[str, np.ndarray]): Feature properties.
+        min_zoom (int): First zoom level.
+        max_zoom (int): Last zoom level.
+
+    Yields:
+        tuple[int, int, int, bytes]: z, x, y and the encoded tile.
+    """
+    properties = {k: np.asarray(v) for k, v in properties.items()}
+
+    for z in range(min_zoom, max_zoom + 1):
+        fx0, fy0 = lonlat_to_tile(bounds[:, 0], bounds[:, 3], z)  # 左上
+        fx1, fy1 = lonlat_to_tile(bounds[:, 2], bounds[:, 1], z)  # 右下
+
+        # セルがまたぐタイルの分だけ行を増やす
+        tx0, ty0 = np.floor(fx0).astype(np.int64), np.floor(fy0).astype(np.int64)
+        nx = np.ceil(fx1).astype(np.int64) - tx0
+        ny = np.ceil(fy1).astype(np.int64) - ty0
+        count = np.maximum(nx, 1) * np.maximum(ny, 1)
+        row = np.repeat(np.arange(len(bounds)), count)
+        offset = np.arange(len(row)) - np.repeat(np.cumsum(count) - count, count)
+        tx = tx0[row] + offset % np.maximum(nx, 1)[row]
+        ty = ty0[row] + offset // np.maximum(nx, 1)[row]
+
+        def local(f, t):
+            px = np.rint((f - t) * EXTENT).astype(np.int64)
+            return np.clip(px, -BUFFER, EXTENT + BUFFER)
+
+        boxes = np.column_stack(
+            [
+                local(fx0[row], tx),
+                local(fy0[row], ty),
+                local(fx1[row], tx),
+                local(fy1[row], ty),
+            ]
+        )
+
+        keep = (boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])
+        row, tx, ty, boxes = row[keep], tx[keep], ty[keep], boxes[keep]
+        if not len(row):
+            continue
+
+        order = np.lexsort((ty, tx))
+        row, tx, ty, boxes = row[order], tx[order], ty[order], boxes[order]
+        starts = np.flatnonzero(np.r_[True, (np.diff(tx) != 0) | (np.diff(ty) != 0)])
+        for start, stop in zip(starts, np.r_[starts[1:], len(row)]):
+            rows = row[start:stop]
+            tile = encode_tile(
+                boxes[start:stop], {k: v[rows] for k, v in properties.items()}
+            )
+            yield z, int(tx[start]), int(ty[start]), tile
+
+
+def publish_tiles(
+    gdf: gpd.GeoDataFrame,
+    properties: Mapping[str, np.ndarray],
+    min_zoom: int = MIN_ZOOM,
+    max_zoom: int = MAX_ZOOM,
+) -> str | None:
+    """
+    Write the tile pyramid of `gdf` under the static directory.
+
+    Tile sets are keyed by their content, so the same selection is written once.
+
+    Args:
+        gdf (gpd.GeoDataFrame): Mesh cells.
+        properties (Mapping[str, np.ndarray]): Feature properties aligned with `gdf`.
+        min_zoom (int): First zoom level.
+        max_zoom (int): Last zoom level.
+
+    Returns:
+        str | None: Absolute `{z}/{x}/{y}` URL template, or None when tile
+        serving is not configured, the geometries are not rectangles or the
+        tiles could not be written.
+    """
+    base_url = tile_base_url()
+    if base_url is None:
+        return None
+    if not is_boxes(gdf):
+        logger.debug("vector tiles: geometries are not boxes, using GeoJSON")
+        return None
+
+    bounds = np.asarray(gdf.geometry.bounds, dtype=np.float64)
+    digest = hashlib.sha1(bounds.tobytes())
+    digest.update(f"{min_zoom}-{max_zoom}".encode())
+    for name, values in properties.items():
+        digest.update(name.encode("utf-8"))
+        digest.update(np.asarray(values).astype(str).tobytes())
+    key = digest.hexdigest()[:16]
+
+    directory = TILES_DIR / key
+    try:
+        os.utime(directory)  # 最近使ったものとして残す
+    except FileNotFoundError:
+        # セッションは同じプロセスのスレッドなので、スレッドごとに別の場所に書く
+        tmp = TILES_DIR / f"{key}.{tmp_suffix()}"
+        try:
+            for z, x, y, tile in iter_tiles(bounds, properties, min_zoom, max_zoom):
+                path = tmp / str(z) / str(x) / f"{y}.pbf"
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(tile)
+            os.replace(tmp, directory)
+        except OSError as e:
+            logger.warning("vector tiles: falling back to GeoJSON (%s)", e)
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not directory.exists():
+                return None
+        _prune()
+
+    return f"{base_url}/app/static/tiles/{key}/{{z}}/{{x}}/{{y}}.pbf"
+
+
+def _prune() -> None:
+    """古いタイルセットを消す（最近使われたものは他のセッションが参照しているので残す）"""
+    mtimes = {}
+    for path in TILES_DIR.iterdir():
+        if path.is_dir() and not path.name.endswith(".tmp"):
+            try:
+                mtimes[path] = path.stat().st_mtime
+            except FileNotFoundError:
+                continue  # 他のセッションが消した
+    sets = sorted(mtimes, key=mtimes.get, reverse=True)
+    cutoff = time.time() - KEEP_SECONDS
+    for path in sets[MAX_TILESETS:]:
+        if mtimes[path] < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,188 @@
+"""Zip Stream
+
+ZIP アーカイブを先頭から逐次展開する（全体をメモリに載せない）
+
+zipfile.ZipFile は末尾のセントラルディレクトリを読むためにシーク可能な
+ファイルを必要とするので、ここではローカルファイルヘッダーを順に読み、
+zlib で展開したバイト列をファイルライクに返す.
+
+Use:
+    with open_csv_member(response.iter_content(65536)) as f:
+        for chunk in pd.read_csv(f, chunksize=100_000):
+            ...
+"""
+
+import io
+import struct
+import zipfile
+import zlib
+from collections.abc import Iterable, Iterator
+
+_LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+_LOCAL_SIG = b"PK\x03\x04"
+_DESCRIPTOR_SIG = b"PK\x07\x08"
+_FLAG_DATA_DESCRIPTOR = 0x08
+_STORED = zipfile.ZIP_STORED
+_DEFLATED = zipfile.ZIP_DEFLATED
+_ZIP64_EXTRA_ID = 0x0001
+
+READ_SIZE = 64 * 1024
+
+
+class _ByteFeed:
+    """Pull-based buffer over an iterator of byte chunks."""
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks: Iterator[bytes] = iter(chunks)
+        self._buf = bytearray()
+
+    def read(self, n: int) -> bytes:
+        """Read up to `n` bytes (fewer only at end of stream)."""
+        while len(self._buf) < n:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buf += chunk
+        out = bytes(self._buf[:n])
+        del self._buf[:n]
+        return out
+
+    def read_some(self, n: int) -> bytes:
+        """Read whatever is buffered (or the next chunk), at most `n` bytes."""
+        if not self._buf:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return b""
+            self._buf += chunk
+        return self.read(min(n, len(self._buf)))
+
+    def unread(self, data: bytes) -> None:
+        self._buf[:0] = data
+
+
+class _MemberReader(io.RawIOBase):
+    """Decompressing reader for one ZIP member, verified against its CRC."""
+
+    def __init__(self, feed: _ByteFeed, header: tuple, extra: bytes) -> None:
+        super().__init__()
+        _, _, flags, method, _, _, crc, csize, _, _, _ = header
+        self._feed = feed
+        self._method = method
+        self._has_descriptor = bool(flags & _FLAG_DATA_DESCRIPTOR)
+        self._zip64 = _has_zip64_extra(extra)
+        self._expected_crc = None if self._has_descriptor else crc
+        self._crc = 0
+        self._pending = b""
+        self._eof = False
+
+        if method == _DEFLATED:
+            self._inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+        elif method == _STORED and not self._has_descriptor and not self._zip64:
+            self._remaining = csize
+        else:
+            raise zipfile.BadZipFile("Unsupported ZIP member for streaming")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:  # type: ignore[override]
+        while not self._pending and not self._eof:
+            self._pending = self._next_block()
+        n = min(len(b), len(self._pending))
+        b[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def _next_block(self) -> bytes:
+        if self._method == _STORED:
+            data = self._feed.read_some(min(READ_SIZE, self._remaining))
+            if not data and self._remaining:
+                raise zipfile.BadZipFile("Truncated ZIP member")
+            self._remaining -= len(data)
+            if self._remaining == 0:
+                self._finish()
+        else:
+            compressed = self._feed.read_some(READ_SIZE)
+            if not compressed:
+                raise zipfile.BadZipFile("Truncated ZIP member")
+            data = self._inflater.decompress(compressed)
+            if self._inflater.eof:
+                self._feed.unread(self._inflater.unused_data)
+                self._finish()
+
+        self._crc = zlib.crc32(data, self._crc)
+        return data
+
+    def _finish(self) -> None:
+        self._eof = True
+        if self._has_descriptor:
+            sig = self._feed.read(4)
+            crc_bytes = self._feed.read(4) if sig == _DESCRIPTOR_SIG else sig
+            self._feed.read(16 if self._zip64 else 8)  # compressed/uncompressed size
+            self._expected_crc = struct.unpack("<I", crc_bytes)[0]
+
+    def close(self) -> None:
+        if not self.closed and self._eof and self._pending == b"":
+            # 最後まで読み切った場合のみ CRC を検証する
+            self._check_crc()
+        super().close()
+
+    def _check_crc(self) -> None:
+        if self._expected_crc is not None and self._crc != self._expected_crc:
+            raise zipfile.BadZipFile("Bad CRC-32 in ZIP member")
+
+    def drain(self) -> None:
+        """Consume the rest of the member without keeping it."""
+        while not self._eof:
+            self._next_block()
+        self._pending = b""
+        self._check_crc()
+
+
+def _has_zip64_extra(extra: bytes) -> bool:
+    pos = 0
+    while pos + 4 <= len(extra):
+        header_id, size = struct.unpack_from("<HH", extra, pos)
+        if header_id == _ZIP64_EXTRA_ID:
+            return True
+        pos += 4 + size
+    return False
+
+
+def open_csv_member(chunks: Iterable[bytes]) -> io.BufferedReader:
+    """
+    Open the first CSV member of a ZIP archive delivered as a byte stream.
+
+    Args:
+        chunks (Iterable[bytes]): Archive bytes, e.g. `response.iter_content()`.
+
+    Returns:
+        io.BufferedReader: Decompressed CSV bytes.
+
+    Raises:
+        zipfile.BadZipFile: If the stream is not a (streamable) ZIP archive.
+        ValueError: If no CSV file is found in the ZIP archive.
+    """
+    feed = _ByteFeed(chunks)
+    first = True
+
+    while True:
+        raw = feed.read(_LOCAL_HEADER.size)
+        if len(raw) < 4 or raw[:4] != _LOCAL_SIG:
+            if first:
+                raise zipfile.BadZipFile("Invalid ZIP file")
+            # セントラルディレクトリに到達 = これ以上メンバーはない
+            raise ValueError("No CSV file found in ZIP archive")
+        if len(raw) < _LOCAL_HEADER.size:
+            raise zipfile.BadZipFile("Truncated ZIP header")
+        first = False
+
+        header = _LOCAL_HEADER.unpack(raw)
+        name_len, extra_len = header[9], header[10]
+        filename = feed.read(name_len).decode("utf-8", errors="replace")
+        extra = feed.read(extra_len)
+
+        member = _MemberReader(feed, header, extra)
+        if filename.endswith(".csv"):
+            return io.BufferedReader(member, buffer_size=READ_SIZE)
+        member.drain()
@@ -5,11 +5,40 @@ from typing import Any
 import geopandas as gpd
 import pandas as pd
 import streamlit as st
+from common.blob import blob_path
+from common.compare import compare_years
 from common.const import Const
-from common.folium_map_builder import folium_map_builder
-from common.region_builder import prefcode_to_name, region_builder
+from common.dataset_store import get_dataset_store, selection_key
+from common.folium_map_builder import (
+    MAP_HEIGHT,
+    folium_map_builder,
+    render_folium_map,
+)
+from common.lod import lod_for_zoom, lod_polygons
+from common.mesh_store import MeshStore, get_decoded_meshes
+from common.od import ODComparison, load_od
+from common.query import comparison as query_comparison
+from common.region_builder import get_region_registry, region_builder
+from common.render_cache import RenderCache, RenderedMap, get_render_cache
+from common.schema import (
+    DAYFLAG_LABELS,
+    FROM_AREA_LABELS,
+    TIMEZONE_LABELS,
+    flags_or_all,
+)
 from common.step_by_step import StepByStep
-from common.utils import fetch_data, make_polygons, merge_df
+from common.timeseries import (
+    FIRST_PERIOD,
+    LAST_PERIOD,
+    METRICS,
+    RATE_METRICS,
+    MeshCube,
+    load_cube,
+    month_range,
+    period_label,
+)
+from common.utils import data_version, fetch_data_batch, make_polygons
+from streamlit.components.v1 import html
 from streamlit.runtime.state.session_state_proxy import SessionStateProxy
 
 CONST = Const()
@@ -26,21 +55,13 @@ def step_1() -> None:
 def step_2() -> None:
     _dataset()
     _sidebar_date()
-
-    # 年月の値を使ってデータを読み込む
-    ss.df_2021 = fetch_data(ss.set, 2021)
-    ss.df_2020 = fetch_data(ss.set, 2020)
-
-    df_2021: pd.DataFrame = ss.df_2021.copy()
-    df_2020: pd.DataFrame = ss.df_2020.copy()
-
-    # 市区町村を選択していたら絞り込む
-    if len(ss.citycode) > 0:
-        df_2021 = df_2021[df_2021["citycode"].isin(ss.citycode)]
-        df_2020 = df_2020[df_2020["citycode"].isin(ss.citycode)]
-
     _sidebar_flag()
 
+    # 時系列は 1km メッシュのみ
+    if ss.set == "mdp" and ss.timeseries:
+        _timeseries()
+        return
+
     # メッシュコードのないデータはデータテーブルを出して終わり
     if ss.set == "fromto":
         with st.popover("市区町村単位発地別の滞在人口データ"):
@@ -48,91 +69,274 @@ def step_2() -> None:
                 "市区町村別に、いつ、どこ（同市区町村／同都道府県／同地方／それ以外）から何人来たのかを収録したデータ"
             )
 
-        # 絞り込み
-        df_2021 = _filter(df_2021)
-        df_2020 = _filter(df_2020)
+        _od()
 
-        # 加工
+        df_2021, df_2020 = _fetch_years(None)
+
+        # 加工（共有データには書き込まない）
         df_2021 = _datamap(df_2021)
         df_2020 = _datamap(df_2020)
 
-        st.write(df_2021, df_2020)
+        with st.expander("データテーブル"):
+            st.write(df_2021, df_2020)
         return
 
     # マップ表示
     with st.popover("1km メッシュ別の滞在人口データ"):
         st.info("1km メッシュ別に、いつ、何人が滞在したのかを収録したデータ")
 
-    df_2021 = _filter(df_2021)
-    df_2020 = _filter(df_2020)
+    zoom_start = _zoom_start()
+
+    # 同じ条件の地図は描画済みのものを使い回す（読み込みから描画まで省く）
+    cache: RenderCache | None = get_render_cache()
+    rendered: RenderedMap | None = cache.get(_render_key()) if cache else None
 
-    ss.df_mesh = fetch_data("mesh1km", 2020)
-    df_mesh: pd.DataFrame | Any = ss.df_mesh.copy()
+    if rendered is None:
+        rendered = _render_comparison(zoom_start)
+        if rendered is None:
+            return
+        if cache:
+            # 読み込んだデータの版で登録する（初回は読み込むまで版が分からない）
+            cache.put(_render_key(), rendered)
+    else:
+        with st.expander(f"*Geometry records: {rendered.meta['records']}*"):
+            if rendered.meta["level"] > 1:
+                st.caption(f"{rendered.meta['level']}km メッシュに集約して表示")
+            st.caption("描画済みの地図を表示しています")
 
-    # 滞在人口
-    df_main = merge_df(
-        df_2020, df_mesh, on="mesh1kmid", how="left", suffixes=("", "_drop"), drop=True
+    st.subheader("2020-2021 年比較")
+    st.caption("2020 年の滞在人口と増減率（式:2021 年/2020 年-1）")
+    html(rendered.html, height=MAP_HEIGHT)
+
+
+def _render_key() -> str:
+    # 元データの版（ストアの更新時刻か ETag）もキーに含め、更新されたら描き直す
+    pcode = list(ss.pref)[0]
+    return selection_key(
+        dataset=ss.set,
+        pref=list(ss.pref),
+        city=list(ss.citycode),
+        month=ss.month,
+        dayflag=ss.dayflag,
+        timezone=ss.timezone,
+        renderer="folium",
+        versions={
+            year: data_version(blob_path(ss.set, pcode, year, ss.month))
+            for year in (2020, 2021)
+        },
     )
 
-    gdf_main: gpd.GeoDataFrame = make_polygons(df_main, "population")
 
-    df_latlon: pd.DataFrame = df_main[["lat", "lon"]]
+def _render_comparison(zoom_start: int) -> RenderedMap | None:
+    # 滞在人口と前年同月増減率（式:2021 年/2020 年-1）を 1 つの表で求め、
+    # 同じポリゴンに持たせて左右の地図で共有する
+    # （2021 年の人口は集約したセルの増減率を計算し直すのに使う）
+    df_cmp: pd.DataFrame = _comparison()
 
-    # 差分
-    df_diff: pd.DataFrame = merge_df(
-        df_2021,
-        df_2020,
-        on="mesh1kmid",
-        how="left",
-        suffixes=("_2021", "_2020"),
-        drop=False,
+    # メッシュの経緯度はメッシュコードから計算する（属性ファイルは読まない）
+    # （都道府県ごとにプロセスで共有し、ポリゴンも描画をまたいで使い回す）
+    mesh: MeshStore = get_decoded_meshes(list(ss.pref)[0]).covering(
+        df_cmp["mesh1kmid"]
     )
+    df_cmp = mesh.join(df_cmp)
 
-    # 増減率を計算して新しいカラムを追加
-    df_diff["diff"] = df_diff["population_2021"] / df_diff["population_2020"] - 1
-
-    # 不要なカラムを削除して最終的なデータフレームを作成
-    df_diff = df_diff[["mesh1kmid", "diff"]]
+    df_latlon: pd.DataFrame = df_cmp[["lat", "lon"]]
 
-    # 前年同月増減率
-    df_sub: pd.DataFrame = merge_df(
-        df_diff, df_mesh, on="mesh1kmid", how="left", suffixes=("", "_drop"), drop=True
+    # 引いた縮尺では 1km メッシュをまとめて描く
+    gdf_cmp: gpd.GeoDataFrame = lod_polygons(
+        df_cmp, ["population", "diff"], zoom_start, mesh
     )
+    level = lod_for_zoom(zoom_start)
 
-    df_sub = df_sub.dropna(subset=["diff"])
-    gdf_sub: gpd.GeoDataFrame = make_polygons(df_sub, "diff")
+    with st.expander(f"*Geometry records: {len(gdf_cmp)}*"):
+        if level > 1:
+            st.caption(f"{level}km メッシュに集約して表示")
 
-    with st.expander(f"*Geometry records: {len(gdf_main)}*"):
         st.caption("滞在人口")
-        st.write(gdf_main)
+        st.write(gdf_cmp[["population", "geometry"]])
 
         st.caption("増減率")
-        st.write(gdf_sub)
+        st.write(gdf_cmp.dropna(subset=["diff"])[["diff", "geometry"]])
+
+    # メッシュは格子上にあるので、座標は格子に合わせて短く書き出す
+    m_html = render_folium_map(
+        df_latlon,
+        gdf_cmp,
+        gdf_cmp,
+        "population",
+        "diff",
+        zoom_start,
+        precision="lattice",
+    )
+    if m_html is None:
+        return None
+    return RenderedMap(m_html, {"records": len(gdf_cmp), "level": level})
+
+
+def _fetch_years(columns: list[str] | None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # 年月・平休日・時間帯・市区町村で絞り込みながら読み込む
+    # （市区町村を選択していなければ絞り込まない）
+    filters: dict[str, Any] = {
+        "dayflag": ss.dayflag,
+        "timezone": ss.timezone,
+        "citycode": list(ss.citycode),
+    }
+
+    # セッションには選択条件のキーだけを持たせ、データはプロセスで 1 つだけ持つ
+    # （返るのは書き込むまで共有する浅いコピー）
+    ss.dataset_key = selection_key(
+        dataset=ss.set,
+        pref=list(ss.pref),
+        month=ss.month,
+        columns=columns,
+        **filters,
+    )
 
-    st.subheader("2020-2021 年比較")
-    st.caption("2020 年の滞在人口と増減率（式:2021 年/2020 年-1）")
+    # 2021 年・2020 年をまとめて並列に取得する
+    return get_dataset_store().get_or_create(
+        ss.dataset_key,
+        lambda: tuple(
+            fetch_data_batch(
+                [
+                    {"f": ss.set, "year": 2021, "columns": columns, **filters},
+                    {"f": ss.set, "year": 2020, "columns": columns, **filters},
+                ],
+                # 置き場で容量を管理するので、st.cache_data には残さない
+                memory_cache=False,
+            )
+        ),
+    )
 
-    if len(ss.citycode) == 0:
-        zoom_start = 9
-    elif len(ss.citycode) > 1:
-        zoom_start = 10
-    else:
-        zoom_start = 11
 
-    folium_map_builder(df_latlon, gdf_main, gdf_sub, "population", "diff", zoom_start)
+def _comparison() -> pd.DataFrame:
+    # 事前変換したストアがあれば、絞り込みから増減率までを 1 つのクエリで求める
+    df_cmp = query_comparison(
+        list(ss.pref)[0], ss.month, ss.dayflag, ss.timezone, list(ss.citycode)
+    )
+    if df_cmp is not None:
+        return df_cmp
+
+    df_2021, df_2020 = _fetch_years(["mesh1kmid", "population"])
+    return compare_years(df_2020, df_2021)
 
 
-def _datamap(df):
+def _od() -> None:
+    # 都道府県・月ごとに一度だけ集計し、平休日・時間帯・市区町村の切り替えは
+    # 配列を引くだけにする
+    key = selection_key(dataset="od", pref=list(ss.pref), month=ss.month)
+    od: ODComparison = get_dataset_store().get_or_create(
+        key, lambda: load_od(ss.month)
+    )
+    filters: dict[str, Any] = {
+        "dayflag": ss.dayflag,
+        "timezone": ss.timezone,
+        "citycode": list(ss.citycode),
+    }
+    registry = get_region_registry()
     from_area: dict[int, str] = CONST.from_area
-    prefcode, citycode = prefcode_to_name()
 
-    df["dayflag"] = df["dayflag"].map(dayflag)
-    df["timezone"] = df["timezone"].map(timezone)
-    df["prefcode"] = df["prefcode"].map(prefcode)
-    df["citycode"] = df["citycode"].map(citycode)
-    df["from_area"] = df["from_area"].map(from_area)
+    st.subheader("居住地区分別の増減（2020-2021 年）")
+    st.caption("居住地区分ごとの滞在人口・増減率（式:2021 年/2020 年-1）・構成比")
+    df_origins = od.origins(**filters).rename(index=from_area)
+    st.dataframe(df_origins)
+    st.bar_chart(df_origins[["share", f"share_{od.next_year}"]], stack=False)
+
+    st.caption("市区町村別の居住地区分の構成比（2021 年）")
+    st.dataframe(
+        od.shares(**filters).rename(index=registry.city_names, columns=from_area)
+    )
+
+    st.subheader("増減率の高い市区町村")
+    n: int = st.slider("表示する市区町村数", 5, 30, 10)
+    area: int | None = st.segmented_control(
+        "居住地区分",
+        from_area,
+        format_func=lambda x: from_area[x],
+        help="選択なしで全区分の合計です。",
+    )
+    df_top = od.top_cities(n, from_area=area, **filters)
+    df_top["citycode"] = registry.city_labels.decode(df_top["citycode"])
+    st.dataframe(df_top, hide_index=True)
+
+
+def _timeseries() -> None:
+    periods = month_range(*ss.period_range)
+
+    # 条件が変わったときだけ読み込み直し、月の切り替えは配列の参照で済ませる
+    # （配列は共有の置き場に置き、セッションにはキーだけを持たせる）
+    ss.cube_key = selection_key(
+        dataset="cube",
+        pref=list(ss.pref),
+        periods=[period_label(periods[0]), period_label(periods[-1])],
+        dayflag=ss.dayflag,
+        timezone=ss.timezone,
+        citycode=list(ss.citycode),
+    )
+
+    cube: MeshCube = get_dataset_store().get_or_create(
+        ss.cube_key,
+        lambda: load_cube(periods, ss.dayflag, ss.timezone, list(ss.citycode)),
+    )
+    mesh: MeshStore = get_decoded_meshes(list(ss.pref)[0]).covering(cube.ids)
+
+    st.subheader("月別の推移")
+    st.caption("選択範囲の滞在人口の合計")
+    st.line_chart(cube.totals())
+
+    metric: str = (
+        st.segmented_control(
+            "指標",
+            METRICS,
+            default="yoy",
+            format_func=lambda x: METRICS[x],
+        )
+        or "yoy"
+    )
+    period = st.select_slider(
+        "表示する月",
+        cube.periods,
+        value=cube.periods[-1],
+        format_func=period_label,
+    )
+
+    df: pd.DataFrame = mesh.join(cube.frame(period, [metric]))
+    gdf: gpd.GeoDataFrame = make_polygons(df, ["population", metric], mesh)
+
+    with st.expander(f"*Geometry records: {len(gdf)}*"):
+        st.write(gdf[["population", metric, "geometry"]])
+
+    st.subheader(f"{period_label(period)} {METRICS[metric]}")
+    folium_map_builder(
+        df[["lat", "lon"]],
+        gdf,
+        gdf,
+        "population",
+        metric,
+        _zoom_start(),
+        precision="lattice",
+        caption_2="増減率" if metric in RATE_METRICS else METRICS[metric],
+    )
+
 
-    return df
+def _zoom_start() -> int:
+    if len(ss.citycode) == 0:
+        return 9
+    elif len(ss.citycode) > 1:
+        return 10
+    return 11
+
+
+def _datamap(df: pd.DataFrame) -> pd.DataFrame:
+    # コードを表示名のカテゴリに置き換える
+    # （区分はカテゴリの付け替えだけで、行ごとに文字列は作らない）
+    registry = get_region_registry()
+    return df.assign(
+        dayflag=DAYFLAG_LABELS.decode(df["dayflag"]),
+        timezone=TIMEZONE_LABELS.decode(df["timezone"]),
+        prefcode=registry.prefecture_labels.decode(df["prefcode"]),
+        citycode=registry.city_labels.decode(df["citycode"]),
+        from_area=FROM_AREA_LABELS.decode(df["from_area"]),
+    )
 
 
 def _dataset() -> None:
@@ -179,6 +383,19 @@ def _sidebar_date() -> None:
             help="単月指定のみ。",
         )
 
+        ss.timeseries = st.toggle(
+            "時系列",
+            help="1km メッシュの複数月を読み込み、前年同月比・前月比などを月ごとに表示します。",
+        )
+        if ss.timeseries:
+            periods = month_range(FIRST_PERIOD, LAST_PERIOD)
+            ss.period_range = st.select_slider(
+                "期間",
+                periods,
+                value=(periods[0], periods[-1]),
+                format_func=period_label,
+            )
+
 
 def _sidebar_flag() -> None:
     with st.sidebar:
@@ -199,12 +416,9 @@ def _sidebar_flag() -> None:
             help="昼:11時台〜14時台の平均・深夜:1時台〜4時台の平均・終日:0時台〜23時台の平均",
         )
 
-
-def _filter(df) -> Any:
-    df = df[df["dayflag"] == ss.dayflag]
-    df = df[df["timezone"] == ss.timezone]
-
-    return df
+    # 選択を外したときは全日・終日で比べる
+    # （区分をまたいで読むと、1 つのメッシュの行が平休日・時間帯の数だけ重なる）
+    ss.dayflag, ss.timezone = flags_or_all(ss.dayflag, ss.timezone)
 
 
 # アプリ本体=================================
@@ -11,6 +11,20 @@ app_dir = Path(__file__).parent.parent / "app"
 sys.path.insert(0, str(app_dir))
 
 
+@pytest.fixture(autouse=True)
+def isolated_disk_cache(tmp_path, monkeypatch):
+    """Point the on-disk cache at a per-test directory"""
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setenv("MLIT_CACHE_DIR", str(cache_dir))
+    return cache_dir
+
+
+@pytest.fixture(autouse=True)
+def isolated_parquet_store(monkeypatch):
+    """Keep tests from reading a prebuilt Parquet store"""
+    monkeypatch.delenv("MLIT_STORE_DIR", raising=False)
+
+
 # Note: The following fixtures are prepared for future integration tests.
 # They provide common test data structures used across multiple test files.
 
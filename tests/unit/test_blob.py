@@ -0,0 +1,130 @@
+"""Unit tests for app/common/blob.py"""
+
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.common.blob import BlobClient, blob_path, stream_csv
+
+
+class TestBlobPath:
+    """Test blob_path function"""
+
+    @pytest.mark.unit
+    def test_blob_path(self):
+        """Test the paths of the monthly datasets"""
+        assert (
+            blob_path("mdp", 1, 2021, 4) == "mdp/01/2021/04/monthly_mdp_mesh1km.csv.zip"
+        )
+        assert (
+            blob_path("fromto", 13, 2019, 12)
+            == "fromto/13/2019/12/monthly_fromto_city.csv.zip"
+        )
+
+
+class TestStreamCsv:
+    """Test stream_csv function"""
+
+    @pytest.mark.unit
+    @patch("app.common.blob.st.secrets")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
+    def test_yields_chunks(self, mock_get, mock_secrets):
+        """Test that rows are yielded chunk by chunk"""
+        mock_secrets.blob.url = "https://example.com/data"
+        mock_secrets.blob.token = "?token=abc123"
+
+        zip_buffer = BytesIO()
+        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("test.csv", "id\n" + "".join(f"{i}\n" for i in range(5)))
+
+        mock_response = Mock()
+        mock_response.iter_content.return_value = iter([zip_buffer.getvalue()])
+        mock_get.return_value = mock_response
+
+        chunks = list(stream_csv("path/to/data.zip", chunksize=2))
+
+        assert [len(c) for c in chunks] == [2, 2, 1]
+
+
+class TestBlobClient:
+    """Test BlobClient class against a local HTTP server"""
+
+    @pytest.fixture
+    def server(self):
+        state = {"fail": 0, "headers": []}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                state["headers"].append(dict(self.headers))
+                if state["fail"] > 0:
+                    state["fail"] -= 1
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                if self.headers.get("If-None-Match") == '"v1"':
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                body = b"ok"
+                self.send_response(200)
+                self.send_header("ETag", '"v1"')
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        with patch("app.common.blob.st.secrets") as mock_secrets:
+            mock_secrets.blob.url = f"http://127.0.0.1:{httpd.server_port}"
+            mock_secrets.blob.token = "?token=abc123"
+            yield state
+        httpd.shutdown()
+        httpd.server_close()
+
+    @pytest.mark.unit
+    def test_retries_transient_5xx(self, server):
+        """Test that 503 responses are retried with backoff"""
+        server["fail"] = 2
+        client = BlobClient(retries=3, backoff=0)
+
+        response = client.get("path/to/data.zip")
+
+        assert response.status_code == 200
+        assert response.content == b"ok"
+        assert len(server["headers"]) == 3
+        assert client.stats()["requests"] == 1
+
+    @pytest.mark.unit
+    def test_gives_up_after_retries(self, server):
+        """Test that the last 5xx response is returned when retries run out"""
+        server["fail"] = 5
+        client = BlobClient(retries=1, backoff=0)
+
+        response = client.get("path/to/data.zip")
+
+        assert response.status_code == 503
+        assert len(server["headers"]) == 2
+        assert client.stats()["errors"] == 1
+
+    @pytest.mark.unit
+    def test_conditional_get(self, server):
+        """Test If-None-Match revalidation"""
+        client = BlobClient(backoff=0)
+
+        etag = client.get("path/to/data.zip").headers["ETag"]
+        response = client.get("path/to/data.zip", etag=etag)
+
+        assert response.status_code == 304
+        assert server["headers"][1]["If-None-Match"] == '"v1"'
+        stats = client.stats()
+        assert stats["requests"] == 2
+        assert stats["not_modified"] == 1
+        assert stats["p95_s"] >= 0
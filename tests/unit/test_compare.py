@@ -0,0 +1,104 @@
+"""Unit tests for app/common/compare.py"""
+
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.common.compare import compare_years
+
+# Patch st.cache_data / st.cache_resource before importing to bypass caching in tests
+with (
+    patch("streamlit.cache_data", lambda **kwargs: lambda func: func),
+    patch("streamlit.cache_resource", lambda **kwargs: lambda func: func),
+):
+    from app.common.utils import merge_df
+
+
+@pytest.fixture
+def df_2020():
+    return pd.DataFrame(
+        {
+            "mesh1kmid": [53394611, 53394612, 53394621, 53394622],
+            "population": [100.0, 0, 50, 80],
+        }
+    )
+
+
+@pytest.fixture
+def df_2021():
+    return pd.DataFrame(
+        {
+            "mesh1kmid": [53394622, 53394611, 53394612, 53394700],
+            "population": [40.0, 110, 5, 7],
+        }
+    )
+
+
+class TestCompareYears:
+    """Test compare_years function"""
+
+    @pytest.mark.unit
+    def test_aligned_values(self, df_2020, df_2021):
+        """Test that the later year is aligned onto the base rows"""
+        result = compare_years(df_2020, df_2021)
+
+        assert result.columns.tolist() == [
+            "mesh1kmid",
+            "population",
+            "population_2021",
+            "delta",
+            "diff",
+        ]
+        assert result["mesh1kmid"].tolist() == df_2020["mesh1kmid"].tolist()
+        np.testing.assert_allclose(
+            result["population_2021"], [110, 5, np.nan, 40], equal_nan=True
+        )
+        np.testing.assert_allclose(
+            result["delta"], [10, 5, np.nan, -40], equal_nan=True
+        )
+        np.testing.assert_allclose(
+            result["diff"], [0.1, np.nan, np.nan, -0.5], equal_nan=True
+        )
+
+    @pytest.mark.unit
+    def test_matches_merge(self, df_2020, df_2021):
+        """Test that the growth rate matches the merge_df pipeline where defined"""
+        merged = merge_df(
+            df_2020,
+            df_2021,
+            on="mesh1kmid",
+            how="left",
+            suffixes=("", "_2021"),
+            drop=False,
+        )
+        expected = merged["population_2021"] / merged["population"] - 1
+        expected = expected.where(merged["population"] != 0)
+
+        result = compare_years(df_2020, df_2021)
+
+        np.testing.assert_allclose(result["diff"], expected, equal_nan=True)
+
+    @pytest.mark.unit
+    def test_duplicate_ids_are_summed(self, df_2020):
+        """Test that a cell listed twice in the later year is summed"""
+        df_2021 = pd.DataFrame(
+            {"mesh1kmid": [53394611, 53394611], "population": [60.0, 90]}
+        )
+
+        result = compare_years(df_2020, df_2021)
+
+        assert result["population_2021"].iloc[0] == 150
+        assert result["diff"].iloc[0] == pytest.approx(0.5)
+        assert len(result) == len(df_2020)
+
+    @pytest.mark.unit
+    def test_empty_next_year(self, df_2020):
+        """Test that an empty later year gives NaN changes"""
+        df_2021 = pd.DataFrame({"mesh1kmid": [], "population": []})
+
+        result = compare_years(df_2020, df_2021)
+
+        assert result["population_2021"].isna().all()
+        assert result["diff"].isna().all()
@@ -0,0 +1,277 @@
+"""Unit tests for app/common/dataset_store.py"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Patch st.cache_data / st.cache_resource before importing to bypass caching in tests
+with (
+    patch("streamlit.cache_data", lambda **kwargs: lambda func: func),
+    patch("streamlit.cache_resource", lambda **kwargs: lambda func: func),
+):
+    from app.common.dataset_store import (
+        DatasetStore,
+        LRUStore,
+        get_dataset_store,
+        nbytes,
+        selection_key,
+    )
+
+
+@pytest.fixture
+def df_population():
+    return pd.DataFrame(
+        {"mesh1kmid": [53394611, 53394612, 53394613], "population": [10, 20, 30]}
+    )
+
+
+class TestSelectionKey:
+    """Test selection_key function"""
+
+    @pytest.mark.unit
+    def test_order_does_not_matter(self):
+        """Test that argument order and code order give the same key"""
+        a = selection_key(dataset="mdp", citycode=[13101, 13102], month=4)
+        b = selection_key(month=4, citycode=[13102, 13101], dataset="mdp")
+
+        assert a == b
+
+    @pytest.mark.unit
+    def test_selection_changes_key(self):
+        """Test that every part of the selection is in the key"""
+        base = selection_key(dataset="mdp", month=4, columns=None)
+
+        assert base != selection_key(dataset="mdp", month=5, columns=None)
+        assert base != selection_key(dataset="fromto", month=4, columns=None)
+        assert base != selection_key(dataset="mdp", month=4, columns=["population"])
+
+
+class TestNbytes:
+    """Test nbytes function"""
+
+    @pytest.mark.unit
+    def test_frames_and_tuples(self, df_population):
+        """Test that a tuple is counted as the sum of its items"""
+        size = nbytes(df_population)
+
+        assert size > 0
+        assert nbytes((df_population, df_population)) == 2 * size
+
+    @pytest.mark.unit
+    def test_arrays(self):
+        """Test that objects with nbytes are counted by it"""
+        assert nbytes(np.zeros(100, dtype=np.float32)) == 400
+
+
+class TestLRUStore:
+    """Test LRUStore class"""
+
+    @pytest.mark.unit
+    def test_size_and_view(self):
+        """Test that values are sized and handed out through the hooks"""
+        store = LRUStore(10, size=len, view=lambda value: value.upper())
+
+        assert store.put("a", "abcd") == "ABCD"
+        assert store.get_or_create("a", lambda: "never") == "ABCD"
+        assert store.get("b") is None
+        store.put("b", "efghijkl")
+
+        assert "a" not in store
+        assert store.stats() == {
+            "entries": 1,
+            "bytes": 8,
+            "max_bytes": 10,
+            "hits": 1,
+            "misses": 1,
+        }
+
+
+class TestDatasetStore:
+    """Test DatasetStore class"""
+
+    @pytest.mark.unit
+    def test_get_or_create_loads_once(self, df_population):
+        """Test that the value is created only for the first request"""
+        store = DatasetStore(2**20)
+        calls = []
+
+        def create():
+            calls.append(1)
+            return df_population
+
+        first = store.get_or_create("a", create)
+        second = store.get_or_create("a", create)
+
+        assert len(calls) == 1
+        pd.testing.assert_frame_equal(first, df_population)
+        pd.testing.assert_frame_equal(second, df_population)
+
+    @pytest.mark.unit
+    def test_concurrent_get_or_create(self, df_population):
+        """Test that sessions asking for the same key at once create it once"""
+        store = DatasetStore(2**20)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def create():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return df_population
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            first = executor.submit(store.get_or_create, "a", create)
+            started.wait(5)
+            others = [
+                executor.submit(store.get_or_create, "a", create) for _ in range(3)
+            ]
+            release.set()
+            results = [first.result()] + [f.result() for f in others]
+
+        assert len(calls) == 1
+        for result in results:
+            pd.testing.assert_frame_equal(result, df_population)
+
+    @pytest.mark.unit
+    def test_waiter_retries_after_failure(self, df_population):
+        """Test that a waiter creates the value when the first creator fails"""
+        store = DatasetStore(2**20)
+        started = threading.Event()
+        release = threading.Event()
+
+        def fail():
+            started.set()
+            release.wait(5)
+            raise ValueError("download failed")
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            failing = executor.submit(store.get_or_create, "a", fail)
+            started.wait(5)
+            waiting = executor.submit(store.get_or_create, "a", lambda: df_population)
+            release.set()
+
+            with pytest.raises(ValueError):
+                failing.result()
+            pd.testing.assert_frame_equal(waiting.result(), df_population)
+
+        assert "a" in store
+
+    @pytest.mark.unit
+    def test_views_do_not_change_shared_data(self, df_population):
+        """Test that writing to a returned frame leaves the stored one alone"""
+        store = DatasetStore(2**20)
+        store.put("a", df_population)
+
+        view = store.get("a")
+        view["population"] = view["population"] * 2
+        view.loc[0, "mesh1kmid"] = 0
+        view["added"] = 1
+
+        stored = store.get("a")
+        assert stored["population"].tolist() == [10, 20, 30]
+        assert stored["mesh1kmid"].iloc[0] == 53394611
+        assert "added" not in stored.columns
+
+    @pytest.mark.unit
+    def test_copies_without_copy_on_write(self, df_population):
+        """Test that frames are copied when pandas does not copy on write"""
+        store = DatasetStore(2**20)
+        store.put("a", df_population)
+
+        with patch("app.common.dataset_store._copy_on_write", return_value=False):
+            view = store.get("a")
+        view.loc[0, "population"] = 0
+
+        assert not np.shares_memory(
+            view["population"].to_numpy(), df_population["population"].to_numpy()
+        )
+        assert store.get("a")["population"].tolist() == [10, 20, 30]
+
+    @pytest.mark.unit
+    def test_views_share_memory(self, df_population):
+        """Test that a view is not a copy until it is written to"""
+        store = DatasetStore(2**20)
+        store.put("a", df_population)
+
+        view = store.get("a")
+
+        assert np.shares_memory(
+            view["population"].to_numpy(), df_population["population"].to_numpy()
+        )
+
+    @pytest.mark.unit
+    def test_tuples(self, df_population):
+        """Test that each frame of a tuple is handed out as a view"""
+        store = DatasetStore(2**20)
+        store.put("a", (df_population, df_population))
+
+        first, second = store.get("a")
+        first["population"] = 0
+
+        assert second["population"].tolist() == [10, 20, 30]
+        assert store.get("a")[0]["population"].tolist() == [10, 20, 30]
+
+    @pytest.mark.unit
+    def test_missing_key(self):
+        """Test that an unknown key returns None"""
+        assert DatasetStore(2**20).get("missing") is None
+
+    @pytest.mark.unit
+    def test_evicts_least_recently_used(self):
+        """Test that the oldest value is dropped when the limit is reached"""
+        store = DatasetStore(2500)
+        store.put("a", np.zeros(1000, dtype=np.uint8))
+        store.put("b", np.zeros(1000, dtype=np.uint8))
+        store.get("a")
+        store.put("c", np.zeros(1000, dtype=np.uint8))
+
+        assert "a" in store
+        assert "b" not in store
+        assert "c" in store
+        assert store.stats()["bytes"] == 2000
+
+    @pytest.mark.unit
+    def test_oversized_value_is_not_kept(self, df_population):
+        """Test that a value larger than the limit is returned but not stored"""
+        store = DatasetStore(1)
+
+        result = store.put("a", df_population)
+
+        pd.testing.assert_frame_equal(result, df_population)
+        assert len(store) == 0
+
+    @pytest.mark.unit
+    def test_replace(self):
+        """Test that putting the same key again replaces the value"""
+        store = DatasetStore(2**20)
+        store.put("a", np.zeros(10, dtype=np.uint8))
+        store.put("a", np.zeros(20, dtype=np.uint8))
+
+        assert len(store) == 1
+        assert store.stats()["bytes"] == 20
+
+
+class TestGetDatasetStore:
+    """Test get_dataset_store function"""
+
+    @pytest.mark.unit
+    def test_size_from_environment(self, monkeypatch):
+        """Test that the limit is read from MLIT_DATASET_STORE_MB"""
+        monkeypatch.setenv("MLIT_DATASET_STORE_MB", "2")
+
+        assert get_dataset_store().max_bytes == 2 * 2**20
+
+    @pytest.mark.unit
+    def test_zero_disables_storing(self, monkeypatch, df_population):
+        """Test that a limit of 0 keeps nothing"""
+        monkeypatch.setenv("MLIT_DATASET_STORE_MB", "0")
+        store = get_dataset_store()
+
+        store.put("a", df_population)
+
+        assert len(store) == 0
@@ -0,0 +1,158 @@
+"""Unit tests for app/common/disk_cache.py"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from app.common.disk_cache import DiskCache, ParquetSink, get_disk_cache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DiskCache(tmp_path / "dc", max_bytes=10 * 2**20, max_age=60)
+
+
+class TestDiskCache:
+    """Test DiskCache class"""
+
+    @pytest.mark.unit
+    def test_put_and_read_roundtrip(self, cache):
+        """Test that a stored table is read back unchanged"""
+        df = pd.DataFrame({"mesh1kmid": [53394611, 53394612], "population": [10, 20]})
+
+        cache.put("mdp/13/2020/01/a.csv.zip", df, etag='"abc"')
+
+        entry = cache.lookup("mdp/13/2020/01/a.csv.zip")
+        assert entry is not None
+        assert entry.etag == '"abc"'
+        pd.testing.assert_frame_equal(cache.read("mdp/13/2020/01/a.csv.zip"), df)
+
+    @pytest.mark.unit
+    def test_missing_key(self, cache):
+        """Test that unknown keys return None"""
+        assert cache.lookup("nope") is None
+        assert cache.read("nope") is None
+
+    @pytest.mark.unit
+    def test_lru_eviction(self, tmp_path):
+        """Test that the least recently used entry is evicted over the limit"""
+        df = pd.DataFrame({"value": range(1000)})
+        probe = DiskCache(tmp_path / "probe", max_bytes=2**30, max_age=60)
+        probe.put("x", df)
+        size = probe.lookup("x").size
+
+        cache = DiskCache(tmp_path / "dc", max_bytes=int(size * 2.5), max_age=60)
+        cache.put("a", df)
+        time.sleep(0.01)
+        cache.put("b", df)
+        time.sleep(0.01)
+        cache.read("a")  # "a" becomes most recently used
+        time.sleep(0.01)
+        cache.put("c", df)
+
+        assert cache.lookup("a") is not None
+        assert cache.lookup("b") is None
+        assert cache.lookup("c") is not None
+        assert cache.stats()["bytes"] <= cache.max_bytes
+
+    @pytest.mark.unit
+    def test_read_keeps_index(self, cache):
+        """Test that a hit records its use without rewriting the index"""
+        df = pd.DataFrame({"value": range(10)})
+        cache.put("a", df)
+        time.sleep(0.01)
+        cache.put("b", df)
+        index = cache.directory / "index.json"
+        before = (index.read_bytes(), index.stat().st_mtime_ns)
+        time.sleep(0.01)
+
+        cache.read("a")
+
+        assert (index.read_bytes(), index.stat().st_mtime_ns) == before
+        assert [e.key for e in cache.entries()] == ["a", "b"]
+
+    @pytest.mark.unit
+    def test_shared_directory(self, tmp_path):
+        """Test that caches sharing a directory do not lose each other's entries"""
+        df = pd.DataFrame({"value": range(10)})
+        caches = [
+            DiskCache(tmp_path / "dc", max_bytes=10 * 2**20, max_age=60)
+            for _ in range(4)
+        ]
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda i: caches[i % 4].put(f"k{i}", df), range(40)))
+
+        assert {e.key for e in caches[0].entries()} == {f"k{i}" for i in range(40)}
+
+    @pytest.mark.unit
+    def test_purge(self, cache):
+        """Test purging one entry and all entries"""
+        df = pd.DataFrame({"value": [1]})
+        cache.put("a", df)
+        cache.put("b", df)
+
+        assert cache.purge("a") == 1
+        assert [e.key for e in cache.entries()] == ["b"]
+        assert cache.purge() == 1
+        assert cache.stats()["entries"] == 0
+        assert list(cache.directory.glob("*.parquet")) == []
+
+    @pytest.mark.unit
+    def test_freshness(self, cache):
+        """Test that entries go stale after max_age"""
+        cache.put("a", pd.DataFrame({"value": [1]}))
+        entry = cache.lookup("a")
+
+        assert entry.is_fresh(60)
+        assert not entry.is_fresh(0)
+
+    @pytest.mark.unit
+    def test_unserializable_validator_is_ignored(self, cache):
+        """Test that put never raises for bad validators"""
+        cache.put("a", pd.DataFrame({"value": [1]}), etag=object())
+
+        assert cache.lookup("a") is None
+
+
+class TestParquetSink:
+    """Test ParquetSink class"""
+
+    @pytest.mark.unit
+    def test_read_back_slice(self, tmp_path):
+        """Test that a slice of the written chunks is read back"""
+        sink = ParquetSink(tmp_path / "table.parquet")
+        sink.write(pd.DataFrame({"a": [1, 2], "b": [3, 4]}))
+        sink.write(pd.DataFrame({"a": [5], "b": [6]}))
+
+        df = sink.read(["b"], [("a", "in", [2, 5])])
+
+        assert df["b"].tolist() == [4, 6]
+        assert list(df.columns) == ["b"]
+        assert sink.close()
+
+    @pytest.mark.unit
+    def test_read_after_failure(self, tmp_path):
+        """Test None when nothing could be written"""
+        sink = ParquetSink(tmp_path / "table.parquet")
+
+        assert sink.read() is None
+
+
+class TestGetDiskCache:
+    """Test get_disk_cache function"""
+
+    @pytest.mark.unit
+    def test_disabled_with_empty_dir(self, monkeypatch):
+        """Test that an empty MLIT_CACHE_DIR disables the cache"""
+        monkeypatch.setenv("MLIT_CACHE_DIR", "")
+        assert get_disk_cache() is None
+
+    @pytest.mark.unit
+    def test_uses_configured_dir(self, isolated_disk_cache):
+        """Test that the cache lives in MLIT_CACHE_DIR"""
+        cache = get_disk_cache()
+        assert cache is not None
+        assert cache.directory == isolated_disk_cache
@@ -0,0 +1,154 @@
+"""Unit tests for app/common/folium_map_builder.py"""
+
+import branca.colormap as cm
+import folium
+import folium.plugins
+import numpy as np
+import pytest
+
+from app.common.folium_map_builder import (
+    SharedFeatures,
+    SharedGeoJsonLayer,
+    add_geojson_layer,
+    colormap_colors,
+    feature_collection,
+    shared_feature_collection,
+    tooltip_texts,
+)
+
+
+@pytest.fixture
+def colormap():
+    colormap = cm.linear.Paired_06.scale(100, 300)
+    colormap.caption = "滞在人口"
+    return colormap
+
+
+class TestColormapColors:
+    """Test colormap_colors function"""
+
+    @pytest.mark.unit
+    def test_matches_branca(self, colormap):
+        """Test that colors are identical to calling the colormap per value"""
+        values = np.linspace(50, 350, 301)
+
+        result = colormap_colors(colormap, values)
+
+        assert list(result) == [colormap(v) for v in values]
+
+    @pytest.mark.unit
+    def test_nan_is_transparent(self, colormap):
+        """Test that NaN values get a transparent color instead of raising"""
+        result = colormap_colors(colormap, [np.nan, 100])
+
+        assert result[0] == "#00000000"
+        assert result[1] == colormap(100)
+
+
+class TestTooltipTexts:
+    """Test tooltip_texts function"""
+
+    @pytest.mark.unit
+    def test_growth_rate_as_percent(self):
+        """Test that the growth rate is formatted like f'{x:.2%}'"""
+        values = np.array([0.12345, -0.5, 1.0])
+
+        result = tooltip_texts(values, "diff", "増減率")
+
+        assert list(result) == [f"diff: {v:.2%}" for v in values]
+
+    @pytest.mark.unit
+    def test_plain_value(self):
+        """Test that other values are formatted with str()"""
+        result = tooltip_texts(np.array([10.0, 3.5]), "population", "滞在人口")
+
+        assert list(result) == ["population: 10.0", "population: 3.5"]
+
+
+class TestAddGeojsonLayer:
+    """Test add_geojson_layer function"""
+
+    @pytest.mark.unit
+    def test_feature_collection_properties(self, sample_geodataframe, colormap):
+        """Test that each feature carries its style and tooltip"""
+        fc = feature_collection(sample_geodataframe, "value", colormap)
+
+        assert fc["type"] == "FeatureCollection"
+        assert len(fc["features"]) == 3
+        props = fc["features"][1]["properties"]
+        assert props["tooltip"] == "value: 200"
+        assert props["style"] == {"color": colormap(200), "fillColor": colormap(200)}
+
+    @pytest.mark.unit
+    def test_single_layer(self, sample_geodataframe, colormap):
+        """Test that batch mode adds one GeoJson layer for all cells"""
+        m = folium.Map()
+
+        add_geojson_layer(m, sample_geodataframe, "value", colormap)
+
+        layers = [c for c in m._children.values() if isinstance(c, folium.GeoJson)]
+        assert len(layers) == 1
+        assert len(layers[0].data["features"]) == 3
+
+    @pytest.mark.unit
+    def test_per_row_layers(self, sample_geodataframe, colormap):
+        """Test that batch=False keeps one GeoJson layer per cell"""
+        m = folium.Map()
+
+        add_geojson_layer(m, sample_geodataframe, "value", colormap, batch=False)
+
+        layers = [c for c in m._children.values() if isinstance(c, folium.GeoJson)]
+        assert len(layers) == 3
+
+
+class TestSharedFeatures:
+    """Test the shared FeatureCollection of the comparison maps"""
+
+    @pytest.fixture
+    def comparison(self, sample_geodataframe):
+        gdf = sample_geodataframe.assign(diff=[0.1, np.nan, -0.2])
+        growth = cm.linear.Accent_06.scale(-0.2, 0.1)
+        growth.caption = "増減率"
+        return gdf, growth
+
+    @pytest.mark.unit
+    def test_properties_per_value(self, comparison, colormap):
+        """Test that each value has its own color and tooltip (null when NaN)"""
+        gdf, growth = comparison
+
+        fc = shared_feature_collection(gdf, {"value": colormap, "diff": growth})
+
+        props = [f["properties"] for f in fc["features"]]
+        assert len(props) == 3
+        assert props[0]["value_color"] == colormap(100)
+        assert props[0]["diff_tooltip"] == "diff: 10.00%"
+        assert props[1]["diff_color"] is None
+        assert props[1]["diff_tooltip"] is None
+
+    @pytest.mark.unit
+    def test_cells_without_values_dropped(self, comparison, colormap):
+        """Test that cells with no value at all are not written"""
+        gdf, growth = comparison
+        gdf = gdf.assign(value=[np.nan, np.nan, 300])
+
+        fc = shared_feature_collection(gdf, {"value": colormap, "diff": growth})
+
+        assert len(fc["features"]) == 2
+
+    @pytest.mark.unit
+    def test_geometry_written_once(self, comparison, colormap):
+        """Test that both panes of a DualMap draw the same page variable"""
+        gdf, growth = comparison
+        m = folium.plugins.DualMap(location=[36, 140])
+        features = SharedFeatures(
+            shared_feature_collection(gdf, {"value": colormap, "diff": growth})
+        )
+        m.m1.add_child(features)
+        m.m1.add_child(SharedGeoJsonLayer(features, "value"))
+        m.m2.add_child(SharedGeoJsonLayer(features, "diff"))
+
+        page = m.get_root().render()
+
+        assert page.count('"type":"Polygon"') == 3
+        assert page.count(f"L.geoJson({features.get_name()}") == 2
+        assert page.index(f"var {features.get_name()} =") < page.index("L.geoJson(")
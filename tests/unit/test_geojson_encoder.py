@@ -0,0 +1,105 @@
+"""Unit tests for app/common/geojson_encoder.py"""
+
+import json
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import MultiPolygon, box
+
+from app.common.geojson_encoder import dumps, encode_features, quantize
+
+
+@pytest.fixture
+def mesh_cells():
+    """Two 1km cells with float32 noise, as read from the attribute file"""
+    bounds = np.array(
+        [
+            [139.75, 35.666667, 139.7625, 35.675],
+            [139.7625, 35.666667, 139.775, 35.675],
+        ],
+        dtype=np.float32,
+    ).astype(np.float64)
+    return gpd.GeoDataFrame(geometry=[box(*b) for b in bounds], crs="EPSG:4326")
+
+
+class TestQuantize:
+    """Test quantize function"""
+
+    @pytest.mark.unit
+    def test_lattice(self):
+        """Test that coordinates snap to the 30" x 45" lattice"""
+        coords = np.array([[np.float32(139.7625), np.float32(35.666667)]], dtype=float)
+
+        result = quantize(coords, "lattice")
+
+        assert result.tolist() == [[139.7625, 35.666667]]
+
+    @pytest.mark.unit
+    def test_decimals(self):
+        """Test rounding to a number of decimals, and None as a no-op"""
+        coords = np.array([[139.123456789, 35.987654321]])
+
+        assert quantize(coords, 3).tolist() == [[139.123, 35.988]]
+        assert quantize(coords, None) is coords
+
+
+class TestEncodeFeatures:
+    """Test encode_features function"""
+
+    @pytest.mark.unit
+    def test_properties_and_nulls(self, mesh_cells):
+        """Test that properties are attached and NaN becomes null"""
+        fc = encode_features(mesh_cells, {"population": np.array([1.5, np.nan])})
+
+        assert fc["type"] == "FeatureCollection"
+        assert [f["properties"] for f in fc["features"]] == [
+            {"population": 1.5},
+            {"population": None},
+        ]
+
+    @pytest.mark.unit
+    def test_open_rings(self, mesh_cells):
+        """Test that close_rings=False drops the repeated closing vertex"""
+        closed = encode_features(mesh_cells, {}, "lattice")
+        opened = encode_features(mesh_cells, {}, "lattice", close_rings=False)
+
+        ring = closed["features"][0]["geometry"]["coordinates"][0]
+        assert len(ring) == 5 and ring[0] == ring[-1]
+        assert opened["features"][0]["geometry"]["coordinates"][0] == ring[:-1]
+
+    @pytest.mark.unit
+    def test_same_as_geopandas(self, mesh_cells):
+        """Test that unquantized output matches GeoDataFrame.to_geo_dict"""
+        fc = encode_features(mesh_cells, {"v": np.array([1, 2])}, None)
+        expected = mesh_cells.assign(v=[1, 2]).to_geo_dict(drop_id=True)
+
+        for ours, theirs in zip(fc["features"], expected["features"]):
+            assert ours["properties"] == theirs["properties"]
+            assert ours["geometry"]["coordinates"][0] == [
+                list(c) for c in theirs["geometry"]["coordinates"][0]
+            ]
+
+    @pytest.mark.unit
+    def test_multipolygon_fallback(self):
+        """Test that other geometry types are encoded one by one"""
+        gdf = gpd.GeoDataFrame(
+            geometry=[MultiPolygon([box(0, 0, 1, 1), box(2, 2, 3, 3)])]
+        )
+
+        fc = encode_features(gdf, {}, 6, close_rings=False)
+
+        geometry = fc["features"][0]["geometry"]
+        assert geometry["type"] == "MultiPolygon"
+        assert [len(p[0]) for p in geometry["coordinates"]] == [4, 4]
+
+
+class TestDumps:
+    """Test dumps function"""
+
+    @pytest.mark.unit
+    def test_compact_and_script_safe(self):
+        """Test that no whitespace is written and </script> cannot appear"""
+        text = dumps({"a": [1, 2], "t": "</script>"})
+
+        assert text == '{"a":[1,2],"t":"\\u003c/script\\u003e"}'
+        assert json.loads(text) == {"a": [1, 2], "t": "</script>"}
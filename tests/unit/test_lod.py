@@ -0,0 +1,142 @@
+"""Unit tests for app/common/lod.py"""
+
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Patch st.cache_data / st.cache_resource before importing to bypass caching in tests
+with (
+    patch("streamlit.cache_data", lambda **kwargs: lambda func: func),
+    patch("streamlit.cache_resource", lambda **kwargs: lambda func: func),
+):
+    from app.common.compare import growth_rate
+    from app.common.lod import (
+        aggregate_cells,
+        coordinate_decimals,
+        lattice_index,
+        lod_for_zoom,
+        lod_polygons,
+    )
+
+
+def _cells(rows: list[tuple[int, int, float, float]]) -> pd.DataFrame:
+    """1km cells from (row, column, population 2020, population 2021)."""
+    i = np.array([r[0] for r in rows])
+    j = np.array([r[1] for r in rows])
+    p2020 = np.array([r[2] for r in rows], dtype=float)
+    p2021 = np.array([r[3] for r in rows], dtype=float)
+    return pd.DataFrame(
+        {
+            "lon_min": 100 + j / 80,
+            "lat_min": i / 120,
+            "lon_max": 100 + (j + 1) / 80,
+            "lat_max": (i + 1) / 120,
+            "lon": 100 + (j + 0.5) / 80,
+            "lat": (i + 0.5) / 120,
+            "population": p2020,
+            "population_2021": p2021,
+            "diff": growth_rate(p2021, p2020),
+        }
+    )
+
+
+class TestLatticeIndex:
+    """Test lattice_index function"""
+
+    @pytest.mark.unit
+    def test_tokyo_station(self):
+        """Test the lattice of mesh 53394611 (from the centers in MeshStore)"""
+        lon = 139.76875
+        lat = 35.679167
+
+        i, j = lattice_index([lon], [lat])
+
+        # 5339: 35.333..N, 139E / 46: +4*5', +6*7.5' / 11: +1*30", +1*45"
+        assert i[0] == 53 * 80 + 4 * 10 + 1
+        assert j[0] == 39 * 80 + 6 * 10 + 1
+
+
+class TestLodForZoom:
+    """Test lod_for_zoom and coordinate_decimals functions"""
+
+    @pytest.mark.unit
+    def test_levels(self):
+        """Test that coarser cells are chosen as the map zooms out"""
+        assert [lod_for_zoom(z) for z in (11, 10, 9, 8, 5)] == [1, 1, 2, 2, 2]
+
+    @pytest.mark.unit
+    def test_decimals(self):
+        """Test that coordinate precision grows with the zoom level"""
+        assert coordinate_decimals(9) == 3
+        assert coordinate_decimals(14) == 5
+
+
+class TestAggregateCells:
+    """Test aggregate_cells function"""
+
+    @pytest.mark.unit
+    def test_sums_and_growth(self):
+        """Test that populations are summed and growth is recomputed"""
+        df = _cells(
+            [
+                (4281, 3181, 100, 110),
+                (4280, 3180, 300, 330),
+                (4280, 3181, 50, np.nan),  # 2021 なし: 増減率には含めない
+                (4282, 3182, 10, 20),  # 別の 2km セル
+            ]
+        )
+
+        out = aggregate_cells(df, 2).sort_values("lat_min").reset_index(drop=True)
+
+        assert len(out) == 2
+        assert out["population"].tolist() == [450, 10]
+        assert out["population_2021"].tolist() == [440, 20]
+        assert out["diff"].iloc[0] == pytest.approx(440 / 400 - 1)
+        assert out["diff"].iloc[1] == pytest.approx(1.0)
+
+    @pytest.mark.unit
+    def test_zero_base(self):
+        """Test that a block with no base population has no growth rate"""
+        df = _cells([(4280, 3180, 0, 5), (4280, 3181, 0, 10)])
+
+        out = aggregate_cells(df, 2)
+
+        assert out["population_2021"].tolist() == [15]
+        assert np.isnan(out["diff"].iloc[0])
+
+    @pytest.mark.unit
+    def test_cell_bounds(self):
+        """Test that aggregate cells lie on the 2x mesh grid"""
+        out = aggregate_cells(_cells([(4281, 3181, 1, 1)]), 2)
+
+        assert out["lat_min"].iloc[0] == pytest.approx(4280 / 120)
+        assert out["lat_max"].iloc[0] == pytest.approx(4282 / 120)
+        assert out["lon_min"].iloc[0] == pytest.approx(100 + 3180 / 80)
+        assert out["lon_max"].iloc[0] == pytest.approx(100 + 3182 / 80)
+
+
+class TestLodPolygons:
+    """Test lod_polygons function"""
+
+    @pytest.mark.unit
+    def test_full_detail(self):
+        """Test that 1km cells are kept at high zoom"""
+        df = _cells([(4280, 3180, 1, 2), (4280, 3181, 3, 4)])
+
+        gdf = lod_polygons(df, ["population", "diff"], 11)
+
+        assert len(gdf) == 2
+
+    @pytest.mark.unit
+    def test_aggregated(self):
+        """Test that cells are merged and corners rounded at low zoom"""
+        df = _cells([(4280, 3180, 1, 2), (4280, 3181, 3, 4)])
+
+        gdf = lod_polygons(df, ["population", "diff"], 9)
+
+        assert len(gdf) == 1
+        assert gdf["population"].iloc[0] == 4
+        xs, ys = gdf.geometry.iloc[0].exterior.xy
+        assert all(round(v, 3) == v for v in list(xs) + list(ys))
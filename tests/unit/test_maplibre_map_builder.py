@@ -0,0 +1,119 @@
+"""Unit tests for app/common/maplibre_map_builder.py"""
+
+import logging
+
+import branca.colormap as cm
+import numpy as np
+import pytest
+
+logging.getLogger("maplibre").setLevel(logging.ERROR)
+
+from app.common.maplibre_map_builder import (  # noqa: E402
+    NO_DATA_COLOR,
+    color_expression,
+    create_single_map,
+    feature_values,
+    mesh_source,
+    tooltip_template,
+)
+
+
+@pytest.fixture
+def growth_colormap():
+    colormap = cm.linear.Accent_06.scale(-0.5, 0.8)
+    colormap.caption = "増減率"
+    return colormap
+
+
+class TestColorExpression:
+    """Test color_expression function"""
+
+    @pytest.mark.unit
+    def test_stops_follow_colormap(self, growth_colormap):
+        """Test that the interpolate stops are the branca stops (in percent)"""
+        expression = color_expression("diff", growth_colormap)
+
+        case, is_number, interpolate, fallback = expression
+        assert case == "case"
+        assert is_number == ["==", ["typeof", ["get", "diff"]], "number"]
+        assert fallback == NO_DATA_COLOR
+        assert interpolate[:3] == ["interpolate", ["linear"], ["get", "diff"]]
+        stops = interpolate[3:]
+        assert stops[0::2] == pytest.approx([v * 100 for v in growth_colormap.index])
+        r, g, b, _ = (int(c * 255.9999) for c in growth_colormap.colors[0])
+        assert stops[1] == f"rgba({r}, {g}, {b}, 1.0)"
+
+    @pytest.mark.unit
+    def test_constant_colormap(self):
+        """Test that a colormap without range becomes a plain color"""
+        colormap = cm.linear.Paired_06.scale(5, 5)
+        colormap.caption = "滞在人口"
+
+        assert isinstance(color_expression("population", colormap), str)
+
+
+class TestFeatureValues:
+    """Test feature_values and tooltip_template functions"""
+
+    @pytest.mark.unit
+    def test_percent(self):
+        """Test that the growth rate is sent as a rounded percentage"""
+        result = feature_values(np.array([0.1234, np.nan]), "増減率")
+
+        assert result[0] == 12.34
+        assert np.isnan(result[1])
+        assert tooltip_template("diff", "増減率") == "diff: {{ diff }}%"
+
+    @pytest.mark.unit
+    def test_plain(self):
+        """Test that other values are sent as is (2 decimals)"""
+        result = feature_values(np.array([10.5], dtype=np.float32), "滞在人口")
+
+        assert result[0] == 10.5
+        assert tooltip_template("population", "滞在人口") == (
+            "population: {{ population }}"
+        )
+
+
+class TestCreateSingleMap:
+    """Test create_single_map function"""
+
+    @pytest.mark.unit
+    def test_one_number_per_feature(self, monkeypatch, sample_geodataframe):
+        """Test that features carry only the value and styling is an expression"""
+        monkeypatch.delenv("MLIT_TILE_BASE_URL", raising=False)
+        colormap = cm.linear.Paired_06.scale(100, 300)
+        colormap.caption = "滞在人口"
+
+        m = create_single_map(sample_geodataframe, "value", colormap, (139, 35), 10)
+
+        calls = dict(m._message_queue)
+        features = calls["addSource"][1]["data"]["features"]
+        assert [f["properties"] for f in features] == [
+            {"value": 100.0},
+            {"value": 200.0},
+            {"value": 300.0},
+        ]
+        layers = [args[0] for name, args in m._message_queue if name == "addLayer"]
+        assert layers[0]["paint"]["fill-color"][0] == "case"
+        assert layers[1]["paint"]["line-color"] == layers[0]["paint"]["fill-color"]
+
+    @pytest.mark.unit
+    def test_shared_source(self, monkeypatch, sample_geodataframe):
+        """Test that two maps can style one source with different values"""
+        monkeypatch.delenv("MLIT_TILE_BASE_URL", raising=False)
+        gdf = sample_geodataframe.assign(diff=[0.1, np.nan, -0.2])
+        population = cm.linear.Paired_06.scale(100, 300)
+        population.caption = "滞在人口"
+        growth = cm.linear.Accent_06.scale(-0.2, 0.1)
+        growth.caption = "増減率"
+
+        source = mesh_source(gdf, {"value": "滞在人口", "diff": "増減率"})
+        left = create_single_map(gdf, "value", population, (139, 35), 10, source)
+        right = create_single_map(gdf, "diff", growth, (139, 35), 10, source)
+
+        data = source[0].to_dict()["data"]
+        assert data["features"][1]["properties"] == {"value": 200.0, "diff": None}
+        for m, value in ((left, "value"), (right, "diff")):
+            layers = [args[0] for name, args in m._message_queue if name == "addLayer"]
+            assert layers[0]["filter"] == ["==", ["typeof", ["get", value]], "number"]
@@ -0,0 +1,206 @@
+"""Unit tests for app/common/mesh_store.py"""
+
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Patch st.cache_data / st.cache_resource before importing to bypass caching in tests
+with (
+    patch("streamlit.cache_data", lambda **kwargs: lambda func: func),
+    patch("streamlit.cache_resource", lambda **kwargs: lambda func: func),
+):
+    from app.common.mesh_store import DecodedMeshes, MeshStore, cross_check
+    from app.common.utils import make_polygons, merge_df
+
+
+@pytest.fixture
+def df_attr():
+    return pd.DataFrame(
+        {
+            "mesh1kmid": [53394612, 53394611, 53394621],
+            "lon_min": [139.7625, 139.75, 139.75],
+            "lat_min": [35.666667, 35.666667, 35.675],
+            "lon_max": [139.775, 139.7625, 139.7625],
+            "lat_max": [35.675, 35.675, 35.683333],
+            "lon_center": [139.76875, 139.75625, 139.75625],
+            "lat_center": [35.670833, 35.670833, 35.679167],
+        }
+    )
+
+
+class TestMeshStore:
+    """Test MeshStore class"""
+
+    @pytest.mark.unit
+    def test_sorted_read_only_arrays(self, df_attr):
+        """Test that ids are sorted and arrays are compact and read-only"""
+        mesh = MeshStore.from_frame(df_attr)
+
+        assert mesh.ids.tolist() == [53394611, 53394612, 53394621]
+        assert mesh.ids.dtype == np.int64
+        assert mesh.columns["lon_min"].dtype == np.float64
+        assert not mesh.ids.flags.writeable
+        assert not mesh.columns["lat_max"].flags.writeable
+        assert mesh.nbytes == 3 * 8 + 6 * 3 * 8
+
+    @pytest.mark.unit
+    def test_duplicate_ids(self, df_attr):
+        """Test that duplicate mesh ids are rejected"""
+        df = pd.concat([df_attr, df_attr.iloc[:1]])
+
+        with pytest.raises(ValueError, match="unique"):
+            MeshStore.from_frame(df)
+
+    @pytest.mark.unit
+    def test_positions(self, df_attr):
+        """Test lookup of present and missing ids"""
+        mesh = MeshStore.from_frame(df_attr)
+
+        pos, found = mesh.positions([53394621, 1, 99999999, 53394611])
+
+        assert found.tolist() == [True, False, False, True]
+        assert pos[found].tolist() == [2, 0]
+
+    @pytest.mark.unit
+    def test_join_matches_merge_df(self, df_attr):
+        """Test that join gives the same result as the merge_df left join"""
+        mesh = MeshStore.from_frame(df_attr)
+        df = pd.DataFrame(
+            {"mesh1kmid": [53394611, 53394621, 12345678], "population": [1.0, 2, 3]}
+        )
+
+        joined = mesh.join(df)
+        expected = merge_df(
+            df, df_attr, on="mesh1kmid", how="left", suffixes=("", "_drop"), drop=True
+        )
+
+        for col in ["lon_min", "lat_min", "lon_max", "lat_max", "lat", "lon"]:
+            np.testing.assert_allclose(
+                joined[col].to_numpy(), expected[col].to_numpy(), rtol=1e-6
+            )
+        assert joined["population"].tolist() == [1.0, 2, 3]
+        assert np.isnan(joined["lat"].iloc[2])
+
+    @pytest.mark.unit
+    def test_empty_store(self):
+        """Test that an empty store finds nothing"""
+        mesh = MeshStore(np.array([], dtype=np.int64), {"lat_min": np.array([])})
+
+        assert len(mesh) == 0
+        assert np.isnan(mesh.take("lat_min", [1, 2])).all()
+
+    @pytest.mark.unit
+    def test_geometries_are_built_once(self, df_attr):
+        """Test that polygons are cached per mesh id and reused"""
+        mesh = MeshStore.from_frame(df_attr)
+
+        first = mesh.geometries([53394611, 53394611, 1])
+        assert mesh.geometry_count == 1
+        assert first[2] is None
+        assert first[0].bounds == pytest.approx((139.75, 35.666667, 139.7625, 35.675))
+
+        second = mesh.geometries([53394621, 53394611])
+        assert mesh.geometry_count == 2
+        assert second[1] is first[0]
+
+    @pytest.mark.unit
+    def test_make_polygons_with_store(self, df_attr):
+        """Test that make_polygons gathers the cached polygons by mesh id"""
+        mesh = MeshStore.from_frame(df_attr)
+        df = mesh.join(
+            pd.DataFrame({"mesh1kmid": [53394621, 53394612], "diff": [0.1, -0.2]})
+        )
+
+        gdf = make_polygons(df, "diff", mesh)
+        expected = make_polygons(df, "diff")
+
+        assert gdf["diff"].tolist() == [0.1, -0.2]
+        assert all(gdf.geometry.geom_equals_exact(expected.geometry, tolerance=1e-9))
+
+    @pytest.mark.unit
+    def test_from_codes(self):
+        """Test a store decoded from mesh codes"""
+        mesh = MeshStore.from_codes([53394612, 53394611, 53394611, 53398611])
+
+        assert mesh.ids.tolist() == [53394611, 53394612]
+        assert mesh.take("lon_min", [53394611]) == pytest.approx([139.7625])
+        assert mesh.take("lat_center", [53394612]) == pytest.approx([35.679167])
+
+        joined = mesh.join(pd.DataFrame({"mesh1kmid": [53394612, 53398611]}))
+        assert joined["lon"].iloc[0] == pytest.approx(139.78125)
+        assert np.isnan(joined["lon"].iloc[1])
+
+    @pytest.mark.unit
+    def test_decoded_precision(self):
+        """Test that decoded bounds keep well under 1e-5 degrees at lon 140"""
+        mesh = MeshStore.from_codes([53394611])
+
+        assert mesh.take("lon_min", [53394611])[0] == pytest.approx(139.7625, abs=1e-9)
+        assert mesh.take("lat_max", [53394611])[0] == pytest.approx(
+            35 + 41 / 60, abs=1e-9
+        )
+
+    @pytest.mark.unit
+    def test_extended(self):
+        """Test that new cells are added and built polygons carried over"""
+        mesh = MeshStore.from_codes([53394612])
+        polygon = mesh.geometries([53394612])[0]
+
+        extended = mesh.extended([53394611, 53394612, 53398611])
+        assert extended.ids.tolist() == [53394611, 53394612]
+        assert extended.take("lon_min", [53394611]) == pytest.approx([139.7625])
+        assert extended.geometry_count == 1
+        assert extended.geometries([53394612])[0] is polygon
+
+        assert extended.extended([53394611, 53398611]) is extended
+
+
+class TestDecodedMeshes:
+    """Test DecodedMeshes class"""
+
+    @pytest.mark.unit
+    def test_covering(self):
+        """Test that the shared store grows and keeps its polygons"""
+        meshes = DecodedMeshes()
+
+        first = meshes.covering([53394611])
+        polygon = first.geometries([53394611])[0]
+        assert meshes.covering([53394611]) is first
+
+        second = meshes.covering([53394612])
+        assert second.ids.tolist() == [53394611, 53394612]
+        assert second.geometries([53394611])[0] is polygon
+        assert meshes.store is second
+
+
+class TestCrossCheck:
+    """Test cross_check function"""
+
+    @pytest.mark.unit
+    def test_cross_check(self):
+        """Test that mismatched and missing cells are reported"""
+        df = pd.DataFrame(
+            {
+                "mesh1kmid": [53394611, 53394612],
+                "lon_min": [139.7625, 139.775],
+                "lat_min": [35.675, 35.675],
+                "lon_max": [139.775, 139.7875],
+                "lat_max": [35.683333, 35.683333],
+                "lon_center": [139.76875, 139.78125],
+                "lat_center": [35.679167, 35.679167],
+            }
+        )
+        reference = MeshStore.from_frame(df)
+
+        assert cross_check(MeshStore.from_codes(df["mesh1kmid"]), reference).empty
+
+        df.loc[1, "lat_min"] = 35.6
+        result = cross_check(
+            MeshStore.from_codes([53394611, 53394612, 53394621]),
+            MeshStore.from_frame(df),
+        )
+        assert result["mesh1kmid"].tolist() == [53394612, 53394621]
+        assert result["error"].iloc[0] == pytest.approx(0.075, abs=1e-5)
+        assert np.isnan(result["error"].iloc[1])
@@ -0,0 +1,96 @@
+"""Unit tests for app/common/meshcode.py"""
+
+import numpy as np
+import pytest
+
+from app.common.meshcode import (
+    code_to_lattice,
+    decode,
+    encode,
+    lattice_index,
+    lattice_to_code,
+    neighbours,
+    shift,
+)
+
+
+class TestDecode:
+    """Test decode function"""
+
+    @pytest.mark.unit
+    def test_bounds_and_center(self):
+        """Test the bounds of mesh 53394611 (Tokyo Station)"""
+        bounds = decode([53394611])
+
+        assert bounds["lon_min"][0] == pytest.approx(139.7625)
+        assert bounds["lat_min"][0] == pytest.approx(35.675)
+        assert bounds["lon_max"][0] == pytest.approx(139.775)
+        assert bounds["lat_max"][0] == pytest.approx(35.683333, abs=1e-6)
+        assert bounds["lon_center"][0] == pytest.approx(139.76875)
+        assert bounds["lat_center"][0] == pytest.approx(35.679167, abs=1e-6)
+
+    @pytest.mark.unit
+    def test_invalid_codes(self):
+        """Test that codes with a second-level digit of 8 or 9 decode to NaN"""
+        bounds = decode([53398611, 53394911, 53394611])
+
+        assert np.isnan(bounds["lon_min"][:2]).all()
+        assert np.isnan(bounds["lat_center"][:2]).all()
+        assert not np.isnan(bounds["lon_min"][2])
+
+    @pytest.mark.unit
+    def test_vectorized(self):
+        """Test that bounds of adjacent codes share their edges"""
+        bounds = decode(np.array([53394611, 53394612, 53394621]))
+
+        assert bounds["lon_max"][0] == pytest.approx(bounds["lon_min"][1])
+        assert bounds["lat_max"][0] == pytest.approx(bounds["lat_min"][2])
+
+
+class TestEncode:
+    """Test encode function"""
+
+    @pytest.mark.unit
+    def test_round_trip(self):
+        """Test that decoding the centers gives the codes back"""
+        codes = np.array([53394611, 53394677, 53394700, 36225759, 68441111])
+        bounds = decode(codes)
+
+        assert encode(bounds["lon_center"], bounds["lat_center"]).tolist() == (
+            codes.tolist()
+        )
+
+    @pytest.mark.unit
+    def test_point(self):
+        """Test the code of a point inside a cell"""
+        assert encode([139.767], [35.681]).tolist() == [53394611]
+
+    @pytest.mark.unit
+    def test_lattice_round_trip(self):
+        """Test conversion between codes and lattice indices"""
+        i, j, valid = code_to_lattice([53394611])
+        ci, cj = lattice_index(np.array([139.76875]), np.array([35.679167]))
+
+        assert valid.all()
+        assert (i[0], j[0]) == (ci[0], cj[0])
+        assert lattice_to_code(i, j).tolist() == [53394611]
+
+
+class TestNeighbours:
+    """Test neighbours and shift functions"""
+
+    @pytest.mark.unit
+    def test_neighbours(self):
+        """Test the 8 neighbours of a cell, clockwise from north"""
+        assert neighbours([53394611]).tolist() == [
+            [53394621, 53394622, 53394612, 53394602, 53394601, 53394600, 53394610]
+            + [53394620]
+        ]
+
+    @pytest.mark.unit
+    def test_shift_across_boundaries(self):
+        """Test moves across second- and first-level mesh boundaries"""
+        assert shift([53394679], 0, 1).tolist() == [53394770]
+        assert shift([53394697], 1, 0).tolist() == [53395607]
+        assert shift([53394770], 0, -1).tolist() == [53394679]
+        assert shift([53397799], 1, 1).tolist() == [54400000]
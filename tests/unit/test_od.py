@@ -0,0 +1,217 @@
+"""Unit tests for app/common/od.py"""
+
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Patch st.cache_data / st.cache_resource before importing to bypass caching in tests
+with (
+    patch("streamlit.cache_data", lambda **kwargs: lambda func: func),
+    patch("streamlit.cache_resource", lambda **kwargs: lambda func: func),
+):
+    from app.common.od import COLUMNS, ODComparison, ODCube, load_od
+
+
+def _frame(rows):
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+@pytest.fixture
+def df_2020():
+    return _frame(
+        [
+            (13101, 0, 2, 2, 100.0),
+            (13101, 1, 2, 2, 50.0),
+            (13101, 0, 2, 2, 10.0),  # 同じキーの行は合計する
+            (13102, 0, 2, 2, 10.0),
+            (13102, 3, 0, 1, 5.0),
+        ]
+    )
+
+
+@pytest.fixture
+def df_2021():
+    return _frame(
+        [
+            (13101, 0, 2, 2, 132.0),
+            (13101, 1, 2, 2, 40.0),
+            (13102, 0, 2, 2, 20.0),
+            (13103, 0, 2, 2, 7.0),
+        ]
+    )
+
+
+@pytest.fixture
+def od(df_2020, df_2021):
+    return ODComparison(ODCube.from_frame(df_2020), ODCube.from_frame(df_2021))
+
+
+class TestODCube:
+    """Test ODCube class"""
+
+    @pytest.mark.unit
+    def test_from_frame(self, df_2020):
+        """Test that rows are stacked by city, origin, dayflag and timezone"""
+        cube = ODCube.from_frame(df_2020)
+
+        assert cube.citycodes.tolist() == [13101, 13102]
+        assert cube.values.shape == (2, 4, 3, 3)
+        assert cube.values[0, 0, 2, 2] == 110
+        assert cube.values[1, 3, 0, 1] == 5
+        assert np.isnan(cube.values[1, 1, 2, 2])
+
+    @pytest.mark.unit
+    def test_matches_groupby(self, df_2020):
+        """Test the same sums as a pandas groupby"""
+        cube = ODCube.from_frame(df_2020)
+        expected = df_2020.groupby(["citycode", "from_area", "dayflag", "timezone"])[
+            "population"
+        ].sum()
+
+        for (city, area, day, tz), value in expected.items():
+            row = cube.citycodes.tolist().index(city)
+            assert cube.values[row, area, day, tz] == value
+        assert (~np.isnan(cube.values)).sum() == len(expected)
+
+    @pytest.mark.unit
+    def test_read_only(self, df_2020):
+        """Test that the shared values cannot be modified"""
+        cube = ODCube.from_frame(df_2020)
+
+        with pytest.raises(ValueError):
+            cube.values[0, 0, 0, 0] = 1
+
+    @pytest.mark.unit
+    def test_slice_defaults_to_all_day(self, df_2020):
+        """Test that no dayflag / timezone selects 全日・終日"""
+        cube = ODCube.from_frame(df_2020)
+
+        np.testing.assert_array_equal(cube.slice(), cube.slice(2, 2))
+        assert cube.slice(0, 1)[1, 3] == 5
+
+    @pytest.mark.unit
+    def test_reindex(self, df_2020):
+        """Test that missing cities get NaN rows"""
+        cube = ODCube.from_frame(df_2020).reindex(np.array([13100, 13102]))
+
+        assert cube.citycodes.tolist() == [13100, 13102]
+        assert np.isnan(cube.values[0]).all()
+        assert cube.values[1, 0, 2, 2] == 10
+
+    @pytest.mark.unit
+    def test_empty(self):
+        """Test a table without rows"""
+        cube = ODCube.from_frame(_frame([]))
+
+        assert len(cube) == 0
+        assert cube.values.shape == (0, 4, 3, 3)
+
+
+class TestODComparison:
+    """Test ODComparison class"""
+
+    @pytest.mark.unit
+    def test_cities_of_both_years(self, od):
+        """Test that cities of either year are rows"""
+        assert od.citycodes.tolist() == [13101, 13102, 13103]
+        assert od.nbytes > 0
+
+    @pytest.mark.unit
+    def test_pivot(self, od):
+        """Test population by city and origin class"""
+        df = od.pivot(citycode=[13101])
+
+        assert df.index.tolist() == [13101]
+        assert df.columns.tolist() == [0, 1, 2, 3]
+        assert df.loc[13101, 0] == 132
+        assert od.pivot(following=False).loc[13101, 0] == 110
+
+    @pytest.mark.unit
+    def test_shares(self, od):
+        """Test that shares of a city sum to 1"""
+        df = od.shares()
+
+        assert df.loc[13101, 0] == pytest.approx(132 / 172)
+        assert df.loc[13101].sum() == pytest.approx(1)
+        assert df.loc[13103, 0] == 1
+
+    @pytest.mark.unit
+    def test_frame(self, od):
+        """Test the change of every city and origin class"""
+        df = od.frame(citycode=[13101])
+
+        assert len(df) == 4
+        assert df["from_area"].tolist() == [0, 1, 2, 3]
+        assert df["population"].iloc[0] == 110
+        assert df["population_2021"].iloc[0] == 132
+        assert df["delta"].iloc[0] == 22
+        assert df["diff"].iloc[0] == pytest.approx(0.2)
+        assert np.isnan(df["diff"].iloc[2])
+
+    @pytest.mark.unit
+    def test_origins(self, od):
+        """Test the change and share of each origin class"""
+        df = od.origins()
+
+        assert df.loc[0, "population"] == 120
+        assert df.loc[0, "population_2021"] == 159
+        assert df.loc[0, "diff"] == pytest.approx(159 / 120 - 1)
+        assert df.loc[0, "share"] == pytest.approx(120 / 170)
+        assert df.loc[0, "share_2021"] == pytest.approx(159 / 199)
+        assert np.isnan(df.loc[2, "population"])
+
+    @pytest.mark.unit
+    def test_origins_of_selected_cities(self, od):
+        """Test that the city selection limits the sums"""
+        df = od.origins(citycode=[13102])
+
+        assert df.loc[0, "population"] == 10
+        assert df.loc[0, "population_2021"] == 20
+
+    @pytest.mark.unit
+    def test_top_cities(self, od):
+        """Test that cities are ranked by growth rate"""
+        df = od.top_cities(5)
+
+        # 13103 は 2020 年のデータがないので増減率がない
+        assert df["citycode"].tolist() == [13102, 13101]
+        assert df["diff"].iloc[0] == pytest.approx(1.0)
+        assert df["diff"].iloc[1] == pytest.approx(172 / 160 - 1)
+        assert len(od.top_cities(1)) == 1
+
+    @pytest.mark.unit
+    def test_top_cities_of_origin_class(self, od):
+        """Test the ranking by the visitors of one origin class"""
+        df = od.top_cities(5, from_area=1)
+
+        assert df["citycode"].tolist() == [13101]
+        assert df["diff"].iloc[0] == pytest.approx(-0.2)
+
+    @pytest.mark.unit
+    def test_other_flags(self, od):
+        """Test that another dayflag / timezone is a different slice"""
+        df = od.origins(dayflag=0, timezone=1)
+
+        assert df.loc[3, "population"] == 5
+        assert np.isnan(df.loc[3, "population_2021"])
+
+
+class TestLoadOd:
+    """Test load_od function"""
+
+    @pytest.mark.unit
+    @patch("app.common.od.fetch_data_batch")
+    def test_fetches_both_years(self, mock_fetch, df_2020, df_2021):
+        """Test that both years are requested in one batch without row filters"""
+        mock_fetch.return_value = [df_2020, df_2021]
+
+        od = load_od(month=4)
+
+        params = mock_fetch.call_args.args[0]
+        assert [p["year"] for p in params] == [2020, 2021]
+        assert all(p["month"] == 4 for p in params)
+        assert all("dayflag" not in p and "citycode" not in p for p in params)
+        assert mock_fetch.call_args.kwargs["memory_cache"] is False
+        assert od.origins().loc[0, "population"] == 120
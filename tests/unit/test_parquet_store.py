@@ -0,0 +1,198 @@
+"""Unit tests for app/common/parquet_store.py"""
+
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+# Patch st.cache_data / st.cache_resource before importing to bypass caching in tests
+with (
+    patch("streamlit.cache_data", lambda **kwargs: lambda func: func),
+    patch("streamlit.cache_resource", lambda **kwargs: lambda func: func),
+):
+    from app.common import parquet_store
+    from app.common.parquet_store import (
+        build_partitions,
+        parse_blob_path,
+        partition_path,
+        prepare,
+        read,
+    )
+    from app.common.utils import _load_csv
+
+PATH = "mdp/13/2021/04/monthly_mdp_mesh1km.csv.zip"
+
+
+def _raw(year: int, population: list[float]) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "mesh1kmid": np.array([53394612, 53394611, 53394611], dtype="int32"),
+            "prefcode": np.array([13, 13, 13], dtype="int8"),
+            "citycode": np.array([13101, 13101, 13101], dtype="int32"),
+            "year": np.array([year] * 3, dtype="int16"),
+            "month": np.array([4, 4, 4], dtype="int8"),
+            "dayflag": np.array([0, 1, 0], dtype="int8"),
+            "timezone": np.array([0, 0, 0], dtype="int8"),
+            "population": np.array(population, dtype="float32"),
+        }
+    )
+
+
+def _load(f, pcode, year, month):
+    return _raw(
+        year, {2019: [1.0, 2, 0], 2020: [10.0, 20, 0], 2021: [30.0, 10, 5]}[year]
+    )
+
+
+class TestParseBlobPath:
+    """Test parse_blob_path function"""
+
+    @pytest.mark.unit
+    def test_monthly_path(self):
+        """Test that monthly paths map to their partition"""
+        assert parse_blob_path(PATH) == ("mdp", 13, 2021, 4)
+        assert parse_blob_path("/fromto/01/2019/12/monthly_fromto_city.csv.zip") == (
+            "fromto",
+            1,
+            2019,
+            12,
+        )
+
+    @pytest.mark.unit
+    def test_other_paths(self):
+        """Test that attribute files are not in the store"""
+        assert parse_blob_path("attribute/attribute_mesh1km_2020.csv.zip") is None
+
+
+class TestPrepare:
+    """Test prepare function"""
+
+    @pytest.mark.unit
+    def test_sorted_with_yoy(self):
+        """Test that rows are sorted by key and get the previous year"""
+        df = prepare(_raw(2020, [10.0, 20, 0]), "mdp", _raw(2019, [1.0, 4, 0]))
+
+        assert "prefcode" not in df.columns
+        assert df["dayflag"].tolist() == [0, 0, 1]
+        assert df["mesh1kmid"].tolist() == [53394611, 53394612, 53394611]
+        assert df["population_prev"].tolist() == [0, 1, 4]
+        assert np.isnan(df["diff"].iloc[0])  # 前年が 0
+        assert df["diff"].iloc[1] == pytest.approx(9.0)
+        assert df["diff"].iloc[2] == pytest.approx(4.0)
+
+    @pytest.mark.unit
+    def test_without_previous_year(self):
+        """Test that the first year has no growth rate"""
+        df = prepare(_raw(2019, [1.0, 2, 3]), "mdp")
+
+        assert df["population_prev"].isna().all()
+        assert df["diff"].isna().all()
+
+
+class TestBuildPartitions:
+    """Test build_partitions function"""
+
+    @pytest.mark.unit
+    def test_build_and_resume(self, tmp_path):
+        """Test that partitions are written once and kept on the next run"""
+        calls = []
+
+        def load(*args):
+            calls.append(args)
+            return _load(*args)
+
+        assert build_partitions(tmp_path, "mdp", 13, 4, load=load) == 3
+        assert len(calls) == 3
+
+        file = partition_path(tmp_path, "mdp", 13, 2021, 4)
+        assert file.parent.name == "month=04"
+        assert pq.ParquetFile(file).metadata.num_rows == 3
+
+        # 作成済みなら読み込みもしない
+        assert build_partitions(tmp_path, "mdp", 13, 4, load=load) == 0
+        assert len(calls) == 3
+
+        # 欠けた年だけ（前年と一緒に）作り直す
+        file.unlink()
+        assert build_partitions(tmp_path, "mdp", 13, 4, load=load) == 1
+        assert [c[2] for c in calls[3:]] == [2020, 2021]
+
+    @pytest.mark.unit
+    def test_failed_load_writes_nothing(self, tmp_path):
+        """Test that a failed download leaves no partial partition"""
+
+        def load(f, pcode, year, month):
+            if year == 2021:
+                raise OSError("network")
+            return _load(f, pcode, year, month)
+
+        with pytest.raises(OSError):
+            build_partitions(tmp_path, "mdp", 13, 4, load=load)
+
+        assert not list(tmp_path.rglob("*.parquet"))
+        assert not list(tmp_path.rglob("*.tmp"))
+
+
+class TestRead:
+    """Test read function"""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        build_partitions(tmp_path, "mdp", 13, 4, load=_load)
+        return tmp_path
+
+    @pytest.mark.unit
+    def test_not_configured(self, store):
+        """Test that nothing is read without a store directory"""
+        assert read(PATH) is None
+        assert read("mdp/14/2021/04/x.csv.zip", root=store) is None
+
+    @pytest.mark.unit
+    def test_columns_and_filters(self, store):
+        """Test projection, row filters and partition columns"""
+        df = read(
+            PATH,
+            columns=["mesh1kmid", "population", "diff", "year"],
+            filters={"dayflag": [0]},
+            root=store,
+        )
+
+        assert df.columns.tolist() == ["mesh1kmid", "population", "diff", "year"]
+        assert df["mesh1kmid"].tolist() == [53394611, 53394612]
+        assert df["population"].tolist() == [5, 30]
+        assert df["year"].dtype == np.int16
+        assert (df["year"] == 2021).all()
+
+    @pytest.mark.unit
+    def test_filter_on_partition_column(self, store):
+        """Test that filters on the path values are applied"""
+        assert len(read(PATH, filters={"prefcode": [13]}, root=store)) == 3
+        assert len(read(PATH, filters={"prefcode": [14]}, root=store)) == 0
+
+    @pytest.mark.unit
+    def test_all_columns(self, store):
+        """Test that all columns come back like the CSV (plus the YoY columns)"""
+        df = read(PATH, root=store)
+
+        assert df.columns[:3].tolist() == ["prefcode", "year", "month"]
+        assert {"mesh1kmid", "citycode", "population_prev", "diff"} <= set(df.columns)
+
+    @pytest.mark.unit
+    def test_missing_columns(self, store):
+        """Test that unknown columns are reported like with the CSV"""
+        with pytest.raises(ValueError, match="not found"):
+            read(PATH, columns=["nope"], root=store)
+
+    @pytest.mark.unit
+    def test_load_csv_reads_store(self, store, monkeypatch):
+        """Test that _load_csv reads the store before blob storage"""
+        monkeypatch.setenv("MLIT_STORE_DIR", str(store))
+
+        with patch("app.common.blob.BLOB_CLIENT.get") as mock_get:
+            df = _load_csv(PATH, columns=["mesh1kmid", "population"])
+
+        mock_get.assert_not_called()
+        assert len(df) == 3
+        assert parquet_store.store_dir() == store
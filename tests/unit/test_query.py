@@ -0,0 +1,157 @@
+"""Unit tests for app/common/query.py"""
+
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+# Patch st.cache_data / st.cache_resource before importing to bypass caching in tests
+with (
+    patch("streamlit.cache_data", lambda **kwargs: lambda func: func),
+    patch("streamlit.cache_resource", lambda **kwargs: lambda func: func),
+):
+    from app.common.compare import compare_years
+    from app.common import parquet_store
+    from app.common.parquet_store import (
+        build_partitions,
+        partition_path,
+        write_partition,
+    )
+    from app.common.query import Scan, comparison
+
+
+def _raw(year: int) -> pd.DataFrame:
+    rng = np.random.default_rng(year)
+    n = 200
+    ids = rng.choice(np.arange(53394600, 53394700), n)
+    df = pd.DataFrame(
+        {
+            "mesh1kmid": ids.astype("int32"),
+            "prefcode": np.full(n, 13, dtype="int8"),
+            "citycode": rng.choice([13101, 13102], n).astype("int32"),
+            "year": np.full(n, year, dtype="int16"),
+            "month": np.full(n, 4, dtype="int8"),
+            "dayflag": rng.choice([0, 1, 2], n).astype("int8"),
+            "timezone": rng.choice([0, 1, 2], n).astype("int8"),
+            "population": rng.choice([0, 5, 10, 50, 100.5], n).astype("float32"),
+        }
+    )
+    # 1 つのメッシュは平休日・時間帯ごとに 1 行
+    return df.drop_duplicates(["mesh1kmid", "dayflag", "timezone"], ignore_index=True)
+
+
+@pytest.fixture
+def store(tmp_path):
+    build_partitions(tmp_path, "mdp", 13, 4, load=lambda f, p, y, m: _raw(y))
+    return tmp_path
+
+
+def _filtered(year, dayflag, timezone, citycode):
+    df = _raw(year)
+    df = df[(df["dayflag"] == dayflag) & (df["timezone"] == timezone)]
+    if citycode:
+        df = df[df["citycode"].isin(citycode)]
+    return df[["mesh1kmid", "population"]].reset_index(drop=True)
+
+
+class TestScan:
+    """Test Scan class"""
+
+    @pytest.mark.unit
+    def test_lazy_conditions(self, store):
+        """Test that conditions and columns are only applied when run"""
+        scan = Scan("mdp", store).where(year=2021, dayflag=0, citycode=[])
+        selected = scan.select("mesh1kmid", "dayflag")
+
+        assert scan.conditions == (("year", 2021), ("dayflag", 0))
+        assert selected.columns == ("mesh1kmid", "dayflag")
+
+        table = selected.to_table()
+        assert table.column_names == ["mesh1kmid", "dayflag"]
+        assert set(table["dayflag"].to_pylist()) == {0}
+        expected = _raw(2021)
+        assert table.num_rows == (expected["dayflag"] == 0).sum()
+
+    @pytest.mark.unit
+    def test_list_condition(self, store):
+        """Test that a list keeps the rows in it"""
+        table = Scan("mdp", store).where(year=2020, timezone=[1, 2]).to_table()
+
+        assert set(table["timezone"].to_pylist()) == {1, 2}
+
+    @pytest.mark.unit
+    def test_row_groups_skip_flags(self, tmp_path, monkeypatch):
+        """Test that row-group statistics separate dayflag / timezone"""
+        monkeypatch.setattr(parquet_store, "ROW_GROUP_ROWS", 16)
+        build_partitions(tmp_path, "mdp", 13, 4, load=lambda f, p, y, m: _raw(y))
+        metadata = pq.ParquetFile(partition_path(tmp_path, "mdp", 13, 2021, 4)).metadata
+        names = metadata.schema.names
+
+        def bounds(name):
+            column = names.index(name)
+            return [
+                (g.column(column).statistics.min, g.column(column).statistics.max)
+                for g in (metadata.row_group(i) for i in range(metadata.num_row_groups))
+            ]
+
+        dayflag = bounds("dayflag")
+        # 1 つの平休日を読むときは、他の平休日だけの行グループを読まない
+        assert dayflag == sorted(dayflag)
+        assert sum(lo <= 1 <= hi for lo, hi in dayflag) < len(dayflag) / 2
+        assert any(lo == hi for lo, hi in bounds("timezone"))
+
+    @pytest.mark.unit
+    def test_no_store(self):
+        """Test that a scan without a store gives None"""
+        assert Scan("mdp").to_table() is None
+
+
+class TestComparison:
+    """Test comparison function"""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize(
+        "dayflag, timezone, citycode",
+        [(0, 0, None), (1, 2, [13101]), (2, 1, [13101, 13102])],
+    )
+    def test_matches_pandas_pipeline(self, store, dayflag, timezone, citycode):
+        """Test that the query gives the same frame as compare_years"""
+        expected = compare_years(
+            _filtered(2020, dayflag, timezone, citycode),
+            _filtered(2021, dayflag, timezone, citycode),
+        )
+        # 分割ファイルは平休日・時間帯ごとにメッシュ ID 順に並んでいる
+        expected = expected.sort_values("mesh1kmid", ignore_index=True)
+
+        result = comparison(13, 4, dayflag, timezone, citycode, root=store)
+
+        pd.testing.assert_frame_equal(result, expected)
+
+    @pytest.mark.unit
+    def test_keeps_base_order(self, store):
+        """Test that rows come in the order of the base year, not by mesh id"""
+        file = partition_path(store, "mdp", 13, 2020, 4)
+        base = pd.read_parquet(file).iloc[::-1].reset_index(drop=True)
+        write_partition(base, file)
+        base = base[(base["dayflag"] == 1) & (base["timezone"] == 0)]
+
+        result = comparison(13, 4, 1, 0, root=store)
+
+        assert result["mesh1kmid"].tolist() == base["mesh1kmid"].tolist()
+
+    @pytest.mark.unit
+    def test_no_flag_selected(self, store):
+        """Test that no dayflag / timezone compares 全日・終日 only"""
+        result = comparison(13, 4, None, None, root=store)
+
+        pd.testing.assert_frame_equal(result, comparison(13, 4, 2, 2, root=store))
+        assert result["mesh1kmid"].is_unique
+
+    @pytest.mark.unit
+    def test_missing_partition(self, store):
+        """Test that the pandas path is used when a year is not in the store"""
+        assert comparison(13, 5, 0, 0, root=store) is None
+        assert comparison(13, 4, 0, 0, years=(2021, 2022), root=store) is None
+        assert comparison(13, 4, 0, 0) is None
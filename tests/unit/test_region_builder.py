@@ -1,8 +1,13 @@
 """Unit tests for app/common/region_builder.py"""
 
+import pandas as pd
 import pytest
 
-from app.common.region_builder import prefcode_to_name
+from app.common.region_builder import (
+    RegionRegistry,
+    get_region_registry,
+    prefcode_to_name,
+)
 
 
 class TestPrefcodeToName:
@@ -79,3 +84,76 @@ class TestPrefcodeToName:
         # There should be 47 prefectures in Japan
         # and many more cities
         assert len(city_dict) > len(pref_dict)
+
+
+class TestRegionRegistry:
+    """Test RegionRegistry class"""
+
+    @pytest.fixture
+    def registry(self):
+        df_pref = pd.DataFrame(
+            {
+                "prefcode": [1, 13, 14],
+                "prefname": ["北海道", "東京都", "神奈川県"],
+                "regioncode": [1, 3, 3],
+                "regionname": ["北海道", "関東", "関東"],
+            }
+        )
+        df_city = pd.DataFrame(
+            {
+                "prefcode": [1, 1, 13, 34],
+                "prefname": ["北海道", "北海道", "東京都", "広島県"],
+                "citycode": [1101, 1233, 13206, 34208],
+                "cityname": ["札幌市中央区", "伊達市", "府中市", "府中市"],
+            }
+        )
+        df_hokkaido = pd.DataFrame(
+            {
+                "prefcode": [1, 1],
+                "prefname": ["北海道", "北海道"],
+                "cityname": ["札幌市中央区", "伊達市"],
+                "regionname": ["石狩振興局", "胆振総合振興局"],
+            }
+        )
+        return RegionRegistry.from_frames(df_pref, df_city, df_hokkaido)
+
+    @pytest.mark.unit
+    def test_lookups(self, registry):
+        """Test region, prefecture and city lookups"""
+        assert registry.regions == {"北海道": [1], "関東": [13, 14]}
+        assert registry.prefectures[13] == "東京都"
+        assert registry.prefcodes["神奈川県"] == 14
+        assert registry.prefectures[34] == "広島県"  # 市区町村マスタのみ
+        assert registry.city_names[34208] == "府中市"
+        assert registry.hokkaido["胆振総合振興局"] == ["伊達市"]
+
+    @pytest.mark.unit
+    def test_same_city_name_in_two_prefectures(self, registry):
+        """Test that city names are resolved within their prefecture"""
+        assert registry.cities[13]["府中市"] == 13206
+        assert registry.cities[34]["府中市"] == 34208
+
+    @pytest.mark.unit
+    def test_city_labels_with_same_name(self, registry):
+        """Test that cities sharing a name decode to the same category"""
+        labels = registry.city_labels.decode(pd.Series([13206, 34208]))
+
+        assert labels.tolist() == ["府中市", "府中市"]
+        assert registry.prefecture_labels.decode(pd.Series([13])).tolist() == ["東京都"]
+        assert registry.city_labels is registry.city_labels
+
+    @pytest.mark.unit
+    def test_shared_registry(self):
+        """Test that the masters are loaded once and match prefcode_to_name"""
+        registry = get_region_registry()
+
+        assert get_region_registry() is registry
+        pref_dict, city_dict = prefcode_to_name()
+        assert pref_dict is registry.prefectures
+        assert city_dict is registry.city_names
+        assert len(registry.prefectures) == 47
+        assert all(
+            name in registry.cities[1]
+            for names in registry.hokkaido.values()
+            for name in names
+        )
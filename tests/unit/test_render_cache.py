@@ -0,0 +1,84 @@
+"""Unit tests for app/common/render_cache.py"""
+
+from unittest.mock import patch
+
+import pytest
+
+# Patch st.cache_data / st.cache_resource before importing to bypass caching in tests
+with (
+    patch("streamlit.cache_data", lambda **kwargs: lambda func: func),
+    patch("streamlit.cache_resource", lambda **kwargs: lambda func: func),
+):
+    from app.common.render_cache import RenderCache, RenderedMap, get_render_cache
+
+
+def _page(size: int) -> RenderedMap:
+    return RenderedMap("x" * size, {"records": size})
+
+
+class TestRenderCache:
+    """Test RenderCache class"""
+
+    @pytest.mark.unit
+    def test_hit_and_miss(self):
+        """Test that stored pages are returned and counted"""
+        cache = RenderCache(max_bytes=10_000)
+        page = _page(100)
+
+        assert cache.get("a") is None
+        assert cache.put("a", page) is page
+        assert cache.get("a") is page
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    @pytest.mark.unit
+    def test_byte_accounting_and_lru(self):
+        """Test that the least recently used pages are evicted by size"""
+        size = _page(400).nbytes
+        cache = RenderCache(max_bytes=size * 2)
+        cache.put("a", _page(400))
+        cache.put("b", _page(400))
+        cache.get("a")  # b が最も古くなる
+        cache.put("c", _page(400))
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+        assert cache.nbytes == size * 2
+
+    @pytest.mark.unit
+    def test_replace_and_oversized(self):
+        """Test that replacing keeps the count right and huge pages are skipped"""
+        cache = RenderCache(max_bytes=1000)
+        cache.put("a", _page(100))
+        cache.put("a", _page(200))
+
+        assert len(cache) == 1
+        assert cache.nbytes == _page(200).nbytes
+
+        cache.put("a", _page(5000))
+        assert len(cache) == 0
+        assert cache.nbytes == 0
+
+    @pytest.mark.unit
+    def test_multibyte_size(self):
+        """Test that the size is counted in UTF-8 bytes"""
+        assert RenderedMap("滞在", {}).nbytes == 6 + 2
+
+
+class TestGetRenderCache:
+    """Test get_render_cache function"""
+
+    @pytest.mark.unit
+    def test_disabled(self, monkeypatch):
+        """Test that a size of 0 disables the cache"""
+        monkeypatch.setenv("MLIT_RENDER_CACHE_MB", "0")
+
+        assert get_render_cache() is None
+
+    @pytest.mark.unit
+    def test_size_from_env(self, monkeypatch):
+        """Test that the limit comes from the environment"""
+        monkeypatch.setenv("MLIT_RENDER_CACHE_MB", "1.5")
+
+        assert get_render_cache().max_bytes == int(1.5 * 2**20)
@@ -0,0 +1,228 @@
+"""Unit tests for app/common/schema.py"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.common.schema import (
+    DAYFLAG,
+    DAYFLAG_LABELS,
+    FROM_AREA,
+    Labels,
+    SchemaError,
+    conform,
+    csv_dtypes,
+    flags_or_all,
+)
+
+
+@pytest.fixture
+def df_raw():
+    """fromto rows as `pd.read_csv` infers them"""
+    return pd.DataFrame(
+        {
+            "prefcode": [13, 13],
+            "citycode": [13101, 13102],
+            "year": [2021, 2021],
+            "month": [4, 4],
+            "dayflag": [0, 2],
+            "timezone": [1, 2],
+            "from_area": [0, 3],
+            "population": [10.0, 20.5],
+        }
+    )
+
+
+class TestFlagsOrAll:
+    """Test flags_or_all function"""
+
+    @pytest.mark.unit
+    def test_no_selection(self):
+        """Test that no selection gives 全日・終日"""
+        assert flags_or_all(None, None) == (2, 2)
+        assert flags_or_all(0, None) == (0, 2)
+        assert flags_or_all(None, 1) == (2, 1)
+
+    @pytest.mark.unit
+    def test_selection_is_kept(self):
+        """Test that selected values are returned as they are"""
+        assert flags_or_all(1, 0) == (1, 0)
+
+
+class TestCsvDtypes:
+    """Test csv_dtypes function"""
+
+    @pytest.mark.unit
+    def test_only_floats(self):
+        """Test that integers and categories are left to conform"""
+        assert csv_dtypes("mdp") == {"population": "float32"}
+        assert set(csv_dtypes("mesh1km")) == {
+            "lon_min",
+            "lat_min",
+            "lon_max",
+            "lat_max",
+            "lon_center",
+            "lat_center",
+        }
+
+    @pytest.mark.unit
+    def test_unknown_dataset(self):
+        """Test None for datasets without a schema"""
+        assert csv_dtypes("other") is None
+        assert csv_dtypes(None) is None
+
+
+class TestConform:
+    """Test conform function"""
+
+    @pytest.mark.unit
+    def test_declared_dtypes(self, df_raw):
+        """Test that every column gets its compact dtype"""
+        result = conform(df_raw, "fromto")
+
+        assert result["prefcode"].dtype == np.int8
+        assert result["citycode"].dtype == np.int32
+        assert result["year"].dtype == np.int16
+        assert result["month"].dtype == np.int8
+        assert result["dayflag"].dtype == DAYFLAG
+        assert result["from_area"].dtype == FROM_AREA
+        assert result["from_area"].cat.codes.dtype == np.int8
+        assert result["population"].dtype == np.float32
+        assert result["dayflag"].tolist() == [0, 2]
+        assert result["population"].tolist() == [10.0, 20.5]
+
+    @pytest.mark.unit
+    def test_smaller_in_memory(self, df_raw):
+        """Test that the converted table uses at most half the memory"""
+        df = pd.concat([df_raw] * 1000, ignore_index=True)
+
+        before = df.memory_usage(index=False, deep=True).sum()
+        after = conform(df, "fromto").memory_usage(index=False, deep=True).sum()
+
+        assert after * 2 <= before
+
+    @pytest.mark.unit
+    def test_input_is_unchanged(self, df_raw):
+        """Test that the input frame keeps its dtypes"""
+        conform(df_raw, "fromto")
+
+        assert df_raw["dayflag"].dtype == np.int64
+
+    @pytest.mark.unit
+    def test_subset_and_extra_columns(self):
+        """Test that missing columns are skipped and undeclared ones kept"""
+        df = pd.DataFrame({"mesh1kmid": [53394611], "diff": [0.5]})
+
+        result = conform(df, "mdp")
+
+        assert list(result.columns) == ["mesh1kmid", "diff"]
+        assert result["mesh1kmid"].dtype == np.int32
+        assert result["diff"].dtype == np.float64
+
+    @pytest.mark.unit
+    def test_already_conforming(self, df_raw):
+        """Test that a conforming frame is returned as it is"""
+        converted = conform(df_raw, "fromto")
+
+        assert conform(converted, "fromto") is converted
+
+    @pytest.mark.unit
+    def test_unknown_category(self, df_raw):
+        """Test SchemaError for values outside the categories"""
+        df_raw.loc[0, "from_area"] = 9
+
+        with pytest.raises(SchemaError, match="from_area"):
+            conform(df_raw, "fromto")
+
+    @pytest.mark.unit
+    def test_out_of_range(self, df_raw):
+        """Test SchemaError instead of silent overflow"""
+        df_raw.loc[0, "month"] = 300
+
+        with pytest.raises(SchemaError, match="month"):
+            conform(df_raw, "fromto")
+
+    @pytest.mark.unit
+    def test_missing_values(self, df_raw):
+        """Test SchemaError for missing integers"""
+        df_raw["citycode"] = [13101, np.nan]
+
+        with pytest.raises(SchemaError, match="citycode"):
+            conform(df_raw, "fromto")
+
+    @pytest.mark.unit
+    def test_schema_error_is_value_error(self):
+        """Test that callers handling ValueError also handle SchemaError"""
+        assert issubclass(SchemaError, ValueError)
+
+    @pytest.mark.unit
+    def test_empty_frame(self):
+        """Test that an empty result gets the declared dtypes"""
+        result = conform(pd.DataFrame(columns=["mesh1kmid", "dayflag"]), "mdp")
+
+        assert result["mesh1kmid"].dtype == np.int32
+        assert result["dayflag"].dtype == DAYFLAG
+
+    @pytest.mark.unit
+    def test_unknown_dataset(self, df_raw):
+        """Test that tables without a schema are returned unchanged"""
+        assert conform(df_raw, None) is df_raw
+        assert conform(df_raw, "other") is df_raw
+
+
+class TestLabels:
+    """Test Labels class"""
+
+    @pytest.mark.unit
+    def test_decode_plain_codes(self):
+        """Test names of plain integer codes"""
+        labels = Labels.from_mapping({1: "平日", 0: "休日"})
+
+        result = labels.decode(pd.Series([1, 0, 1], index=[5, 6, 7], name="dayflag"))
+
+        assert result.tolist() == ["平日", "休日", "平日"]
+        assert result.index.tolist() == [5, 6, 7]
+        assert result.name == "dayflag"
+        assert isinstance(result.dtype, pd.CategoricalDtype)
+
+    @pytest.mark.unit
+    def test_decode_categorical(self):
+        """Test that categorical codes are decoded through their categories"""
+        codes = pd.Series([2, 0, 2], dtype="int8").astype(DAYFLAG)
+
+        result = DAYFLAG_LABELS.decode(codes)
+
+        assert result.tolist() == ["全日", "休日", "全日"]
+        assert result.cat.codes.tolist() == codes.cat.codes.tolist()
+
+    @pytest.mark.unit
+    def test_matches_map(self):
+        """Test the same result as Series.map with the dict"""
+        labels = {13101: "千代田区", 13102: "中央区"}
+        codes = pd.Series([13102, 13101, 13199, 13102])
+
+        result = Labels.from_mapping(labels).decode(codes)
+
+        pd.testing.assert_series_equal(
+            result.astype(object), codes.map(labels), check_dtype=False
+        )
+
+    @pytest.mark.unit
+    def test_shared_names(self):
+        """Test that codes with the same name share one category"""
+        labels = Labels.from_mapping(
+            {13206: "府中市", 34208: "府中市", 13101: "千代田区"}
+        )
+
+        result = labels.decode(pd.Series([13206, 34208]))
+
+        assert list(labels.dtype.categories) == ["千代田区", "府中市"]
+        assert result.tolist() == ["府中市", "府中市"]
+
+    @pytest.mark.unit
+    def test_unknown_and_missing_codes(self):
+        """Test NaN for codes without a name"""
+        result = DAYFLAG_LABELS.decode(pd.Series([0, 9, np.nan, -1]))
+
+        assert result.iloc[0] == "休日"
+        assert result.iloc[1:].isna().all()
@@ -0,0 +1,195 @@
+"""Unit tests for app/common/timeseries.py"""
+
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Patch st.cache_data / st.cache_resource before importing to bypass caching in tests
+with (
+    patch("streamlit.cache_data", lambda **kwargs: lambda func: func),
+    patch("streamlit.cache_resource", lambda **kwargs: lambda func: func),
+):
+    from app.common.timeseries import METRICS, MeshCube, load_cube, month_range
+
+
+def _frame(ids, population):
+    return pd.DataFrame({"mesh1kmid": ids, "population": population})
+
+
+@pytest.fixture
+def cube():
+    # 2019-01 から 2020-03 までの 15 か月、2 セル（2 番目は 2019-02 が欠け）
+    periods = month_range((2019, 1), (2020, 3))
+    frames = {}
+    for k, period in enumerate(periods):
+        if period == (2019, 2):
+            frames[period] = _frame([53394611], [100.0 + k])
+        else:
+            frames[period] = _frame([53394612, 53394611], [10.0 * (k + 1), 100.0 + k])
+    return MeshCube.from_frames(frames)
+
+
+class TestMonthRange:
+    """Test month_range function"""
+
+    @pytest.mark.unit
+    def test_across_years(self):
+        """Test consecutive months across a year boundary"""
+        assert month_range((2019, 11), (2020, 2)) == [
+            (2019, 11),
+            (2019, 12),
+            (2020, 1),
+            (2020, 2),
+        ]
+
+    @pytest.mark.unit
+    def test_full_range(self):
+        """Test the number of months in the data"""
+        assert len(month_range((2019, 1), (2021, 12))) == 36
+
+
+class TestMeshCube:
+    """Test MeshCube class"""
+
+    @pytest.mark.unit
+    def test_from_frames(self, cube):
+        """Test that frames are stacked into (mesh x month)"""
+        assert cube.ids.tolist() == [53394611, 53394612]
+        assert cube.values.shape == (2, 15)
+        assert cube.values[0, :3].tolist() == [100, 101, 102]
+        assert np.isnan(cube.values[1, 1])
+        assert not cube.values.flags.writeable
+
+    @pytest.mark.unit
+    def test_duplicate_rows_are_summed(self):
+        """Test that rows of the same cell in a month are summed"""
+        cube = MeshCube.from_frames({(2020, 1): _frame([1, 1, 2], [1.0, 2, 3])})
+
+        assert cube.values[:, 0].tolist() == [3, 3]
+
+    @pytest.mark.unit
+    def test_periods_must_be_consecutive(self):
+        """Test that a gap in the months is rejected"""
+        with pytest.raises(ValueError, match="consecutive"):
+            MeshCube.from_frames(
+                {(2020, 1): _frame([1], [1.0]), (2020, 3): _frame([1], [1.0])}
+            )
+
+    @pytest.mark.unit
+    def test_yoy(self, cube):
+        """Test the growth rate against the same month a year earlier"""
+        yoy = cube.metric("yoy")
+
+        assert np.isnan(yoy[:, :12]).all()
+        assert yoy[0, 12] == pytest.approx(112 / 100 - 1)
+        assert yoy[1, 13] != yoy[1, 13]  # 2019-02 がないので NaN
+        assert yoy[1, 14] == pytest.approx(150 / 30 - 1)
+
+    @pytest.mark.unit
+    def test_mom(self, cube):
+        """Test the growth rate against the previous month"""
+        mom = cube.metric("mom")
+
+        assert np.isnan(mom[:, 0]).all()
+        assert mom[0, 1] == pytest.approx(101 / 100 - 1)
+        assert np.isnan(mom[1, 2])
+
+    @pytest.mark.unit
+    def test_baseline(self, cube):
+        """Test the ratio to the same month of 2019"""
+        baseline = cube.metric("baseline")
+
+        assert baseline[0, 0] == 0
+        assert baseline[0, 14] == pytest.approx(114 / 102 - 1)
+        assert baseline[1, 14] == pytest.approx(150 / 30 - 1)
+
+    @pytest.mark.unit
+    def test_rolling(self, cube):
+        """Test the 3-month rolling mean, NaN when a month is missing"""
+        rolling = cube.metric("rolling")
+        expected = pd.DataFrame(cube.values.T).rolling(3).mean().to_numpy().T
+
+        np.testing.assert_allclose(rolling, expected, equal_nan=True)
+        assert rolling[0, 2] == pytest.approx(101)
+
+    @pytest.mark.unit
+    def test_metric_is_computed_once(self, cube):
+        """Test that metrics are cached for later lookups"""
+        assert cube.metric("yoy") is cube.metric("yoy")
+        with pytest.raises(ValueError, match="unknown"):
+            cube.metric("nope")
+
+    @pytest.mark.unit
+    def test_nbytes(self, cube):
+        """Test that computed metrics are counted in the size"""
+        before = cube.nbytes
+        cube.metric("yoy")
+
+        assert before == cube.ids.nbytes + cube.values.nbytes
+        assert cube.nbytes == before + cube.metric("yoy").nbytes
+
+    @pytest.mark.unit
+    def test_compute_metrics(self, cube):
+        """Test that all metrics can be computed before the cube is shared"""
+        assert cube.compute_metrics() is cube
+
+        size = cube.nbytes
+        for name in METRICS:
+            cube.metric(name)
+        assert cube.nbytes == size
+
+    @pytest.mark.unit
+    def test_frame(self, cube):
+        """Test the lookup of one month"""
+        df = cube.frame((2019, 2), ["mom"])
+
+        assert df["mesh1kmid"].tolist() == [53394611]
+        assert df["population"].tolist() == [101]
+        assert df["mom"].iloc[0] == pytest.approx(0.01)
+
+    @pytest.mark.unit
+    def test_totals(self, cube):
+        """Test the total population per month"""
+        totals = cube.totals()
+
+        assert totals.index[0] == "2019-01"
+        assert totals.iloc[0] == 110
+        assert totals.iloc[1] == 101
+
+
+class TestLoadCube:
+    """Test load_cube function"""
+
+    @pytest.mark.unit
+    @patch("app.common.timeseries.fetch_data_batch")
+    def test_fetches_each_month(self, mock_fetch):
+        """Test that every month is requested in one batch"""
+        mock_fetch.side_effect = lambda params, **kwargs: [
+            _frame([1], [float(p["month"])]) for p in params
+        ]
+
+        cube = load_cube(month_range((2020, 12), (2021, 1)), dayflag=0, timezone=1)
+
+        params = mock_fetch.call_args.args[0]
+        assert [(p["year"], p["month"]) for p in params] == [(2020, 12), (2021, 1)]
+        assert params[0]["dayflag"] == 0
+        assert mock_fetch.call_args.kwargs["memory_cache"] is False
+        assert cube.nbytes == cube.ids.nbytes + cube.values.nbytes + sum(
+            cube.metric(name).nbytes for name in METRICS
+        )
+        assert cube.values.tolist() == [[12, 1]]
+
+    @pytest.mark.unit
+    @patch("app.common.timeseries.fetch_data_batch")
+    def test_no_flag_selected(self, mock_fetch):
+        """Test that no dayflag / timezone loads 全日・終日 only"""
+        mock_fetch.side_effect = lambda params, **kwargs: [
+            _frame([1], [1.0]) for _ in params
+        ]
+
+        load_cube(month_range((2021, 1), (2021, 2)))
+
+        params = mock_fetch.call_args.args[0]
+        assert all(p["dayflag"] == 2 and p["timezone"] == 2 for p in params)
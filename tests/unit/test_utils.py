@@ -1,6 +1,8 @@
 """Unit tests for app/common/utils.py"""
 
+import threading
 import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from io import BytesIO
 from unittest.mock import Mock, patch
 
@@ -11,7 +13,16 @@ from shapely.geometry import Polygon
 
 # Patch st.cache_data before importing utils to bypass caching in tests
 with patch('streamlit.cache_data', lambda **kwargs: lambda func: func):
-    from app.common.utils import _unzip_csv, lonlat_to_polygon, make_polygons, merge_df
+    from app.common.disk_cache import get_disk_cache
+    from app.common.parquet_store import partition_path, write_partition
+    from app.common.utils import (
+        _unzip_csv,
+        data_version,
+        fetch_data_batch,
+        lonlat_to_polygon,
+        make_polygons,
+        merge_df,
+    )
 
 
 class TestUnzipCsv:
@@ -19,7 +30,7 @@ class TestUnzipCsv:
 
     @pytest.mark.unit
     @patch("app.common.utils.st.secrets")
-    @patch("app.common.utils.requests.get")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
     def test_successful_fetch_and_unzip(self, mock_get, mock_secrets):
         """Test successful fetching and unzipping of CSV data"""
         # Setup mock secrets
@@ -57,7 +68,7 @@ class TestUnzipCsv:
 
     @pytest.mark.unit
     @patch("app.common.utils.st.secrets")
-    @patch("app.common.utils.requests.get")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
     def test_url_construction_with_leading_slash(self, mock_get, mock_secrets):
         """Test URL construction when path has leading slash"""
         mock_secrets.blob.url = "https://example.com/data/"
@@ -84,7 +95,7 @@ class TestUnzipCsv:
 
     @pytest.mark.unit
     @patch("app.common.utils.st.secrets")
-    @patch("app.common.utils.requests.get")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
     def test_http_request_failure(self, mock_get, mock_secrets):
         """Test handling of HTTP request failures"""
         mock_secrets.blob.url = "https://example.com/data"
@@ -99,7 +110,7 @@ class TestUnzipCsv:
 
     @pytest.mark.unit
     @patch("app.common.utils.st.secrets")
-    @patch("app.common.utils.requests.get")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
     def test_http_status_error(self, mock_get, mock_secrets):
         """Test handling of HTTP status errors"""
         mock_secrets.blob.url = "https://example.com/data"
@@ -116,7 +127,7 @@ class TestUnzipCsv:
 
     @pytest.mark.unit
     @patch("app.common.utils.st.secrets")
-    @patch("app.common.utils.requests.get")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
     def test_invalid_zip_file(self, mock_get, mock_secrets):
         """Test handling of invalid ZIP file content"""
         mock_secrets.blob.url = "https://example.com/data"
@@ -134,7 +145,7 @@ class TestUnzipCsv:
 
     @pytest.mark.unit
     @patch("app.common.utils.st.secrets")
-    @patch("app.common.utils.requests.get")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
     def test_no_csv_in_zip(self, mock_get, mock_secrets):
         """Test handling of ZIP file with no CSV files"""
         mock_secrets.blob.url = "https://example.com/data"
@@ -158,7 +169,7 @@ class TestUnzipCsv:
 
     @pytest.mark.unit
     @patch("app.common.utils.st.secrets")
-    @patch("app.common.utils.requests.get")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
     def test_timeout_parameter(self, mock_get, mock_secrets):
         """Test that timeout parameter is passed correctly"""
         mock_secrets.blob.url = "https://example.com/data"
@@ -183,7 +194,7 @@ class TestUnzipCsv:
 
     @pytest.mark.unit
     @patch("app.common.utils.st.secrets")
-    @patch("app.common.utils.requests.get")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
     def test_multiple_csv_files_returns_first(self, mock_get, mock_secrets):
         """Test that when ZIP contains multiple CSV files, the first one is returned"""
         mock_secrets.blob.url = "https://example.com/data"
@@ -208,6 +219,336 @@ class TestUnzipCsv:
         assert result["id"].iloc[0] == 1
         assert result["value"].iloc[0] == 100
 
+    @pytest.mark.unit
+    @patch("app.common.utils.st.secrets")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
+    def test_disk_cache_revalidation(self, mock_get, mock_secrets, monkeypatch):
+        """Test that a cached table is revalidated with a conditional GET"""
+        mock_secrets.blob.url = "https://example.com/data"
+        mock_secrets.blob.token = "?token=abc123"
+        monkeypatch.setenv("MLIT_CACHE_MAX_AGE", "0")
+
+        zip_buffer = BytesIO()
+        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("test.csv", "id,value\n1,100\n")
+
+        first = Mock(status_code=200, content=zip_buffer.getvalue())
+        first.headers = {"ETag": '"v1"'}
+        not_modified = Mock(status_code=304, headers={})
+        mock_get.side_effect = [first, not_modified]
+
+        _unzip_csv("path/to/data.zip")
+        result = _unzip_csv("path/to/data.zip")
+
+        assert result["value"].tolist() == [100]
+        assert mock_get.call_args_list[1][1]["headers"] == {"If-None-Match": '"v1"'}
+
+    @pytest.mark.unit
+    @patch("app.common.utils.st.secrets")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
+    def test_disk_cache_fresh_hit_skips_network(self, mock_get, mock_secrets):
+        """Test that a fresh cached table is served without any request"""
+        mock_secrets.blob.url = "https://example.com/data"
+        mock_secrets.blob.token = "?token=abc123"
+
+        zip_buffer = BytesIO()
+        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("test.csv", "id,value\n1,100\n")
+
+        response = Mock(status_code=200, content=zip_buffer.getvalue(), headers={})
+        mock_get.return_value = response
+
+        _unzip_csv("path/to/data.zip")
+        result = _unzip_csv("path/to/data.zip")
+
+        assert result["id"].tolist() == [1]
+        mock_get.assert_called_once()
+
+    @pytest.mark.unit
+    @patch("app.common.utils.st.secrets")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
+    def test_stream_mode(self, mock_get, mock_secrets):
+        """Test that stream mode decodes the response incrementally"""
+        mock_secrets.blob.url = "https://example.com/data"
+        mock_secrets.blob.token = "?token=abc123"
+
+        zip_buffer = BytesIO()
+        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("test.csv", "id,value\n1,100\n2,200\n")
+        data = zip_buffer.getvalue()
+
+        mock_response = Mock(headers={})
+        mock_response.iter_content.return_value = iter([data[:10], data[10:]])
+        mock_get.return_value = mock_response
+
+        result = _unzip_csv("path/to/data.zip", stream=True)
+
+        assert result["value"].tolist() == [100, 200]
+        assert mock_get.call_args[1]["stream"] is True
+        mock_response.close.assert_called_once()
+
+
+class TestUnzipCsvPushdown:
+    """Test column/row push-down in _unzip_csv"""
+
+    CSV = (
+        "mesh1kmid,citycode,dayflag,timezone,population\n"
+        "1,13101,0,0,10\n"
+        "1,13101,2,2,11\n"
+        "2,13102,2,2,20\n"
+        "3,13103,2,2,30\n"
+    )
+
+    def _response(self):
+        zip_buffer = BytesIO()
+        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("test.csv", self.CSV)
+        data = zip_buffer.getvalue()
+
+        response = Mock(status_code=200, content=data, headers={})
+        response.iter_content.return_value = iter([data])
+        return response
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("stream", [False, True])
+    @pytest.mark.parametrize("cache_enabled", [True, False])
+    @patch("app.common.utils.st.secrets")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
+    def test_filters_and_columns(
+        self, mock_get, mock_secrets, stream, cache_enabled, monkeypatch
+    ):
+        """Test that only the requested slice is returned, with and without cache"""
+        mock_secrets.blob.url = "https://example.com/data"
+        mock_secrets.blob.token = "?token=abc123"
+        if not cache_enabled:
+            monkeypatch.setenv("MLIT_CACHE_DIR", "")
+        mock_get.return_value = self._response()
+
+        result = _unzip_csv(
+            "path/to/data.zip",
+            stream=stream,
+            columns=["mesh1kmid", "population"],
+            filters={"dayflag": [2], "timezone": [2], "citycode": [13101, 13103]},
+            schema="mdp",
+        )
+
+        assert list(result.columns) == ["mesh1kmid", "population"]
+        assert result["mesh1kmid"].tolist() == [1, 3]
+        assert result["population"].tolist() == [11.0, 30.0]
+        assert result["population"].dtype == "float32"
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("stream", [False, True])
+    @patch("app.common.utils.st.secrets")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
+    def test_usecols_without_cache(self, mock_get, mock_secrets, stream, monkeypatch):
+        """Test that only the needed columns are parsed without the disk cache"""
+        mock_secrets.blob.url = "https://example.com/data"
+        mock_secrets.blob.token = "?token=abc123"
+        monkeypatch.setenv("MLIT_CACHE_DIR", "")
+        mock_get.return_value = self._response()
+
+        with patch("app.common.blob.pd.read_csv", wraps=pd.read_csv) as read_csv:
+            _unzip_csv(
+                "path/to/data.zip",
+                stream=stream,
+                columns=["mesh1kmid"],
+                filters={"dayflag": [2]},
+            )
+
+        assert read_csv.call_args.kwargs["usecols"] == ["mesh1kmid", "dayflag"]
+
+    @pytest.mark.unit
+    @patch("app.common.utils.st.secrets")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
+    def test_slice_read_from_cache(self, mock_get, mock_secrets):
+        """Test that with the disk cache the slice comes from the Parquet file"""
+        mock_secrets.blob.url = "https://example.com/data"
+        mock_secrets.blob.token = "?token=abc123"
+        mock_get.return_value = self._response()
+
+        with patch("app.common.blob.ParquetSink.read", autospec=True) as read:
+            read.return_value = pd.DataFrame({"mesh1kmid": [3]})
+            result = _unzip_csv(
+                "path/to/data.zip", columns=["mesh1kmid"], filters={"citycode": [13103]}
+            )
+
+        assert result["mesh1kmid"].tolist() == [3]
+        assert read.call_args.args[1:] == (["mesh1kmid"], [("citycode", "in", [13103])])
+
+    @pytest.mark.unit
+    @patch("app.common.utils.st.secrets")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
+    def test_cache_keeps_full_table(self, mock_get, mock_secrets):
+        """Test that the disk cache serves other slices of the same file"""
+        mock_secrets.blob.url = "https://example.com/data"
+        mock_secrets.blob.token = "?token=abc123"
+        mock_get.return_value = self._response()
+
+        _unzip_csv("path/to/data.zip", filters={"dayflag": [0]})
+        result = _unzip_csv(
+            "path/to/data.zip", columns=["mesh1kmid"], filters={"citycode": [13102]}
+        )
+
+        assert result["mesh1kmid"].tolist() == [2]
+        mock_get.assert_called_once()
+
+    @pytest.mark.unit
+    @patch("app.common.utils.st.secrets")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
+    def test_missing_column(self, mock_get, mock_secrets):
+        """Test ValueError for columns that are not in the CSV"""
+        mock_secrets.blob.url = "https://example.com/data"
+        mock_secrets.blob.token = "?token=abc123"
+        mock_get.return_value = self._response()
+
+        with pytest.raises(ValueError):
+            _unzip_csv("path/to/data.zip", columns=["nope"])
+
+    @pytest.mark.unit
+    @patch("app.common.utils.st.secrets")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
+    def test_schema(self, mock_get, mock_secrets):
+        """Test that the table is converted to the dataset schema"""
+        mock_secrets.blob.url = "https://example.com/data"
+        mock_secrets.blob.token = "?token=abc123"
+        mock_get.return_value = self._response()
+
+        result = _unzip_csv("path/to/data.zip", schema="mdp")
+
+        assert result["mesh1kmid"].dtype == "int32"
+        assert result["citycode"].dtype == "int32"
+        assert isinstance(result["dayflag"].dtype, pd.CategoricalDtype)
+        assert result["dayflag"].tolist() == [0, 2, 2, 2]
+
+
+class TestFetchDataBatch:
+    """Test fetch_data_batch function"""
+
+    @staticmethod
+    def _zip(csv_data: str) -> bytes:
+        zip_buffer = BytesIO()
+        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("test.csv", csv_data)
+        return zip_buffer.getvalue()
+
+    @pytest.mark.unit
+    @patch("app.common.utils.st.session_state")
+    @patch("app.common.utils.st.secrets")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
+    def test_fetches_concurrently_in_order(self, mock_get, mock_secrets, mock_ss):
+        """Test that all downloads run at the same time and keep their order"""
+        mock_secrets.blob.url = "https://example.com/data"
+        mock_secrets.blob.token = "?token=abc123"
+        mock_ss.pref = {13: "東京都"}
+        mock_ss.set = "mdp"
+        mock_ss.month = 4
+
+        barrier = threading.Barrier(3, timeout=5)
+
+        def fake_get(url, **kwargs):
+            barrier.wait()  # fails unless all three requests are in flight
+            year = "2021" if "/2021/" in url else "2020" if "/2020/" in url else "0"
+            data = self._zip(f"mesh1kmid,population\n1,{year}\n")
+            response = Mock(status_code=200, headers={})
+            response.iter_content.return_value = iter([data])
+            return response
+
+        mock_get.side_effect = fake_get
+
+        df_2021, df_2020, df_mesh = fetch_data_batch(
+            [
+                {"f": "mdp", "year": 2021},
+                {"f": "mdp", "year": 2020},
+                {"f": "mesh1km", "year": 2020},
+            ]
+        )
+
+        assert df_2021["population"].tolist() == [2021]
+        assert df_2020["population"].tolist() == [2020]
+        assert df_mesh["population"].tolist() == [0]
+        urls = sorted(call.args[0] for call in mock_get.call_args_list)
+        assert urls[0].startswith(
+            "https://example.com/data/attribute/attribute_mesh1km_2020.csv.zip"
+        )
+        assert "mdp/13/2020/04/monthly_mdp_mesh1km.csv.zip" in urls[1]
+
+    @pytest.mark.unit
+    @patch("app.common.utils.st.session_state")
+    @patch("app.common.utils.st.secrets")
+    @patch("app.common.blob.BLOB_CLIENT.session.get")
+    def test_explicit_month(self, mock_get, mock_secrets, mock_ss):
+        """Test that a month in the parameters overrides the selected month"""
+        mock_secrets.blob.url = "https://example.com/data"
+        mock_secrets.blob.token = "?token=abc123"
+        mock_ss.pref = {13: "東京都"}
+        mock_ss.set = "mdp"
+        mock_ss.month = 4
+
+        response = Mock(status_code=200, headers={})
+        response.iter_content.return_value = iter(
+            [self._zip("mesh1kmid,population\n1,5\n")]
+        )
+        mock_get.return_value = response
+
+        fetch_data_batch([{"f": "mdp", "year": 2019, "month": 11}])
+
+        assert "mdp/13/2019/11/monthly_mdp_mesh1km.csv.zip" in (
+            mock_get.call_args.args[0]
+        )
+
+
+    @pytest.mark.unit
+    @patch("app.common.utils.st.session_state")
+    @patch("app.common.utils._load_csv")
+    @patch("app.common.utils._unzip_csv")
+    def test_without_memory_cache(self, mock_unzip, mock_load, mock_ss):
+        """Test that memory_cache=False bypasses st.cache_data"""
+        mock_ss.pref = {13: "東京都"}
+        mock_ss.month = 4
+        mock_load.return_value = pd.DataFrame({"a": [1]})
+
+        (df,) = fetch_data_batch([{"f": "mdp", "year": 2021}], memory_cache=False)
+
+        assert df["a"].tolist() == [1]
+        mock_load.assert_called_once()
+        mock_unzip.assert_not_called()
+
+
+class TestDataVersion:
+    """Test data_version function"""
+
+    PATH = "mdp/13/2021/04/monthly_mdp_mesh1km.csv.zip"
+
+    @pytest.mark.unit
+    def test_not_downloaded(self):
+        """Test that a table never read has no version"""
+        assert data_version(self.PATH) is None
+
+    @pytest.mark.unit
+    def test_disk_cache(self):
+        """Test that the version follows the ETag of the cached copy"""
+        cache = get_disk_cache()
+        df = pd.DataFrame({"mesh1kmid": [1], "population": [5.0]})
+
+        cache.put(self.PATH, df, etag='"v1"')
+        assert data_version("/" + self.PATH) == '"v1"'
+
+        cache.put(self.PATH, df, last_modified="Wed, 01 Sep 2021 00:00:00 GMT")
+        assert data_version(self.PATH) == "Wed, 01 Sep 2021 00:00:00 GMT"
+
+    @pytest.mark.unit
+    def test_store(self, tmp_path, monkeypatch):
+        """Test that a store partition takes precedence over the disk cache"""
+        monkeypatch.setenv("MLIT_STORE_DIR", str(tmp_path / "store"))
+        get_disk_cache().put(self.PATH, pd.DataFrame({"a": [1]}), etag='"v1"')
+        file = partition_path(tmp_path / "store", "mdp", 13, 2021, 4)
+        write_partition(pd.DataFrame({"mesh1kmid": [1]}), file)
+
+        version = data_version(self.PATH)
+
+        assert version == f"store:{file.stat().st_mtime_ns}"
+
 
 class TestLonlatToPolygon:
     """Test lonlat_to_polygon function"""
@@ -320,6 +661,26 @@ class TestMakePolygons:
         assert "geometry" in gdf.columns
         assert all(isinstance(geom, Polygon) for geom in gdf.geometry)
 
+    @pytest.mark.unit
+    def test_make_polygons_multiple_values(self):
+        """Test that several value columns share one geometry column"""
+        df = pd.DataFrame(
+            {
+                "lon_min": [139.0, 140.0],
+                "lat_min": [35.0, 36.0],
+                "lon_max": [139.5, 140.5],
+                "lat_max": [35.5, 36.5],
+                "population": [1000, 2000],
+                "diff": [0.1, None],
+            }
+        )
+
+        gdf = make_polygons(df, ["population", "diff"])
+
+        assert list(gdf.columns) == ["population", "diff", "geometry"]
+        assert gdf["population"].tolist() == [1000, 2000]
+        assert pd.isna(gdf["diff"].iloc[1])
+
     @pytest.mark.unit
     def test_make_polygons_preserves_values(self):
         """Test that make_polygons preserves the value column"""
@@ -355,3 +716,27 @@ class TestMakePolygons:
 
         assert len(gdf) == 3
         assert gdf["value"].tolist() == [100, 200, 300]
+
+    @pytest.mark.unit
+    def test_make_polygons_vectorized_matches_scalar(self):
+        """Test that the array construction matches lonlat_to_polygon per row"""
+        df = pd.DataFrame(
+            {
+                "lon_min": [139.0, 140.0, 141.0],
+                "lat_min": [35.0, 36.0, 37.0],
+                "lon_max": [139.5, 140.5, 141.5],
+                "lat_max": [35.5, 36.5, 37.5],
+                "value": [100, 200, 300],
+            },
+            index=[10, 20, 30],
+        )
+
+        gdf = make_polygons(df, "value")
+
+        assert gdf.crs == "EPSG:4326"
+        assert gdf.index.tolist() == [10, 20, 30]
+        for geom, row in zip(gdf.geometry, df.itertuples()):
+            expected = lonlat_to_polygon(
+                row.lon_min, row.lat_min, row.lon_max, row.lat_max
+            )
+            assert geom.equals(expected)
@@ -0,0 +1,238 @@
+"""Unit tests for app/common/vector_tiles.py"""
+
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import Point, box
+
+from app.common import vector_tiles
+from app.common.vector_tiles import encode_tile, is_boxes, iter_tiles, publish_tiles
+
+
+def _read_varint(buf: bytes, pos: int) -> tuple[int, int]:
+    result = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        shift += 7
+        if not b & 0x80:
+            return result, pos
+
+
+def _fields(buf: bytes):
+    """Minimal protobuf reader: yields (field number, value)."""
+    pos = 0
+    while pos < len(buf):
+        tag, pos = _read_varint(buf, pos)
+        number, wire = tag >> 3, tag & 7
+        if wire == 0:
+            value, pos = _read_varint(buf, pos)
+        elif wire == 1:
+            value, pos = buf[pos : pos + 8], pos + 8
+        else:
+            size, pos = _read_varint(buf, pos)
+            value, pos = buf[pos : pos + size], pos + size
+        yield number, value
+
+
+def _packed(buf: bytes) -> list[int]:
+    out, pos = [], 0
+    while pos < len(buf):
+        v, pos = _read_varint(buf, pos)
+        out.append(v)
+    return out
+
+
+def _decode(tile: bytes) -> dict:
+    """Decode a single-layer tile into {name, extent, features}."""
+    ((_, layer),) = list(_fields(tile))
+    name, extent, keys, values, features = None, None, [], [], []
+    for number, value in _fields(layer):
+        if number == 1:
+            name = value.decode()
+        elif number == 5:
+            extent = value
+        elif number == 3:
+            keys.append(value.decode())
+        elif number == 4:
+            ((kind, v),) = list(_fields(value))
+            values.append(v.decode() if kind == 1 else struct.unpack("<d", v)[0])
+        elif number == 2:
+            features.append(dict(_fields(value)))
+
+    decoded = []
+    for f in features:
+        tags = _packed(f[2])
+        geometry = [(g >> 1) ^ -(g & 1) for g in _packed(f[4])]
+        props = {keys[k]: values[v] for k, v in zip(tags[::2], tags[1::2])}
+        decoded.append({"type": f[3], "geometry": geometry, "properties": props})
+    return {"name": name, "extent": extent, "features": decoded}
+
+
+class TestEncodeTile:
+    """Test encode_tile function"""
+
+    @pytest.mark.unit
+    def test_roundtrip(self):
+        """Test that rectangles and properties decode back"""
+        boxes = np.array([[0, 0, 100, 50], [200, 300, 260, 400]])
+        props = {
+            "color": np.array(["#ff0000ff", "#ff0000ff"]),
+            "v": np.array([1.5, 2.0]),
+        }
+
+        tile = _decode(encode_tile(boxes, props))
+
+        assert tile["name"] == "mesh"
+        assert tile["extent"] == 4096
+        assert len(tile["features"]) == 2
+        second = tile["features"][1]
+        assert second["type"] == 3  # POLYGON
+        assert second["properties"] == {"color": "#ff0000ff", "v": 2.0}
+        # MoveTo(200, 300), LineTo x3 (clockwise), ClosePath
+        # (command integers are small, so the zigzag decode leaves them recognizable)
+        assert second["geometry"][1:3] == [200, 300]
+        assert second["geometry"][4:10] == [60, 0, 0, 100, -60, 0]
+
+
+class TestIterTiles:
+    """Test iter_tiles function"""
+
+    @pytest.mark.unit
+    def test_every_zoom_covers_cells(self):
+        """Test that each zoom level contains every cell at least once"""
+        bounds = np.array(
+            [
+                [139.75, 35.666667, 139.7625, 35.675],
+                [139.7625, 35.666667, 139.775, 35.675],
+            ]
+        )
+
+        tiles = list(iter_tiles(bounds, {"v": np.array([1.0, 2.0])}, 9, 12))
+
+        assert {z for z, *_ in tiles} == {9, 10, 11, 12}
+        for zoom in range(9, 13):
+            values = {
+                f["properties"]["v"]
+                for z, _, _, t in tiles
+                if z == zoom
+                for f in _decode(t)["features"]
+            }
+            assert values == {1.0, 2.0}
+
+    @pytest.mark.unit
+    def test_tile_index(self):
+        """Test the tile address of a known location (Tokyo station, z12)"""
+        bounds = np.array([[139.75, 35.666667, 139.7625, 35.675]])
+
+        ((z, x, y, _),) = list(iter_tiles(bounds, {"v": np.array([1.0])}, 12, 12))
+
+        assert (z, x, y) == (12, 3638, 1613)
+
+    @pytest.mark.unit
+    def test_cell_across_tile_edge(self):
+        """Test that a cell crossing a tile edge is written to both tiles"""
+        bounds = np.array([[139.7625, 35.675, 139.775, 35.683333]])
+
+        tiles = list(iter_tiles(bounds, {"v": np.array([1.0])}, 12, 12))
+
+        assert [(x, y) for _, x, y, _ in tiles] == [(3638, 1612), (3638, 1613)]
+        top = _decode(tiles[0][3])["features"][0]["geometry"]
+        assert 4096 < top[2] + top[7] <= 4096 + 64  # ends in the tile buffer
+
+
+class TestIsBoxes:
+    """Test is_boxes function"""
+
+    @pytest.mark.unit
+    def test_mesh_cells(self, sample_geodataframe):
+        """Test that mesh cells are boxes"""
+        assert is_boxes(sample_geodataframe)
+
+    @pytest.mark.unit
+    def test_circle(self):
+        """Test that a buffered point is not a box"""
+        gdf = gpd.GeoDataFrame(
+            geometry=[
+                box(139.7625, 35.675, 139.775, 35.683333),
+                Point(139.7, 35.6).buffer(0.01),
+            ]
+        )
+
+        assert not is_boxes(gdf)
+
+
+class TestPublishTiles:
+    """Test publish_tiles function"""
+
+    @pytest.mark.unit
+    def test_disabled_without_base_url(self, monkeypatch, sample_geodataframe):
+        """Test that no tiles are written unless MLIT_TILE_BASE_URL is set"""
+        monkeypatch.delenv("MLIT_TILE_BASE_URL", raising=False)
+
+        assert publish_tiles(sample_geodataframe, {"v": np.array([1, 2, 3])}) is None
+
+    @pytest.mark.unit
+    def test_writes_pyramid_once(self, monkeypatch, tmp_path):
+        """Test that tiles are written under the static dir and reused"""
+        monkeypatch.setenv("MLIT_TILE_BASE_URL", "http://localhost:8501/")
+        monkeypatch.setattr(vector_tiles, "TILES_DIR", tmp_path / "tiles")
+        gdf = gpd.GeoDataFrame(geometry=[box(139.7625, 35.675, 139.775, 35.683333)])
+
+        url = publish_tiles(gdf, {"v": np.array([1.0])}, 12, 12)
+        again = publish_tiles(gdf, {"v": np.array([1.0])}, 12, 12)
+
+        assert url == again
+        assert url.startswith("http://localhost:8501/app/static/tiles/")
+        assert url.endswith("/{z}/{x}/{y}.pbf")
+        key = url.split("/")[-4]
+        assert (tmp_path / "tiles" / key / "12" / "3638" / "1612.pbf").exists()
+
+    @pytest.mark.unit
+    def test_concurrent_sessions(self, monkeypatch, tmp_path):
+        """Test that sessions publishing the same tiles do not share a tmp dir"""
+        monkeypatch.setenv("MLIT_TILE_BASE_URL", "http://localhost:8501/")
+        monkeypatch.setattr(vector_tiles, "TILES_DIR", tmp_path / "tiles")
+        gdf = gpd.GeoDataFrame(geometry=[box(139.7625, 35.675, 139.775, 35.683333)])
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            urls = list(
+                executor.map(
+                    lambda _: publish_tiles(gdf, {"v": np.array([1.0])}, 10, 12),
+                    range(8),
+                )
+            )
+
+        assert len(set(urls)) == 1 and urls[0] is not None
+        assert not list((tmp_path / "tiles").glob("*.tmp"))
+
+    @pytest.mark.unit
+    def test_non_boxes_fall_back(self, monkeypatch, tmp_path):
+        """Test that non-rectangular geometries are left to GeoJSON"""
+        monkeypatch.setenv("MLIT_TILE_BASE_URL", "http://localhost:8501/")
+        monkeypatch.setattr(vector_tiles, "TILES_DIR", tmp_path / "tiles")
+        gdf = gpd.GeoDataFrame(geometry=[Point(139.7, 35.6).buffer(0.01)])
+
+        assert publish_tiles(gdf, {"v": np.array([1.0])}, 12, 12) is None
+        assert not (tmp_path / "tiles").exists()
+
+    @pytest.mark.unit
+    def test_prune_keeps_recent(self, monkeypatch, tmp_path):
+        """Test that only tile sets unused for a while are pruned"""
+        monkeypatch.setattr(vector_tiles, "TILES_DIR", tmp_path)
+        monkeypatch.setattr(vector_tiles, "MAX_TILESETS", 1)
+        old = time.time() - 2 * vector_tiles.KEEP_SECONDS
+        for name, mtime in [("a", old - 1), ("b", old), ("c", None), ("d", None)]:
+            (tmp_path / name).mkdir()
+            if mtime is not None:
+                os.utime(tmp_path / name, (mtime, mtime))
+
+        vector_tiles._prune()
+
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["c", "d"]
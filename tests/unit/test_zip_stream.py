@@ -0,0 +1,105 @@
+"""Unit tests for app/common/zip_stream.py"""
+
+import io
+import zipfile
+
+import pandas as pd
+import pytest
+
+from app.common.zip_stream import open_csv_member
+
+
+class _Unseekable(io.RawIOBase):
+    """Write-only sink that forces zipfile to emit data descriptors"""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+
+def _make_zip(members, compression=zipfile.ZIP_DEFLATED, seekable=True) -> bytes:
+    sink = io.BytesIO() if seekable else _Unseekable()
+    with zipfile.ZipFile(sink, "w", compression) as zf:
+        for name, data in members:
+            zf.writestr(name, data)
+    return sink.getvalue() if seekable else bytes(sink.data)
+
+
+def _chunks(data: bytes, size: int = 7):
+    return (data[i : i + size] for i in range(0, len(data), size))
+
+
+CSV = "mesh1kmid,population\n" + "".join(f"{53390000 + i},{i}\n" for i in range(500))
+
+
+class TestOpenCsvMember:
+    """Test open_csv_member function"""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("compression", [zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED])
+    def test_reads_csv_member(self, compression):
+        """Test decoding deflated and stored members in small chunks"""
+        data = _make_zip([("a.csv", CSV)], compression)
+
+        with open_csv_member(_chunks(data)) as f:
+            df = pd.read_csv(f)
+
+        assert len(df) == 500
+        assert df["population"].sum() == sum(range(500))
+
+    @pytest.mark.unit
+    def test_data_descriptor(self):
+        """Test members written with a trailing data descriptor"""
+        data = _make_zip([("readme.txt", "x" * 100), ("a.csv", CSV)], seekable=False)
+
+        with open_csv_member(_chunks(data, 1024)) as f:
+            assert f.read().decode() == CSV
+
+    @pytest.mark.unit
+    def test_skips_non_csv_members(self):
+        """Test that leading non-CSV members are skipped"""
+        data = _make_zip([("readme.txt", "hello"), ("a.csv", CSV)])
+
+        with open_csv_member(_chunks(data)) as f:
+            assert f.read().decode() == CSV
+
+    @pytest.mark.unit
+    def test_chunked_read(self):
+        """Test that pandas can consume the stream chunk by chunk"""
+        data = _make_zip([("a.csv", CSV)])
+
+        with open_csv_member(_chunks(data, 256)) as f:
+            sizes = [len(c) for c in pd.read_csv(f, chunksize=100)]
+
+        assert sizes == [100] * 5
+
+    @pytest.mark.unit
+    def test_no_csv(self):
+        """Test ValueError when the archive holds no CSV"""
+        data = _make_zip([("readme.txt", "hello")])
+
+        with pytest.raises(ValueError, match="No CSV file found in ZIP archive"):
+            open_csv_member(_chunks(data))
+
+    @pytest.mark.unit
+    def test_invalid_zip(self):
+        """Test BadZipFile for non-ZIP content"""
+        with pytest.raises(zipfile.BadZipFile):
+            open_csv_member([b"This is not a valid ZIP file"])
+
+    @pytest.mark.unit
+    def test_bad_crc(self):
+        """Test that corrupted stored data fails the CRC check"""
+        data = bytearray(_make_zip([("a.csv", CSV)], zipfile.ZIP_STORED))
+        pos = data.index(b"53390001")
+        data[pos] = ord("9")
+
+        with pytest.raises(zipfile.BadZipFile, match="CRC"):
+            with open_csv_member([bytes(data)]) as f:
+                f.read()